@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Needs the app registry loaded by get_asgi_application().
+from pdd.asgi import StreamingUploadMiddleware  # noqa: E402
+
+application = StreamingUploadMiddleware(django_application)
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/3.0/ref/settings/
 """
 
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -45,6 +46,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -131,4 +134,60 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
-AUTH_USER_MODEL = 'core.User'
\ No newline at end of file
+# Largest video file accepted by the upload endpoints, in bytes.
+VIDEO_UPLOAD_MAX_SIZE = 20 * 1024 ** 3
+
+# Threads running the ORM calls and file I/O of async views under ASGI,
+# see core.threadpool. Also the most database connections they open.
+ASYNC_THREADS = 8
+
+AUTH_USER_MODEL = 'core.User'
+
+# Cache of API tokens used by core.authentication.CachedTokenAuthentication.
+# Set SHARED_CACHE to an alias in CACHES to share it between processes.
+# Without it, other worker processes accept a deleted token or deactivated
+# user for up to TTL seconds, so keep TTL short unless SHARED_CACHE is set.
+TOKEN_AUTH_CACHE = {
+    'MAX_SIZE': 10000,
+    'TTL': 5,
+    'SHARED_CACHE': None,
+}
+
+# Cache of rendered list responses, see core.response_cache. Use
+# core.response_cache.FileBackend to share it between worker processes,
+# or set BACKEND to None to disable it.
+RESPONSE_CACHE = {
+    'BACKEND': 'core.response_cache.LocMemBackend',
+    'MAX_BYTES': 32 * 1024 ** 2,
+}
+
+# Request timing, see core.metrics. SAMPLE_RATE is the fraction of the
+# requests answered with a Server-Timing header; METRICS_DIR enables the
+# per-route histograms served at /metrics, shared by all workers.
+SERVER_TIMING = {
+    'SAMPLE_RATE': float(os.environ.get('SERVER_TIMING_SAMPLE_RATE', 0)),
+    'METRICS_DIR': os.environ.get('METRICS_DIR'),
+    'METRICS_TOKEN': os.environ.get('METRICS_TOKEN'),
+}
+
+# On-demand request profiling, see core.profiling. Costs nothing while
+# ENABLED is off.
+PROFILING = {
+    'ENABLED': os.environ.get('PROFILING_ENABLED') == '1',
+    'SAMPLE_RATE': float(os.environ.get('PROFILING_SAMPLE_RATE', 0)),
+    'DIRECTORY': '/vol/web/profiles',
+    'MAX_PROFILES': 200,
+}
+
+# Signed, expiring video URLs, see core.media. Set OFFLOAD to
+# 'x-accel-redirect' (nginx) or 'x-sendfile' to let the front proxy send
+# the files once the signature was checked.
+SIGNED_MEDIA = {
+    'MAX_AGE': int(os.environ.get('SIGNED_MEDIA_MAX_AGE', 3600)),
+    'OFFLOAD': os.environ.get('SIGNED_MEDIA_OFFLOAD') or None,
+    'ACCEL_PREFIX': '/protected-media/',
+}
+
+# Fail API requests that run more SQL queries than their viewset declares
+# in `query_budget` (see core.querybudget). Enabled for the test suite.
+QUERY_BUDGET_ENFORCE = sys.argv[1:2] == ['test']
@@ -0,0 +1,92 @@
+"""
+Measure how much of a video file core.videometa reads.
+
+    python benchmarks/bench_videometa.py [VIDEO ...]
+
+Without arguments, sparse synthetic files with 1 GiB of media data are
+generated in a temporary directory: MP4 with the moov box before and
+after the media data, and WebM with its tracks before and after the
+clusters.
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from core import videometa  # noqa: E402
+from core.tests.test_videometa import sample_mp4, sample_webm, \
+    vint_size  # noqa: E402
+
+MEDIA_SIZE = 1024 ** 3
+
+
+def synthetic_files(directory):
+    """Write the sample files, their media data left as a sparse hole"""
+    mdat = b'\0\0\0\x08mdat'
+    # The same box with a 64 bit size covering the hole.
+    large_mdat = b'\0\0\0\x01mdat' + (16 + MEDIA_SIZE).to_bytes(8, 'big')
+    cluster = videometa.MKV_CLUSTER.to_bytes(4, 'big') + \
+        vint_size(MEDIA_SIZE)
+    length = len(cluster) + MEDIA_SIZE
+    samples = {
+        'moov-first.mp4': (sample_mp4(mdat=b''), mdat, large_mdat),
+        'moov-last.mp4': (
+            sample_mp4(mdat=b'', moov_first=False), mdat, large_mdat
+        ),
+        'tracks-first.webm': (
+            sample_webm(cluster=cluster, cluster_length=length),
+            cluster,
+            cluster
+        ),
+        'tracks-last.webm': (
+            sample_webm(
+                tracks_first=False, cluster=cluster, cluster_length=length
+            ),
+            cluster,
+            cluster
+        ),
+    }
+
+    paths = []
+    for name, (data, header, sparse_header) in samples.items():
+        head, tail = data.split(header)
+        path = os.path.join(directory, name)
+        with open(path, 'wb') as file:
+            file.write(head + sparse_header)
+            file.seek(MEDIA_SIZE, os.SEEK_CUR)
+            file.write(tail)
+            file.truncate()
+        paths.append(path)
+    return paths
+
+
+def measure(path):
+    """Probe `path` and return its size, the bytes read and the time"""
+    with open(path, 'rb') as raw:
+        file = videometa.CountingFile(raw)
+        start = time.perf_counter()
+        try:
+            meta = videometa.probe(file)
+        except videometa.VideoMetadataError as exc:
+            meta = {'error': str(exc)}
+        elapsed = time.perf_counter() - start
+    return os.path.getsize(path), file.bytes_read, elapsed, meta
+
+
+def main(paths):
+    with tempfile.TemporaryDirectory() as directory:
+        if not paths:
+            paths = synthetic_files(directory)
+        print(f'{"file":<20} {"size":>12} {"read":>8} {"ms":>7}  metadata')
+        for path in paths:
+            size, read, elapsed, meta = measure(path)
+            print(
+                f'{os.path.basename(path):<20} {size:>12} {read:>8} '
+                f'{elapsed * 1000:>7.2f}  {meta}'
+            )
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
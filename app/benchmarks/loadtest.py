@@ -0,0 +1,160 @@
+"""
+Load test the API at high concurrency, to compare WSGI and ASGI servers.
+
+    python benchmarks/loadtest.py URL [URL ...] --token TOKEN \
+        [--concurrency 200] [--duration 30] [--upload BYTES]
+
+Start the deployments to compare first, e.g. with the same number of
+worker processes:
+
+    gunicorn app.wsgi --workers 4 --bind :8001
+    uvicorn app.asgi:application --workers 4 --port 8002
+
+and pass the endpoint of each, such as http://localhost:8001/api/pdd/
+pddobjects/ and http://localhost:8002/api/pdd/async/pddobjects/. Every
+URL is hit by `concurrency` clients over keep-alive connections for
+`duration` seconds; throughput and latency percentiles are printed per
+URL. With --upload, the clients PUT a body of that many bytes sent in
+slow chunks instead, the case where a synchronous worker is held for
+the whole transfer.
+
+Only the standard library is used, so the script runs anywhere.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+# Upload bodies are sent in chunks of this size, one per CHUNK_DELAY.
+CHUNK_SIZE = 64 * 1024
+CHUNK_DELAY = 0.01
+
+
+async def read_response(reader):
+    """Read one HTTP/1.1 response, return its status"""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('Connection closed.')
+    status = int(status_line.split()[1])
+    length = 0
+    chunked = False
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name = name.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'transfer-encoding':
+            chunked = 'chunked' in value.lower()
+
+    if not chunked:
+        await reader.readexactly(length)
+        return status
+    while True:
+        size = int((await reader.readline()).split(b';')[0], 16)
+        await reader.readexactly(size + 2)
+        if not size:
+            return status
+
+
+async def client(url, token, upload, deadline, latencies, errors):
+    """Send requests over one connection until `deadline`"""
+    parts = urlsplit(url)
+    path = parts.path + (f'?{parts.query}' if parts.query else '')
+    method = 'PUT' if upload else 'GET'
+    head = (
+        f'{method} {path} HTTP/1.1\r\n'
+        f'Host: {parts.netloc}\r\n'
+        f'Authorization: Token {token}\r\n'
+        f'Content-Length: {upload}\r\n'
+        '\r\n'
+    ).encode('latin-1')
+    chunk = b'\0' * CHUNK_SIZE
+
+    writer = None
+    while time.monotonic() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(
+                    parts.hostname, parts.port or 80
+                )
+            start = time.perf_counter()
+            writer.write(head)
+            remaining = upload
+            while remaining:
+                writer.write(chunk[:remaining])
+                remaining -= min(remaining, CHUNK_SIZE)
+                await writer.drain()
+                await asyncio.sleep(CHUNK_DELAY)
+            await writer.drain()
+            status = await read_response(reader)
+        except (OSError, ConnectionError, asyncio.IncompleteReadError,
+                ValueError, IndexError):
+            errors.append('connection')
+            if writer is not None:
+                writer.close()
+            writer = None
+            continue
+
+        if status >= 400:
+            errors.append(status)
+        else:
+            latencies.append(time.perf_counter() - start)
+
+    if writer is not None:
+        writer.close()
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def run(url, token, concurrency, duration, upload):
+    latencies = []
+    errors = []
+    deadline = time.monotonic() + duration
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        client(url, token, upload, deadline, latencies, errors)
+        for _ in range(concurrency)
+    ))
+    return latencies, errors, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('urls', nargs='+', metavar='URL')
+    parser.add_argument('--token', required=True, help='API token')
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument(
+        '--upload', type=int, default=0, metavar='BYTES',
+        help='PUT bodies of this size instead of GET requests'
+    )
+    args = parser.parse_args()
+
+    print(f'{"url":<50} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} '
+          f'{"p99 ms":>8} {"errors":>7}')
+    for url in args.urls:
+        latencies, errors, elapsed = asyncio.run(run(
+            url, args.token, args.concurrency, args.duration, args.upload
+        ))
+        if not latencies:
+            print(f'{url:<50} no successful requests, errors: '
+                  f'{sorted(set(map(str, errors)))}')
+            continue
+        print(
+            f'{url:<50} {len(latencies) / elapsed:>8.1f} '
+            f'{statistics.median(latencies) * 1000:>8.1f} '
+            f'{percentile(latencies, 0.95) * 1000:>8.1f} '
+            f'{percentile(latencies, 0.99) * 1000:>8.1f} '
+            f'{len(errors):>7}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,77 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.http import FileResponse, Http404
+from django.urls import path, reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html, format_html_join
 from django.utils.translation import gettext as _
 
-from core import models
+from core import deletion, models, profiling, search
+
+# Below this many rows an estimate is not worth it, the count is exact.
+EXACT_COUNT_LIMIT = 10000
+
+
+def estimated_count(queryset):
+    """
+    Return the planner's row count of the table of `queryset` if it is
+    unfiltered, on PostgreSQL and analyzed, None otherwise
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql' or queryset.query.where:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [connection.ops.quote_name(queryset.model._meta.db_table)]
+        )
+        row = cursor.fetchone()
+    # A table never analyzed has -1 reltuples.
+    if row is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator taking the row count of large unfiltered tables from the
+    statistics of PostgreSQL instead of running COUNT(*) over them
+    """
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is None or estimate < EXACT_COUNT_LIMIT:
+            return super().count
+        return estimate
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """
+    Admin for tables with millions of rows: estimated counts, no second
+    count of the unfiltered table and search through core.search, which
+    the search indexes serve
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return search.search(queryset, search_term), False
 
 
 class UserAdmin(BaseUserAdmin):
     ordering = ['id']
     list_display = ['email', 'name']
+    # The popup of the raw id widgets of PddAdmin and VideoObjAdmin.
+    search_fields = ['email', 'name']
     fieldsets = (
         (None, {'fields': ('email', 'password')}),
         (_('Personal Info'), {'fields': ('name', )}),
+        (_('Limits'), {'fields': ('video_upload_max_size',)}),
         (
             _('Permissions'),
             {'fields': ('is_active', 'is_staff', 'is_superuser')}
@@ -24,7 +85,125 @@ class UserAdmin(BaseUserAdmin):
         }),
     )
 
+    def get_deleted_objects(self, objs, request):
+        """
+        Count the data of the users instead of collecting every object,
+        it is deleted in the background, see core.deletion
+        """
+        users = list(objs)
+        model_count = {
+            model._meta.verbose_name_plural: model.objects.filter(
+                user__in=users
+            ).count()
+            for model in (models.Pdd, models.VideoObj)
+        }
+        model_count[models.User._meta.verbose_name_plural] = len(users)
+        perms_needed = set()
+        if not self.has_delete_permission(request):
+            perms_needed.add(models.User._meta.verbose_name)
+        return [str(user) for user in users], model_count, perms_needed, []
+
+    def delete_model(self, request, obj):
+        deletion.schedule(obj)
+
+    def delete_queryset(self, request, queryset):
+        for user in queryset:
+            deletion.schedule(user)
+
+
+class VideoObjAdmin(ScalableAdmin):
+    list_display = ['title', 'user', 'updated_at']
+    list_select_related = ['user']
+    raw_id_fields = ['user']
+    search_fields = ['title']
+    # Also the order of the autocomplete of PddAdmin.
+    ordering = ['-id']
+
+
+class PddAdmin(ScalableAdmin):
+    list_display = ['name', 'user', 'timestamp', 'video_duration']
+    list_select_related = ['user']
+    raw_id_fields = ['user']
+    autocomplete_fields = ['videos']
+    search_fields = ['name']
+    date_hierarchy = 'timestamp'
+    ordering = ['-id']
+
 
 admin.site.register(models.User, UserAdmin)
-admin.site.register(models.VideoObj)
-admin.site.register(models.Pdd)
+admin.site.register(models.VideoObj, VideoObjAdmin)
+admin.site.register(models.Pdd, PddAdmin)
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = [
+        'name', 'status', 'priority', 'attempts', 'run_after', 'duration'
+    ]
+    list_filter = ['status', 'name']
+
+
+admin.site.register(models.Job, JobAdmin)
+
+
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = [
+        'created_at', 'method', 'path', 'status_code', 'duration',
+        'queries', 'sql_duration', 'trigger', 'requested_by', 'downloads'
+    ]
+    list_filter = ['trigger', 'method', 'status_code']
+    search_fields = ['path']
+    readonly_fields = [
+        field.name for field in models.RequestProfile._meta.fields
+    ] + ['downloads']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path(
+                '<int:pk>/download/<str:kind>/',
+                self.admin_site.admin_view(self.download),
+                name='core_requestprofile_download'
+            ),
+        ] + super().get_urls()
+
+    def changelist_view(self, request, extra_context=None):
+        """Tell staff how to profile their own requests"""
+        self.message_user(request, format_html(
+            'Send <code>X-Profile: {}</code> or add <code>?profile=</code> '
+            'with it to a request to profile it.',
+            profiling.sign(request.user)
+        ))
+        return super().changelist_view(request, extra_context)
+
+    def downloads(self, obj):
+        return format_html_join(' ', '<a href="{}">{}</a>', (
+            (reverse(
+                'admin:core_requestprofile_download', args=[obj.pk, kind]
+            ), kind)
+            for kind in profiling.FILES
+        ))
+    downloads.short_description = 'Files'
+
+    def download(self, request, pk, kind):
+        """Send one file of a profile"""
+        profile = self.get_object(request, pk)
+        if profile is None or kind not in profiling.FILES or \
+                not self.has_view_permission(request, profile):
+            raise Http404
+        try:
+            file = open(profiling.file_path(profile.name, kind), 'rb')
+        except FileNotFoundError:
+            raise Http404
+        return FileResponse(
+            file,
+            as_attachment=True,
+            filename=profile.name + profiling.FILES[kind]
+        )
+
+
+admin.site.register(models.RequestProfile, RequestProfileAdmin)
@@ -0,0 +1,223 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+DEFAULTS = {
+    # Tokens kept in the in-process LRU cache.
+    'MAX_SIZE': 10000,
+    # Seconds a cached token is trusted without asking the database.
+    # Without SHARED_CACHE, also how long other processes keep accepting
+    # a deleted token or a deactivated user.
+    'TTL': 5,
+    # Alias in CACHES shared by all processes, or None to disable.
+    'SHARED_CACHE': None,
+}
+
+
+def cache_settings():
+    return {**DEFAULTS, **getattr(settings, 'TOKEN_AUTH_CACHE', {})}
+
+
+class TokenCache:
+    """
+    Thread-safe LRU cache of auth tokens with a time to live.
+
+    Entries hold the Token with its user attached plus the user's version
+    number. With a shared cache configured, the version of every local
+    hit is checked against the shared cache, so a change made in one
+    process invalidates the entries of all other processes right away.
+    Without it, other processes only notice once the TTL expires, which
+    is why the default TTL is a few seconds: enough to absorb bursts of
+    requests, short enough to lock out a revoked token almost at once.
+    Raise it only together with a shared cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        # Bumped by every invalidation, see set().
+        self.epoch = 0
+        self.hits = self.misses = self.evictions = 0
+
+    @property
+    def shared(self):
+        alias = cache_settings()['SHARED_CACHE']
+        return caches[alias] if alias else None
+
+    def get(self, key):
+        """Return the cached Token for `key` or None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] <= now:
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        shared = self.shared
+        if shared is not None:
+            entry = self._check_shared(shared, key, entry)
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        return entry[0]
+
+    def set(self, token, epoch=None):
+        """
+        Cache `token`, whose user must be loaded already.
+
+        Pass the `epoch` read before loading the token from the database:
+        if an invalidation happened in between, the token may be stale and
+        is not cached.
+        """
+        if epoch is not None and epoch != self.epoch:
+            return
+
+        ttl = cache_settings()['TTL']
+        version = None
+        shared = self.shared
+        if shared is not None:
+            version = shared.get(_version_key(token.user_id), 0)
+            shared.set(_token_key(token.key), (token, version), ttl)
+        self._store(token, version, time.monotonic() + ttl)
+
+    def evict_token(self, key):
+        """Forget a single token"""
+        with self._lock:
+            self.epoch += 1
+            self._remove(key)
+        shared = self.shared
+        if shared is not None:
+            shared.delete(_token_key(key))
+
+    def evict_user(self, user_id):
+        """Forget every token of a user, in all processes"""
+        with self._lock:
+            self.epoch += 1
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._remove(key)
+        shared = self.shared
+        if shared is not None:
+            try:
+                shared.incr(_version_key(user_id))
+            except ValueError:
+                shared.set(_version_key(user_id), 1, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """Return the hit, miss and eviction counters"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+            }
+
+    def _check_shared(self, shared, key, entry):
+        """Validate a local entry, or fill a local miss, from `shared`"""
+        if entry is not None:
+            version = shared.get(_version_key(entry[0].user_id), 0)
+            if version == entry[1]:
+                return entry
+            with self._lock:
+                self._remove(key)
+            return None
+
+        cached = shared.get(_token_key(key))
+        if cached is None:
+            return None
+        token, version = cached
+        if shared.get(_version_key(token.user_id), 0) != version:
+            return None
+
+        ttl = cache_settings()['TTL']
+        return self._store(token, version, time.monotonic() + ttl)
+
+    def _store(self, token, version, expires):
+        entry = (token, version, expires)
+        max_size = cache_settings()['MAX_SIZE']
+        with self._lock:
+            self._remove(token.key)
+            self._entries[token.key] = entry
+            self._keys_by_user.setdefault(token.user_id, set()).add(
+                token.key
+            )
+            while len(self._entries) > max_size:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+        return entry
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._keys_by_user.get(entry[0].user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[entry[0].user_id]
+
+
+def _token_key(key):
+    return f'token-auth:token:{key}'
+
+
+def _version_key(user_id):
+    return f'token-auth:user-version:{user_id}'
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Drop-in replacement for TokenAuthentication caching the token lookup.
+
+    Tokens are invalidated as soon as they are deleted or their user is
+    saved or deleted, see core.signals.
+    """
+
+    def authenticate_credentials(self, key):
+        epoch = token_cache.epoch
+        token = token_cache.get(key)
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(_copy(token), epoch)
+            return (user, token)
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+
+        # Requests may modify their user, never hand out the cached one.
+        token = _copy(token)
+        return (token.user, token)
+
+
+def _copy(token):
+    """Copy a token together with its user"""
+    user = copy.copy(token.user)
+    token = copy.copy(token)
+    token.user = user
+    return token
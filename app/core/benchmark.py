@@ -0,0 +1,399 @@
+"""
+Latency and throughput benchmark of the API routes.
+
+Every named route of `user.urls` and `pdd.urls` has a scenario below
+preparing one request to it. run() sends each scenario's requests from
+a number of threads through the Django test client, in process and
+against the seeded database (see core.seeding), and reports latency
+percentiles, throughput, SQL queries per request and the peak resident
+memory. compare() checks results against a stored baseline.
+
+Only the request itself is timed and its queries counted; objects a
+scenario needs, like a PDD to delete, are made in its prepare step.
+Queries the async views run in the pool of core.threadpool are not
+counted.
+"""
+import hashlib
+import io
+import itertools
+import platform
+import resource
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import django
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import Client
+from django.urls import URLPattern, URLResolver, reverse
+
+from core import media, seeding, uploads
+from core.models import Pdd, UploadSession, VideoObj
+
+VIDEO_SIZE = 64 * 1024
+
+
+class Scenario:
+    """One kind of request to one route"""
+
+    def __init__(self, route, method, prepare, status=200):
+        self.route = route
+        self.method = method
+        self.prepare = prepare
+        self.status = status
+
+    @property
+    def name(self):
+        return f'{self.route} {self.method}'
+
+
+class Session:
+    """State of one benchmark thread, acting as one seeded user"""
+
+    _counter = itertools.count()
+
+    def __init__(self, user):
+        self.user = user
+        self.client = Client(
+            HTTP_AUTHORIZATION=f'Token {user.auth_token.key}',
+            raise_request_exception=False
+        )
+        self.pdd_ids = list(
+            Pdd.objects.filter(user=user).values_list('id', flat=True)
+        )
+        self.video_ids = list(
+            VideoObj.objects.filter(user=user).values_list('id', flat=True)
+        )
+        self.index = 0
+        self.video = None
+
+    def unique(self):
+        return f'{next(self._counter)}-{uuid.uuid4().hex[:8]}'
+
+    def pdd_id(self):
+        """Cycle through the user's seeded PDD objects"""
+        self.index += 1
+        return self.pdd_ids[self.index % len(self.pdd_ids)]
+
+    def video_pdd(self):
+        """Return a PDD object of the user with a stored video"""
+        if self.video is None:
+            self.video = Pdd.objects.create(
+                user=self.user, name='Benchmark video',
+                timestamp=seeding.START
+            )
+            self.video.videofile.save(
+                'video.mp4', ContentFile(b'\0' * VIDEO_SIZE)
+            )
+        return self.video
+
+    def video_digest(self):
+        """Return the digest of a video the user has stored"""
+        self.video_pdd()
+        return hashlib.sha256(b'\0' * VIDEO_SIZE).hexdigest()
+
+    def new_pdd(self):
+        return Pdd.objects.create(
+            user=self.user, name='Benchmark', timestamp=seeding.START
+        )
+
+    def new_upload(self, complete=False):
+        session = UploadSession.objects.create(
+            user=self.user, pdd=self.new_pdd(), filename='video.mp4',
+            size=VIDEO_SIZE
+        )
+        uploads.create_partial_file(session)
+        if complete:
+            uploads.write_chunk(
+                session, 0, VIDEO_SIZE, io.BytesIO(self.random_bytes())
+            )
+        return session
+
+    def random_bytes(self):
+        return uuid.uuid4().bytes * (VIDEO_SIZE // 16)
+
+
+def _json(data):
+    return {'data': data, 'content_type': 'application/json'}
+
+
+def _pdd_payload(session):
+    return {
+        'name': f'Benchmark {session.unique()}',
+        'timestamp': '2020-06-01T12:00:00Z',
+        'videos': session.video_ids[:3],
+    }
+
+
+SCENARIOS = [
+    Scenario('user:create', 'post', lambda s: (reverse('user:create'), {
+        'data': {
+            'email': f'new-{s.unique()}@example.com',
+            'password': 'benchmark', 'name': 'New user',
+        },
+    }), status=201),
+    Scenario('user:token', 'post', lambda s: (reverse('user:token'), {
+        'data': {'email': s.user.email, 'password': seeding.PASSWORD},
+    })),
+    Scenario('user:me', 'get', lambda s: (reverse('user:me'), {})),
+    Scenario('user:me', 'patch', lambda s: (
+        reverse('user:me'), _json({'name': f'Renamed {s.unique()}'})
+    )),
+    Scenario('user:async-me', 'get', lambda s: (
+        reverse('user:async-me'), {}
+    )),
+    Scenario('pdd:api-root', 'get', lambda s: (reverse('pdd:api-root'), {})),
+    Scenario('pdd:videoobj-list', 'get', lambda s: (
+        reverse('pdd:videoobj-list'), {}
+    )),
+    Scenario('pdd:videoobj-list', 'post', lambda s: (
+        reverse('pdd:videoobj-list'), _json({'title': s.unique()})
+    ), status=201),
+    Scenario('pdd:videoobj-bulk', 'post', lambda s: (
+        reverse('pdd:videoobj-bulk'),
+        _json([{'title': s.unique()} for _ in range(10)])
+    ), status=201),
+    Scenario('pdd:videoobj-detail', 'get', lambda s: (
+        reverse('pdd:videoobj-detail', args=[s.video_ids[0]]), {}
+    )),
+    Scenario('pdd:videoobj-detail', 'patch', lambda s: (
+        reverse('pdd:videoobj-detail', args=[s.video_ids[0]]),
+        _json({'title': s.unique()})
+    )),
+    Scenario('pdd:pdd-list', 'get', lambda s: (
+        reverse('pdd:pdd-list'), {}
+    )),
+    Scenario('pdd:pdd-list', 'post', lambda s: (
+        reverse('pdd:pdd-list'), _json(_pdd_payload(s))
+    ), status=201),
+    Scenario('pdd:pdd-bulk', 'post', lambda s: (
+        reverse('pdd:pdd-bulk'),
+        _json([_pdd_payload(s) for _ in range(10)])
+    ), status=201),
+    Scenario('pdd:pdd-histogram', 'get', lambda s: (
+        reverse('pdd:pdd-histogram'), {'data': {'bucket': 'day'}}
+    )),
+    Scenario('pdd:pdd-detail', 'get', lambda s: (
+        reverse('pdd:pdd-detail', args=[s.pdd_id()]), {}
+    )),
+    Scenario('pdd:pdd-detail', 'patch', lambda s: (
+        reverse('pdd:pdd-detail', args=[s.pdd_id()]),
+        _json({'name': s.unique()})
+    )),
+    Scenario('pdd:pdd-detail', 'delete', lambda s: (
+        reverse('pdd:pdd-detail', args=[s.new_pdd().pk]), {}
+    ), status=204),
+    Scenario('pdd:pdd-upload-video', 'post', lambda s: (
+        reverse('pdd:pdd-upload-video', args=[s.pdd_id()]),
+        {'data': {'videofile': ContentFile(s.random_bytes(), 'video.mp4')}}
+    )),
+    Scenario('pdd:pdd-link-video', 'post', lambda s: (
+        reverse('pdd:pdd-link-video', args=[s.pdd_id()]),
+        {'data': {'sha256': s.video_digest()}}
+    )),
+    Scenario('pdd:pdd-download-video', 'get', lambda s: (
+        reverse('pdd:pdd-download-video', args=[s.video_pdd().pk]), {}
+    )),
+    Scenario('pdd:signed-media', 'get', lambda s: (
+        media.signed_url(s.video_pdd().videofile.name), {}
+    )),
+    Scenario('pdd:uploadsession-list', 'post', lambda s: (
+        reverse('pdd:uploadsession-list'), {'data': {
+            'pdd': s.pdd_id(), 'filename': 'video.mp4', 'size': VIDEO_SIZE,
+        }}
+    ), status=201),
+    Scenario('pdd:uploadsession-detail', 'get', lambda s: (
+        reverse('pdd:uploadsession-detail', args=[s.new_upload().pk]), {}
+    )),
+    Scenario('pdd:uploadsession-detail', 'put', lambda s: (
+        reverse('pdd:uploadsession-detail', args=[s.new_upload().pk]), {
+            'data': s.random_bytes(),
+            'content_type': 'application/octet-stream',
+            'HTTP_CONTENT_RANGE': f'bytes 0-{VIDEO_SIZE - 1}/{VIDEO_SIZE}',
+        }
+    )),
+    Scenario('pdd:uploadsession-detail', 'delete', lambda s: (
+        reverse('pdd:uploadsession-detail', args=[s.new_upload().pk]), {}
+    ), status=204),
+    Scenario('pdd:uploadsession-finalize', 'post', lambda s: (
+        reverse(
+            'pdd:uploadsession-finalize',
+            args=[s.new_upload(complete=True).pk]
+        ), {}
+    )),
+    Scenario('pdd:async-pdd-list', 'get', lambda s: (
+        reverse('pdd:async-pdd-list'), {}
+    )),
+    Scenario('pdd:async-pdd-detail', 'get', lambda s: (
+        reverse('pdd:async-pdd-detail', args=[s.pdd_id()]), {}
+    )),
+]
+
+
+def route_names():
+    """Return the names of all routes in `user.urls` and `pdd.urls`"""
+    from pdd import urls as pdd_urls
+    from user import urls as user_urls
+
+    def names(patterns, namespace):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                yield from names(pattern.url_patterns, namespace)
+            elif isinstance(pattern, URLPattern) and pattern.name:
+                yield f'{namespace}:{pattern.name}'
+
+    return set(names(user_urls.urlpatterns, 'user')) | \
+        set(names(pdd_urls.urlpatterns, 'pdd'))
+
+
+def uncovered_routes():
+    """Return the routes without a scenario"""
+    return route_names() - {scenario.route for scenario in SCENARIOS}
+
+
+def percentile(values, fraction):
+    """Return a percentile of `values`, 0 when there are none"""
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def peak_rss():
+    """Return the peak resident memory of this process in KiB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, KiB elsewhere.
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def run_scenario(scenario, users, concurrency, requests):
+    """Send `requests` requests of a scenario, return its statistics"""
+    latencies = []
+    queries = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker(index):
+        session = Session(users[index % len(users)])
+        count = requests // concurrency + (index < requests % concurrency)
+        executed = [0]
+
+        def counter(execute, sql, params, many, context):
+            executed[0] += 1
+            return execute(sql, params, many, context)
+
+        try:
+            for _ in range(count):
+                try:
+                    path, kwargs = scenario.prepare(session)
+                except Exception as exc:
+                    # E.g. a lock timeout; not a failure of the route.
+                    with lock:
+                        errors.append(type(exc).__name__)
+                    continue
+                send = getattr(session.client, scenario.method)
+                executed[0] = 0
+                with connection.execute_wrapper(counter):
+                    start = time.perf_counter()
+                    response = send(path, **kwargs)
+                    elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    queries.append(executed[0])
+                    if response.status_code != scenario.status:
+                        errors.append(str(response.status_code))
+        finally:
+            connection.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        for future in [executor.submit(worker, index)
+                       for index in range(concurrency)]:
+            future.result()
+    elapsed = time.perf_counter() - start
+
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'statuses': sorted(set(errors)),
+        'throughput': len(latencies) / elapsed,
+        'p50': percentile(latencies, 0.5) * 1000,
+        'p95': percentile(latencies, 0.95) * 1000,
+        'p99': percentile(latencies, 0.99) * 1000,
+        'queries': sum(queries) / len(queries) if queries else 0,
+        'peak_rss': peak_rss(),
+    }
+
+
+def run(concurrency=4, requests=100, only=None, report=None):
+    """
+    Run all scenarios, or those whose name contains `only`, and return
+    the results. `report` is called with each scenario and its result.
+    """
+    users = list(seeding.seeded_users().select_related('auth_token'))
+    results = {
+        'meta': {
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'concurrency': concurrency,
+            'requests': requests,
+        },
+        'routes': {},
+    }
+    for scenario in SCENARIOS:
+        if only and only not in scenario.name:
+            continue
+        result = run_scenario(scenario, users, concurrency, requests)
+        results['routes'][scenario.name] = result
+        if report is not None:
+            report(scenario, result)
+
+    results['peak_rss'] = peak_rss()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Return the regressions of `results` against `baseline`: latency or
+    memory up, or throughput down, by more than `tolerance` (a fraction),
+    and any increase of the queries per request.
+    """
+    regressions = []
+    for name, result in results['routes'].items():
+        base = baseline['routes'].get(name)
+        if base is None:
+            continue
+        for key in ('p50', 'p95', 'p99'):
+            if result[key] > base[key] * (1 + tolerance):
+                regressions.append(
+                    f'{name}: {key} {result[key]:.1f} ms, baseline '
+                    f'{base[key]:.1f} ms'
+                )
+        if result['throughput'] < base['throughput'] * (1 - tolerance):
+            regressions.append(
+                f'{name}: {result["throughput"]:.1f} req/s, baseline '
+                f'{base["throughput"]:.1f} req/s'
+            )
+        if result['queries'] > base['queries'] + 0.01:
+            regressions.append(
+                f'{name}: {result["queries"]:.2f} queries per request, '
+                f'baseline {base["queries"]:.2f}'
+            )
+        if result['errors'] > base['errors']:
+            regressions.append(
+                f'{name}: {result["errors"]} errors, baseline '
+                f'{base["errors"]}'
+            )
+
+    if results['peak_rss'] > baseline['peak_rss'] * (1 + tolerance):
+        regressions.append(
+            f'peak RSS {results["peak_rss"]} KiB, baseline '
+            f'{baseline["peak_rss"]} KiB'
+        )
+    return regressions
@@ -0,0 +1,101 @@
+"""
+Reference counting of content-addressed video files.
+
+Every PDD object whose `videofile` points at a file of the
+ContentAddressedStorage holds one reference on the matching VideoBlob.
+The signal handlers in core.signals keep the counts in step with saves
+and deletions; the file is removed once the last reference is released
+and the transaction has committed. Queryset `update()`/`delete()` calls
+bypass the signals and must call retain()/release() themselves.
+"""
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import F
+
+from core.models import Pdd, VideoBlob
+from core.storage import blob_digest, video_storage
+
+
+def retain(name):
+    """Add a reference to the stored file `name`"""
+    digest = blob_digest(name)
+    if digest is None:
+        return
+
+    updated = VideoBlob.objects.filter(name=name).update(
+        refcount=F('refcount') + 1
+    )
+    if not updated:
+        blob, created = VideoBlob.objects.get_or_create(
+            name=name,
+            defaults={
+                'digest': digest,
+                'size': video_storage.size(name),
+                'refcount': 1,
+            }
+        )
+        if not created:
+            VideoBlob.objects.filter(pk=blob.pk).update(
+                refcount=F('refcount') + 1
+            )
+
+
+def release(name):
+    """Drop a reference to `name`, deleting the file with the last one"""
+    if blob_digest(name) is None:
+        return
+
+    VideoBlob.objects.filter(name=name).update(refcount=F('refcount') - 1)
+    deleted, _ = VideoBlob.objects.filter(
+        name=name,
+        refcount__lte=0
+    ).delete()
+    if deleted:
+        transaction.on_commit(lambda: _purge(name))
+
+
+def release_many(names):
+    """
+    Drop one reference per item of `names` in a few queries, for rows
+    deleted in bulk, deleting the files of the last references
+    """
+    counts = Counter(name for name in names if blob_digest(name))
+    if not counts:
+        return
+
+    by_count = defaultdict(list)
+    for name, count in counts.items():
+        by_count[count].append(name)
+    for count, group in by_count.items():
+        VideoBlob.objects.filter(name__in=group).update(
+            refcount=F('refcount') - count
+        )
+
+    unused = VideoBlob.objects.filter(
+        name__in=list(counts), refcount__lte=0
+    )
+    purged = list(unused.values_list('name', flat=True))
+    unused.delete()
+    for name in purged:
+        transaction.on_commit(lambda name=name: _purge(name))
+
+
+def _purge(name):
+    # A new upload of the same content may have revived the blob.
+    if not VideoBlob.objects.filter(name=name).exists():
+        video_storage.purge(name)
+
+
+def find(digest, user):
+    """
+    Return the stored file with this SHA-256 digest if `user` already
+    references it from one of their PDD objects.
+
+    Lookups are limited to the user's own files so that the digest of a
+    video cannot be used to get hold of somebody else's recording.
+    """
+    return VideoBlob.objects.filter(
+        digest=digest,
+        name__in=Pdd.objects.filter(user=user).values('videofile')
+    ).values_list('name', flat=True).first()
@@ -0,0 +1,149 @@
+"""
+Deletion of users with all their data, without the cascade collector.
+
+Django's collector loads every object depending on a user into memory
+before deleting anything, which takes minutes and gigabytes for heavy
+accounts. delete_user() instead removes the rows table by table, children
+first, BATCH_SIZE ids at a time and each batch in its own transaction.
+Only the ids of a batch (and the file names of PDD objects) are loaded.
+
+Bulk deletes send no signals, so the bookkeeping of core.signals is done
+here: video references are released in core.blobs, whose files are
+removed after each commit, partial upload files are deleted and the
+cached lists of the user are evicted. The user row goes last, through
+the ORM, which clears the remaining small relations (tokens, groups,
+admin log) and the token cache.
+
+schedule() deactivates the user at once, so the account can no longer be
+used, and leaves the work to the `core.delete_user` background job. A
+failed run is retried and picks up where the previous one stopped. Only
+deactivated users are deleted: a job for an account reactivated in the
+meantime does nothing.
+"""
+import os
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+
+from core import blobs
+from core.models import Pdd, UploadChunk, UploadSession, VideoObj
+from core.response_cache import response_cache
+
+BATCH_SIZE = 1000
+
+
+def close(user):
+    """Deactivate `user` and delete their tokens"""
+    with transaction.atomic():
+        user.is_active = False
+        # Saving evicts the cached tokens, see core.signals.
+        user.save(update_fields=['is_active'])
+        Token.objects.filter(user=user).delete()
+
+
+def schedule(user):
+    """Deactivate `user` and queue the deletion of their data"""
+    # core.tasks imports this module.
+    from core.tasks import delete_user
+
+    with transaction.atomic():
+        close(user)
+        return delete_user.delay(user.pk)
+
+
+def delete_user(user_id, batch_size=BATCH_SIZE):
+    """
+    Delete a deactivated user and everything they own, return the rows
+    deleted. Active or unknown users are left alone.
+    """
+    Link = Pdd.videos.through
+    deleted = {}
+
+    # Reactivated since the deletion was scheduled, or deleted already.
+    with transaction.atomic():
+        user = get_user_model().objects.select_for_update().filter(
+            pk=user_id
+        ).only('is_active').first()
+    if user is None or user.is_active:
+        return deleted
+
+    def count(model, number):
+        label = model._meta.label
+        deleted[label] = deleted.get(label, 0) + number
+
+    count(UploadChunk, delete_in_batches(
+        UploadChunk.objects.filter(session__user_id=user_id), batch_size
+    ))
+    count(UploadSession, delete_in_batches(
+        UploadSession.objects.filter(user_id=user_id), batch_size,
+        before=_remove_partial_files
+    ))
+    count(Link, delete_in_batches(
+        Link.objects.filter(pdd__user_id=user_id), batch_size
+    ))
+    count(Link, delete_in_batches(
+        Link.objects.filter(videoobj__user_id=user_id), batch_size
+    ))
+    count(Pdd, delete_in_batches(
+        Pdd.objects.filter(user_id=user_id), batch_size,
+        before=_release_videos
+    ))
+    count(VideoObj, delete_in_batches(
+        VideoObj.objects.filter(user_id=user_id), batch_size
+    ))
+    response_cache.evict(Pdd, user_id)
+    response_cache.evict(VideoObj, user_id)
+
+    with transaction.atomic():
+        _, users = get_user_model().objects.filter(pk=user_id).delete()
+    for label, number in users.items():
+        deleted[label] = deleted.get(label, 0) + number
+
+    return deleted
+
+
+def delete_in_batches(queryset, batch_size, before=None):
+    """
+    Delete the rows of `queryset` with one DELETE per batch of ids,
+    sending no signals. `before` is called with the ids of each batch
+    inside its transaction.
+    """
+    model = queryset.model
+    total = 0
+    while True:
+        with transaction.atomic():
+            pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                return total
+            if before is not None:
+                before(pks)
+            batch = model.objects.filter(pk__in=pks)
+            # Without the collector: the rows depending on these were
+            # deleted before, children first, and the bookkeeping of the
+            # signals is done by `before` and delete_user().
+            total += batch._raw_delete(batch.db)
+
+
+def _release_videos(pks):
+    blobs.release_many(
+        Pdd.objects.filter(pk__in=pks).exclude(
+            videofile=''
+        ).exclude(videofile=None).values_list('videofile', flat=True)
+    )
+
+
+def _remove_partial_files(pks):
+    paths = [
+        session.partial_path
+        for session in UploadSession.objects.filter(pk__in=pks).only('id')
+    ]
+    transaction.on_commit(lambda: _remove_files(paths))
+
+
+def _remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,215 @@
+"""
+Database-backed background jobs.
+
+Functions decorated with `@job` live in the `tasks` module of an app and
+are queued with `enqueue()`, which only inserts a row into core_job.
+Called inside `transaction.atomic()` the job is committed or rolled back
+together with the data it works on, so a worker never picks up a job for
+a PDD object that was not saved.
+
+`manage.py run_workers` claims queued jobs in order of priority and runs
+them in a process pool. A claimed job is invisible to other workers until
+its timeout passes; if the worker dies, the job is run again afterwards.
+Failed jobs are retried with exponential backoff until `max_attempts`.
+"""
+import random
+import time
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from core.models import Job
+
+# Seconds before the first retry, doubled for each further attempt.
+RETRY_DELAY = 10
+MAX_RETRY_DELAY = 3600
+
+registry = {}
+
+
+class JobSpec:
+    """A registered job function with its queueing options"""
+
+    def __init__(self, func, name, priority, max_attempts, timeout,
+                 concurrency):
+        self.func = func
+        self.name = name
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.concurrency = concurrency
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        """Queue a call of the job with the default options"""
+        return enqueue(self.name, *args, **kwargs)
+
+
+def job(name=None, priority=0, max_attempts=5, timeout=300,
+        concurrency=None):
+    """
+    Register a function as a background job.
+
+    `timeout` is the number of seconds a run may take before the job is
+    handed to another worker, `concurrency` the number of runs allowed at
+    the same time, unlimited by default. Arguments must be JSON
+    serializable.
+    """
+    def register(func):
+        spec = JobSpec(
+            func,
+            name or f'{func.__module__}.{func.__name__}',
+            priority,
+            max_attempts,
+            timeout,
+            concurrency
+        )
+        registry[spec.name] = spec
+        return spec
+
+    return register
+
+
+def autodiscover():
+    """Import the `tasks` module of every installed app"""
+    autodiscover_modules('tasks')
+
+
+def enqueue(name, *args, priority=None, delay=0, **kwargs):
+    """Queue a call of the job registered as `name` and return its row"""
+    if isinstance(name, JobSpec):
+        name = name.name
+    spec = registry[name]
+
+    return Job.objects.create(
+        name=name,
+        args=list(args),
+        kwargs=kwargs,
+        priority=spec.priority if priority is None else priority,
+        max_attempts=spec.max_attempts,
+        run_after=timezone.now() + timedelta(seconds=delay)
+    )
+
+
+def claim(limit):
+    """
+    Lock up to `limit` runnable jobs for this worker and return them.
+
+    Concurrency limits are checked against the jobs running when the
+    claim starts.
+    """
+    now = timezone.now()
+    runnable = Q(status=Job.Status.QUEUED, run_after__lte=now) | Q(
+        status=Job.Status.RUNNING, locked_until__lt=now
+    )
+    running = dict(
+        Job.objects.filter(
+            status=Job.Status.RUNNING, locked_until__gte=now
+        ).values_list('name').annotate(count=Count('id')).order_by()
+    )
+
+    claimed = []
+    with transaction.atomic():
+        candidates = Job.objects.filter(runnable).order_by(
+            '-priority', 'run_after', 'id'
+        )
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+
+        for candidate in candidates[:limit * 4]:
+            spec = registry.get(candidate.name)
+            if candidate.attempts >= candidate.max_attempts:
+                _fail(candidate, 'Timed out on the last attempt.')
+                continue
+            if spec is None:
+                _fail(candidate, f'Unknown job "{candidate.name}".')
+                continue
+            if spec.concurrency is not None and \
+                    running.get(spec.name, 0) >= spec.concurrency:
+                continue
+
+            candidate.status = Job.Status.RUNNING
+            candidate.attempts += 1
+            candidate.lock_token = uuid.uuid4()
+            candidate.started_at = now
+            candidate.locked_until = now + timedelta(seconds=spec.timeout)
+            candidate.save(update_fields=[
+                'status', 'attempts', 'lock_token', 'started_at',
+                'locked_until',
+            ])
+            running[spec.name] = running.get(spec.name, 0) + 1
+            claimed.append(candidate)
+            if len(claimed) == limit:
+                break
+
+    return claimed
+
+
+def run(job_id, lock_token):
+    """
+    Run a claimed job and record the outcome.
+
+    Returns (name, status, duration). The outcome is dropped if the job
+    timed out and was claimed by another worker in the meantime.
+    """
+    row = Job.objects.get(pk=job_id)
+    start = time.perf_counter()
+    try:
+        registry[row.name](*row.args, **row.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+    else:
+        error = None
+    duration = time.perf_counter() - start
+
+    mine = Job.objects.filter(
+        pk=job_id, status=Job.Status.RUNNING, lock_token=lock_token
+    )
+    fields = {
+        'duration': duration,
+        'finished_at': timezone.now(),
+        'locked_until': None,
+        'lock_token': None,
+    }
+    if error is None:
+        status = Job.Status.DONE
+        mine.update(status=status, last_error='', **fields)
+    elif row.attempts < row.max_attempts:
+        status = Job.Status.QUEUED
+        mine.update(
+            status=status,
+            last_error=error,
+            run_after=timezone.now() + timedelta(
+                seconds=retry_delay(row.attempts)
+            ),
+            **fields
+        )
+    else:
+        status = Job.Status.FAILED
+        mine.update(status=status, last_error=error, **fields)
+
+    return row.name, status, duration
+
+
+def retry_delay(attempts):
+    """Return the seconds to wait before retrying after `attempts` runs"""
+    delay = min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+    # Spread retries of jobs that failed together.
+    return delay * random.uniform(0.75, 1.25)
+
+
+def _fail(row, error):
+    row.status = Job.Status.FAILED
+    row.last_error = error
+    row.locked_until = row.lock_token = None
+    row.finished_at = timezone.now()
+    row.save(update_fields=[
+        'status', 'last_error', 'locked_until', 'lock_token', 'finished_at',
+    ])
@@ -0,0 +1,50 @@
+"""
+Per-user versions of the API lists.
+
+Every write changing what a list of a user shows bumps the version of
+that list, inside the transaction of the write, with a single upsert.
+pdd.conditional builds the list validators from the version, so checking
+them is one lookup by a unique key, however many rows the user has.
+Writes bypassing signals (bulk inserts, queryset updates) bump the
+version themselves.
+"""
+from django.db import connection
+from django.utils import timezone
+
+from core.models import ListVersion
+from core.response_cache import response_cache
+
+
+def label(model):
+    return model._meta.label_lower
+
+
+def bump(user_id, *models):
+    """Record a change of the lists of `models` of a user"""
+    quote = connection.ops.quote_name
+    table = quote(ListVersion._meta.db_table)
+    field = ListVersion._meta.get_field('changed_at')
+    changed_at = field.get_db_prep_value(timezone.now(), connection)
+    values = ', '.join(['(%s, %s, 1, %s)'] * len(models))
+    params = []
+    for model in models:
+        params += [user_id, label(model), changed_at]
+    # INSERT ... ON CONFLICT works on PostgreSQL and SQLite alike.
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (user_id, model, version, changed_at) '
+            f'VALUES {values} ON CONFLICT (user_id, model) DO UPDATE SET '
+            f'version = {table}.version + 1, changed_at = excluded.changed_at',
+            params
+        )
+    for model in models:
+        # The cached pages are unreachable now, free their memory.
+        response_cache.evict(model, user_id)
+
+
+def get(model, user_id):
+    """Return the version of the `model` list of a user and its time"""
+    row = ListVersion.objects.filter(
+        user_id=user_id, model=label(model)
+    ).values_list('version', 'changed_at').first()
+    return row or (0, None)
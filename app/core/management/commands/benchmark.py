@@ -0,0 +1,131 @@
+import json
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from core import benchmark, seeding
+
+
+class Command(BaseCommand):
+    """Django command running the API benchmark of core.benchmark"""
+    help = (
+        'Benchmark every API route against seeded data in a throwaway '
+        'database and optionally compare the results with a baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument(
+            '--videos', type=int, default=50,
+            help='Video objects per user.'
+        )
+        parser.add_argument(
+            '--pdds', type=int, default=200, help='PDD objects per user.'
+        )
+        parser.add_argument(
+            '--fanout', type=int, default=3,
+            help='Videos linked to each PDD object.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument(
+            '--requests', type=int, default=100,
+            help='Requests per scenario.'
+        )
+        parser.add_argument(
+            '--only', help='Run the scenarios whose name contains this.'
+        )
+        parser.add_argument('--output', help='Write the results as JSON.')
+        parser.add_argument(
+            '--baseline', help='Compare with the results in this file.'
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Allowed slowdown as a fraction of the baseline.'
+        )
+        parser.add_argument(
+            '--keepdb', action='store_true',
+            help='Keep and reuse the benchmark database.'
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as file:
+                baseline = json.load(file)
+
+        if connection.vendor == 'sqlite' and options['concurrency'] > 1:
+            self.stderr.write(
+                'SQLite locks whole tables, expect lock errors with '
+                '--concurrency above 1.'
+            )
+
+        uncovered = benchmark.uncovered_routes()
+        if uncovered:
+            self.stderr.write(
+                f'Routes without a scenario: {", ".join(sorted(uncovered))}'
+            )
+
+        # Like the test runner, never touch the configured database.
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options['keepdb']
+        )
+        try:
+            # Settings of the test client, as in the test runner.
+            with tempfile.TemporaryDirectory() as media_root, \
+                    override_settings(
+                        MEDIA_ROOT=media_root,
+                        ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                        DEBUG=False):
+                results = self.run(options)
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options['keepdb']
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, indent=2)
+        self.stdout.write(f'Peak RSS: {results["peak_rss"]} KiB')
+
+        if baseline is not None:
+            regressions = benchmark.compare(
+                results, baseline, options['tolerance']
+            )
+            for regression in regressions:
+                self.stderr.write(regression)
+            if regressions:
+                raise CommandError(
+                    f'{len(regressions)} regressions against the baseline.'
+                )
+            self.stdout.write('No regressions against the baseline.')
+
+    def run(self, options):
+        seeding.seed(
+            users=options['users'],
+            videos=options['videos'],
+            pdds=options['pdds'],
+            fanout=options['fanout'],
+            seed=options['seed'],
+        )
+        self.stdout.write(
+            f'{"scenario":<36} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} '
+            f'{"p99 ms":>8} {"queries":>8} {"errors":>7}'
+        )
+        return benchmark.run(
+            concurrency=options['concurrency'],
+            requests=options['requests'],
+            only=options['only'],
+            report=self.report,
+        )
+
+    def report(self, scenario, result):
+        self.stdout.write(
+            f'{scenario.name:<36} {result["throughput"]:>8.1f} '
+            f'{result["p50"]:>8.1f} {result["p95"]:>8.1f} '
+            f'{result["p99"]:>8.1f} {result["queries"]:>8.2f} '
+            f'{result["errors"]:>7}'
+        )
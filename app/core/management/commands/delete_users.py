@@ -0,0 +1,42 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core import deletion
+
+
+class Command(BaseCommand):
+    """Django command deleting users with all their data"""
+    help = (
+        'Close the accounts of the given users and delete their data in '
+        'the background, or right away with --now.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('emails', nargs='+')
+        parser.add_argument(
+            '--now', action='store_true',
+            help='Delete in this process instead of a background job.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=deletion.BATCH_SIZE,
+            help='Rows deleted per statement, with --now.'
+        )
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.filter(email__in=options['emails'])
+        missing = set(options['emails']) - {user.email for user in users}
+        if missing:
+            raise CommandError(f'Unknown users: {", ".join(sorted(missing))}')
+
+        for user in users:
+            if not options['now']:
+                job = deletion.schedule(user)
+                self.stdout.write(f'{user.email}: queued as job {job.pk}')
+                continue
+
+            deletion.close(user)
+            deleted = deletion.delete_user(user.pk, options['batch_size'])
+            counts = ', '.join(
+                f'{number} {label}' for label, number in deleted.items()
+            )
+            self.stdout.write(f'{user.email}: deleted {counts}')
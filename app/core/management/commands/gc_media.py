@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from core import orphans
+
+
+class Command(BaseCommand):
+    """Django command deleting media files nothing refers to"""
+    help = (
+        'Delete stored videos no PDD object refers to, and the leftovers '
+        'of abandoned uploads.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report what would be deleted.'
+        )
+        parser.add_argument(
+            '--grace', type=int, default=orphans.GRACE_PERIOD,
+            help='Keep files modified within this many seconds.'
+        )
+        parser.add_argument(
+            '--rate', type=float,
+            help='Delete at most this many files per second.'
+        )
+
+    def handle(self, *args, **options):
+        reports = orphans.collect(
+            dry_run=options['dry_run'],
+            grace=options['grace'],
+            rate=options['rate'],
+        )
+        for report in reports:
+            self.stdout.write(str(report))
+
+        total = sum(report.bytes for report in reports)
+        files = sum(report.orphans for report in reports)
+        verb = 'Would reclaim' if options['dry_run'] else 'Reclaimed'
+        self.stdout.write(
+            self.style.SUCCESS(f'{verb} {total} bytes in {files} files.')
+        )
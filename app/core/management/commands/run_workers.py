@@ -0,0 +1,129 @@
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.management.base import BaseCommand
+
+from core import jobs
+from core.workers import init_worker, run_job
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """Django command running background jobs from core.jobs"""
+    help = 'Run queued background jobs in a pool of worker processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count(),
+            help='Worker processes; 0 runs jobs in this process.'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Seconds to sleep when no job is runnable.'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit as soon as no job is runnable.'
+        )
+
+    def handle(self, *args, **options):
+        jobs.autodiscover()
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+
+        if options['processes'] == 0:
+            self.run_inline(options)
+            return
+
+        pool = self.make_pool(options['processes'])
+        running = set()
+        try:
+            while not self.stopping:
+                free = options['processes'] - len(running)
+                claimed = jobs.claim(free) if free else []
+                for job in claimed:
+                    running.add(pool.submit(run_job, job.pk, job.lock_token))
+                if not running:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                # Wake up for new jobs while some processes are idle.
+                idle = len(running) < options['processes']
+                done, running = wait(
+                    running,
+                    timeout=options['poll_interval'] if idle else None,
+                    return_when=FIRST_COMPLETED
+                )
+                broken = False
+                for future in done:
+                    broken |= not self.collect(future)
+                if broken:
+                    # The other running jobs went down with the pool.
+                    for future in wait(running).done:
+                        self.collect(future)
+                    running = set()
+                    pool.shutdown(wait=False)
+                    pool = self.make_pool(options['processes'])
+        except KeyboardInterrupt:
+            self.stopping = True
+        finally:
+            # Let running jobs finish, queued ones stay in the database.
+            for future in wait(running).done:
+                self.collect(future)
+            pool.shutdown()
+
+    def make_pool(self, processes):
+        """Return a pool of `processes` worker processes"""
+        # Spawned rather than forked processes never share the database
+        # connections of this one.
+        return ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker
+        )
+
+    def collect(self, future):
+        """
+        Report the outcome of a job run in the pool, False if the pool
+        broke. A job whose run raised stays claimed and is run again once
+        its visibility timeout passed.
+        """
+        try:
+            self.report(*future.result())
+        except BrokenProcessPool:
+            logger.exception('A worker process died.')
+            return False
+        except Exception:
+            logger.exception('Running a job failed.')
+        return True
+
+    def run_inline(self, options):
+        """Run jobs one by one without a pool, handy for debugging"""
+        while not self.stopping:
+            claimed = jobs.claim(1)
+            if not claimed:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+            try:
+                self.report(
+                    *jobs.run(claimed[0].pk, claimed[0].lock_token)
+                )
+            except Exception:
+                logger.exception('Running a job failed.')
+
+    def report(self, name, status, duration):
+        style = self.style.SUCCESS if status == 'done' else self.style.ERROR
+        self.stdout.write(style(f'{name}: {status} in {duration:.3f}s'))
+
+    def stop(self, signum, frame):
+        self.stopping = True
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+
+from core import seeding
+
+
+class Command(BaseCommand):
+    """Django command filling the database with synthetic data"""
+    help = (
+        'Create benchmark users with their videos and PDD objects, '
+        'continuing after the users of an earlier run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument(
+            '--videos', type=int, default=50,
+            help='Mean number of video objects per user.'
+        )
+        parser.add_argument(
+            '--pdds', type=int, default=200,
+            help='Mean number of PDD objects per user.'
+        )
+        parser.add_argument(
+            '--fanout', type=int, default=3,
+            help='Mean number of videos linked to each PDD object.'
+        )
+        parser.add_argument(
+            '--distribution', choices=seeding.DISTRIBUTIONS,
+            default='constant', help='Distribution of the counts.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--batch-rows', type=int, default=100000,
+            help='Rows written per transaction.'
+        )
+
+    def handle(self, *args, **options):
+        done = seeding.seeded_users().count()
+        if done:
+            self.stdout.write(f'Continuing after {done} seeded users.')
+        seeding.seed(
+            users=options['users'],
+            videos=options['videos'],
+            pdds=options['pdds'],
+            fanout=options['fanout'],
+            seed=options['seed'],
+            distribution=options['distribution'],
+            batch_rows=options['batch_rows'],
+            progress=self.progress,
+        )
+        self.stdout.write(self.style.SUCCESS('Done.'))
+
+    def progress(self, users, rows, seconds):
+        self.stdout.write(
+            f'{users} users, {rows} rows in {seconds:.1f}s '
+            f'({rows / max(seconds, 1e-6):.0f} rows/s)'
+        )
@@ -0,0 +1,79 @@
+"""
+Signed, expiring URLs for stored videos.
+
+The API hands out video URLs carrying an expiry time and an HMAC of the
+file name and that time, keyed with SECRET_KEY. pdd.views.signed_media
+checks the signature and serves the file without touching the database:
+no token lookup and no ownership query, also for every seek of a player.
+Whoever holds the URL can fetch the video until it expires, like a
+presigned URL of an object store.
+
+Time is cut into windows of WINDOW seconds and URLs signed within one
+window share their expiry time, so a URL stays the same within a window
+and cached API responses stay valid. Responses listing
+signed URLs change at the start of every window, see
+ConditionalMixin.signs_media_urls.
+
+With OFFLOAD set, the view only checks the signature and hands the
+transfer to the front proxy: `x-accel-redirect` for nginx, with an
+internal location mapping ACCEL_PREFIX to MEDIA_ROOT, or `x-sendfile`
+for Apache and lighttpd. Otherwise Django streams the file itself with
+byte range support.
+"""
+import time
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+DEFAULTS = {
+    # Seconds a URL stays valid at least.
+    'MAX_AGE': 3600,
+    # Seconds during which the same URL is handed out.
+    'WINDOW': 300,
+    # None to stream from Django, 'x-accel-redirect' or 'x-sendfile'.
+    'OFFLOAD': None,
+    # Internal nginx location serving MEDIA_ROOT, for x-accel-redirect.
+    'ACCEL_PREFIX': '/protected-media/',
+}
+
+SALT = 'core.media'
+
+
+def media_settings():
+    return {**DEFAULTS, **getattr(settings, 'SIGNED_MEDIA', {})}
+
+
+def window_start(now=None):
+    """Return when the current window of expiry times started"""
+    window = media_settings()['WINDOW']
+    now = time.time() if now is None else now
+    return int(now // window * window)
+
+
+def signature(name, expires):
+    return salted_hmac(
+        SALT, f'{name}:{expires}', algorithm='sha256'
+    ).hexdigest()
+
+
+def signed_url(name, now=None):
+    """Return the signed URL of the stored video `name`"""
+    config = media_settings()
+    # Valid for at least MAX_AGE, the same URL for the whole window.
+    expires = window_start(now) + config['WINDOW'] + config['MAX_AGE']
+
+    url = reverse('pdd:signed-media', args=[name])
+    return f'{url}?expires={expires}&signature={signature(name, expires)}'
+
+
+def verify(name, expires, given):
+    """Check the signature of a URL for `name` and that it has not expired"""
+    try:
+        expires = int(expires)
+    except (TypeError, ValueError):
+        return False
+    if expires < time.time():
+        return False
+
+    return constant_time_compare(signature(name, expires), given or '')
@@ -0,0 +1,428 @@
+"""
+Per-request performance instrumentation.
+
+MetricsMiddleware times every request and adds it to a latency histogram
+of its route. A sample of the requests (SAMPLE_RATE) is also timed in
+detail: SQL queries and their time, authentication, serializers and
+rendering. Those are returned in a Server-Timing header, which browser
+developer tools show next to the request, and summed up per route.
+
+Each process keeps its histograms in memory and writes them to a file of
+its own in METRICS_DIR every FLUSH_INTERVAL seconds. The /metrics view
+merges the files of all workers into the Prometheus text format. Counts
+are cumulative, so clear the directory when deploying, like the
+multiprocess mode of the Prometheus client.
+
+Unsampled requests only pay for two clock reads and a histogram update;
+with METRICS_DIR unset as well, the middleware is a plain pass-through.
+"""
+import asyncio
+import glob
+import hmac
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+
+DEFAULTS = {
+    # Fraction of the requests timed in detail, between 0 and 1.
+    'SAMPLE_RATE': 0.0,
+    # Directory the worker processes share their histograms in, None
+    # disables the histograms and /metrics.
+    'METRICS_DIR': None,
+    # Seconds between two writes of the histograms of a process.
+    'FLUSH_INTERVAL': 5,
+    # Bearer token required by /metrics, if set.
+    'METRICS_TOKEN': None,
+}
+
+# Upper bounds of the latency buckets, in seconds.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_local = threading.local()
+
+
+def metrics_settings():
+    return {**DEFAULTS, **getattr(settings, 'SERVER_TIMING', {})}
+
+
+class Timings:
+    """Durations measured during one request, in seconds"""
+
+    def __init__(self):
+        self.durations = {}
+        self.queries = 0
+
+    def add(self, name, duration):
+        self.durations[name] = self.durations.get(name, 0) + duration
+
+    def execute(self, execute, sql, params, many, context):
+        """Database execute wrapper counting and timing the queries"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add('db', time.perf_counter() - start)
+            self.queries += 1
+
+    def header(self, total, size):
+        """Return the value of the Server-Timing header"""
+        metrics = [f'db;dur={self.durations.get("db", 0) * 1000:.2f};'
+                   f'desc="{self.queries} queries"']
+        metrics += [
+            f'{name};dur={duration * 1000:.2f}'
+            for name, duration in self.durations.items() if name != 'db'
+        ]
+        metrics.append(f'total;dur={total * 1000:.2f}')
+        if size is not None:
+            metrics.append(f'size;desc="{size} bytes"')
+        return ', '.join(metrics)
+
+
+def current():
+    """Return the Timings of the request sampled in this thread, if any"""
+    return getattr(_local, 'timings', None)
+
+
+@contextmanager
+def activate(timings):
+    """Record into `timings` in this thread, no-op for None"""
+    if timings is None:
+        yield
+        return
+
+    previous = current()
+    _local.timings = timings
+    try:
+        with connection.execute_wrapper(timings.execute):
+            yield
+    finally:
+        _local.timings = previous
+
+
+@contextmanager
+def timed(name):
+    """Add the time spent in the block to the sampled request, if any"""
+    timings = current()
+    if timings is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+
+
+class TimedSerializer:
+    """Time validation and serialization of the class mixed into"""
+
+    def is_valid(self, *args, **kwargs):
+        with timed('serialize'):
+            return super().is_valid(*args, **kwargs)
+
+    @property
+    def data(self):
+        with timed('serialize'):
+            return super().data
+
+
+_timed_classes = {}
+
+
+def timed_class(cls):
+    """Return the serializer class `cls` with TimedSerializer mixed in"""
+    if cls not in _timed_classes:
+        _timed_classes[cls] = type(cls.__name__, (TimedSerializer, cls), {})
+    return _timed_classes[cls]
+
+
+def timed_serializer(serializer):
+    """Time `serializer`, a list serializer included, when sampled"""
+    if current() is None or isinstance(serializer, TimedSerializer):
+        return serializer
+
+    serializer.__class__ = timed_class(type(serializer))
+    return serializer
+
+
+class ServerTimingMixin:
+    """Time authentication and the serializers of an API view"""
+
+    def perform_authentication(self, request):
+        with timed('auth'):
+            super().perform_authentication(request)
+
+    def get_serializer(self, *args, **kwargs):
+        return timed_serializer(super().get_serializer(*args, **kwargs))
+
+
+class Histograms:
+    """Latency histograms and totals per route of one process"""
+
+    def __init__(self, directory, flush_interval):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.path = os.path.join(
+            directory, f'{os.getpid()}-{uuid.uuid4().hex[:8]}.json'
+        )
+        self.routes = {}
+        self.flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def observe(self, route, method, duration, size, timings):
+        key = f'{route} {method}'
+        with self._lock:
+            entry = self.routes.get(key)
+            if entry is None:
+                entry = self.routes[key] = {
+                    'buckets': [0] * (len(BUCKETS) + 1),
+                    'sum': 0.0,
+                    'bytes': 0,
+                    'sampled': 0,
+                    'queries': 0,
+                    'phases': {},
+                }
+            entry['buckets'][bisect_left(BUCKETS, duration)] += 1
+            entry['sum'] += duration
+            entry['bytes'] += size or 0
+            if timings is not None:
+                entry['sampled'] += 1
+                entry['queries'] += timings.queries
+                phases = entry['phases']
+                for name, value in timings.durations.items():
+                    phases[name] = phases.get(name, 0) + value
+
+        if time.monotonic() - self.flushed_at > self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Write the histograms of this process to its file"""
+        with self._lock:
+            data = json.dumps(self.routes)
+            self.flushed_at = time.monotonic()
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = f'{self.path}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'w') as file:
+            file.write(data)
+        os.replace(temp_path, self.path)
+
+
+def merge(directory):
+    """Sum the histograms written by all processes"""
+    routes = {}
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        try:
+            with open(path) as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            # Removed by a clean up, or written by another version.
+            continue
+        for key, entry in data.items():
+            total = routes.get(key)
+            if total is None:
+                routes[key] = entry
+                continue
+            total['buckets'] = [
+                a + b for a, b in zip(total['buckets'], entry['buckets'])
+            ]
+            for field in ('sum', 'bytes', 'sampled', 'queries'):
+                total[field] += entry[field]
+            for name, value in entry['phases'].items():
+                total['phases'][name] = total['phases'].get(name, 0) + value
+    return routes
+
+
+def _labels(**labels):
+    return ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\')
+                         .replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels.items()
+    )
+
+
+def exposition(routes):
+    """Return the histograms in the Prometheus text format"""
+    lines = [
+        '# HELP http_request_duration_seconds Request latency per route.',
+        '# TYPE http_request_duration_seconds histogram',
+    ]
+    for key, entry in sorted(routes.items()):
+        route, method = key.rsplit(' ', 1)
+        labels = _labels(route=route, method=method)
+        count = 0
+        for bound, value in zip(BUCKETS + ('+Inf',), entry['buckets']):
+            count += value
+            lines.append(
+                f'http_request_duration_seconds_bucket'
+                f'{{{labels},le="{bound}"}} {count}'
+            )
+        lines.append(
+            f'http_request_duration_seconds_sum{{{labels}}} {entry["sum"]}'
+        )
+        lines.append(
+            f'http_request_duration_seconds_count{{{labels}}} {count}'
+        )
+
+    counters = (
+        ('http_response_size_bytes_total', 'Response bytes per route.',
+         'bytes'),
+        ('http_requests_sampled_total', 'Requests timed in detail.',
+         'sampled'),
+        ('http_request_sql_queries_total',
+         'SQL queries of the sampled requests.', 'queries'),
+    )
+    for name, help_text, field in counters:
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for key, entry in sorted(routes.items()):
+            route, method = key.rsplit(' ', 1)
+            labels = _labels(route=route, method=method)
+            lines.append(f'{name}{{{labels}}} {entry[field]}')
+
+    lines += [
+        '# HELP http_request_phase_seconds_total Time of the sampled '
+        'requests per phase.',
+        '# TYPE http_request_phase_seconds_total counter',
+    ]
+    for key, entry in sorted(routes.items()):
+        route, method = key.rsplit(' ', 1)
+        for phase, value in sorted(entry['phases'].items()):
+            labels = _labels(route=route, method=method, phase=phase)
+            lines.append(f'http_request_phase_seconds_total{{{labels}}} '
+                         f'{value}')
+
+    return '\n'.join(lines) + '\n'
+
+
+_histograms = None
+_histograms_lock = threading.Lock()
+
+
+def histograms():
+    """Return the histograms of this process, None when disabled"""
+    global _histograms
+    config = metrics_settings()
+    if not config['METRICS_DIR']:
+        return None
+
+    with _histograms_lock:
+        if _histograms is None or \
+                _histograms.directory != config['METRICS_DIR']:
+            _histograms = Histograms(
+                config['METRICS_DIR'], config['FLUSH_INTERVAL']
+            )
+        return _histograms
+
+
+def _response_size(response):
+    if not response.streaming:
+        return len(response.content)
+    if response.has_header('Content-Length'):
+        return int(response['Content-Length'])
+    return None
+
+
+class MetricsMiddleware:
+    """
+    Time requests, see the module docstring.
+
+    Like MiddlewareMixin it runs in the mode of the handler, so under ASGI
+    the middleware chain stays async and Django does not run all requests
+    through a single thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        config = metrics_settings()
+        self.sample_rate = config['SAMPLE_RATE']
+        self.histograms = histograms()
+        if asyncio.iscoroutinefunction(get_response):
+            # Tell Django to await this middleware.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if not self.sample_rate and self.histograms is None:
+            return self.get_response(request)
+
+        timings = self.sample(request)
+        start = time.perf_counter()
+        with activate(timings):
+            response = self.get_response(request)
+        return self.record(request, response, timings, start)
+
+    async def __acall__(self, request):
+        if not self.sample_rate and self.histograms is None:
+            return await self.get_response(request)
+
+        timings = self.sample(request)
+        start = time.perf_counter()
+        # Not activated here, the event loop thread serves many requests
+        # at once. Async views activate it in their threads, see
+        # core.threadpool.
+        response = await self.get_response(request)
+        return self.record(request, response, timings, start)
+
+    def sample(self, request):
+        """Return the Timings of `request` if it is timed in detail"""
+        timings = None
+        if self.sample_rate and random.random() < self.sample_rate:
+            timings = Timings()
+        request.server_timing = timings
+        return timings
+
+    def record(self, request, response, timings, start):
+        total = time.perf_counter() - start
+        size = _response_size(response)
+        if timings is not None:
+            response['Server-Timing'] = timings.header(total, size)
+        if self.histograms is not None:
+            match = request.resolver_match
+            self.histograms.observe(
+                match.view_name if match else 'unmatched',
+                request.method, total, size, timings
+            )
+        return response
+
+    def process_template_response(self, request, response):
+        """Time rendering, which follows this hook"""
+        timings = getattr(request, 'server_timing', None)
+        if timings is not None:
+            start = time.perf_counter()
+            response.add_post_render_callback(
+                lambda response: timings.add(
+                    'render', time.perf_counter() - start
+                )
+            )
+        return response
+
+
+def metrics_view(request):
+    """Serve the merged histograms of all worker processes"""
+    config = metrics_settings()
+    current_histograms = histograms()
+    if current_histograms is None:
+        raise Http404
+
+    token = config['METRICS_TOKEN']
+    if token and not hmac.compare_digest(
+            request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+
+    current_histograms.flush()
+    return HttpResponse(
+        exposition(merge(config['METRICS_DIR'])),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -0,0 +1,30 @@
+# Generated by Django 3.1.14 on 2026-10-18 12:15
+
+import core.models
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_uploadsession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoBlob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('digest', models.CharField(db_index=True, max_length=64)),
+                ('size', models.PositiveBigIntegerField()),
+                ('refcount', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='pdd',
+            name='videofile',
+            field=models.FileField(null=True, storage=core.storage.ContentAddressedStorage(), upload_to=core.models.pddobj_video_file_path),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.1.14 on 2026-10-18 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_videoblob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pdd',
+            index=models.Index(fields=['user', 'timestamp', 'id'], name='core_pdd_user_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='videoobj',
+            index=models.Index(fields=['user', '-title', 'id'], name='core_videoobj_user_title_idx'),
+        ),
+    ]
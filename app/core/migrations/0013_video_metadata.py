@@ -0,0 +1,54 @@
+# Generated by Django 3.1.14 on 2026-10-18 12:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdd',
+            name='video_bitrate',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pdd',
+            name='video_codec',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='pdd',
+            name='video_duration',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pdd',
+            name='video_height',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pdd',
+            name='video_width',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='pdd',
+            index=models.Index(fields=['user', 'video_duration'], name='core_pdd_user_duration_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pdd',
+            index=models.Index(fields=['user', 'video_height', 'video_width'], name='core_pdd_user_resolution_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pdd',
+            index=models.Index(fields=['user', 'video_codec'], name='core_pdd_user_codec_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pdd',
+            index=models.Index(fields=['user', 'video_bitrate'], name='core_pdd_user_bitrate_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.1.14 on 2026-10-18 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_video_metadata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('method', models.CharField(max_length=10)),
+                ('path', models.CharField(max_length=2000)),
+                ('status_code', models.PositiveSmallIntegerField()),
+                ('duration', models.FloatField()),
+                ('queries', models.PositiveIntegerField()),
+                ('sql_duration', models.FloatField()),
+                ('trigger', models.CharField(choices=[('signed', 'Signed'), ('sampled', 'Sampled')], max_length=10)),
+                ('requested_by', models.CharField(blank=True, max_length=255)),
+            ],
+        ),
+    ]
@@ -0,0 +1,65 @@
+from django.db import migrations
+
+# Table and searchable column, see core.search.
+TABLES = [
+    ('core_pdd', 'name'),
+    ('core_videoobj', 'title'),
+]
+CONFIG = 'pg_catalog.simple'
+
+
+def add_search(apps, schema_editor):
+    """Add the search columns, triggers and indexes on PostgreSQL"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # GIN indexes on the user column next to the text.
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS btree_gin')
+    for table, column in TABLES:
+        schema_editor.execute(
+            f'ALTER TABLE {table} ADD COLUMN search_vector tsvector'
+        )
+        schema_editor.execute(
+            f'UPDATE {table} SET search_vector = '
+            f"to_tsvector('{CONFIG}', {column})"
+        )
+        schema_editor.execute(
+            f'CREATE TRIGGER {table}_search_vector_update '
+            f'BEFORE INSERT OR UPDATE OF {column} ON {table} '
+            f'FOR EACH ROW EXECUTE PROCEDURE tsvector_update_trigger('
+            f"search_vector, '{CONFIG}', {column})"
+        )
+        schema_editor.execute(
+            f'CREATE INDEX {table}_search_idx ON {table} '
+            f'USING gin (user_id, search_vector)'
+        )
+        schema_editor.execute(
+            f'CREATE INDEX {table}_{column}_trgm_idx ON {table} '
+            f'USING gin (user_id, {column} gin_trgm_ops)'
+        )
+
+
+def remove_search(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    for table, column in TABLES:
+        schema_editor.execute(
+            f'DROP TRIGGER {table}_search_vector_update ON {table}'
+        )
+        schema_editor.execute(f'DROP INDEX {table}_{column}_trgm_idx')
+        schema_editor.execute(
+            f'ALTER TABLE {table} DROP COLUMN search_vector'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_requestprofile'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search, remove_search),
+    ]
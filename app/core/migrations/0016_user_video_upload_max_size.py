@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-18 12:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='video_upload_max_size',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.14 on 2026-10-18 12:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_user_video_upload_max_size'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pdd',
+            index=models.Index(fields=['videofile'], name='core_pdd_videofile_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.14 on 2026-10-18 12:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_pdd_videofile_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pdd',
+            index=models.Index(fields=['timestamp'], name='core_pdd_timestamp_idx'),
+        ),
+    ]
@@ -4,6 +4,9 @@ from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, \
                                         PermissionsMixin
 from django.conf import settings
+from django.utils import timezone
+
+from core.storage import video_storage
 
 
 def pddobj_video_file_path(instance, filename):
@@ -42,6 +45,10 @@ class User(AbstractBaseUser, PermissionsMixin):
     name = models.CharField(max_length=254)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    # Overrides VIDEO_UPLOAD_MAX_SIZE, see core.uploads.max_size().
+    video_upload_max_size = models.PositiveBigIntegerField(
+        null=True, blank=True
+    )
 
     objects = UserManager()
 
@@ -55,6 +62,16 @@ class VideoObj(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE  # Delete video if user is removed.
     )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Listing a user's videos, see VideoObjViewSet.get_queryset.
+            models.Index(
+                fields=['user', '-title', 'id'],
+                name='core_videoobj_user_title_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.title
@@ -67,9 +84,221 @@ class Pdd(models.Model):
         on_delete=models.CASCADE  # Delete video if user is removed.
     )
     videos = models.ManyToManyField('VideoObj')
-    videofile = models.FileField(null=True, upload_to=pddobj_video_file_path)
+    videofile = models.FileField(
+        null=True,
+        upload_to=pddobj_video_file_path,
+        storage=video_storage
+    )
     name = models.CharField(max_length=255)
     timestamp = models.DateTimeField()
+    # Also bumped when the linked videos change, see core.signals.
+    updated_at = models.DateTimeField(auto_now=True)
+    # Read from the container headers of `videofile`, see core.tasks.
+    video_duration = models.FloatField(null=True, blank=True)
+    video_width = models.PositiveIntegerField(null=True, blank=True)
+    video_height = models.PositiveIntegerField(null=True, blank=True)
+    video_codec = models.CharField(max_length=32, blank=True)
+    video_bitrate = models.PositiveBigIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Listing and time filtering, see PddViewSet.get_queryset.
+            models.Index(
+                fields=['user', 'timestamp', 'id'],
+                name='core_pdd_user_timestamp_idx'
+            ),
+            # Filtering and sorting a user's PDDs by their video.
+            models.Index(
+                fields=['user', 'video_duration'],
+                name='core_pdd_user_duration_idx'
+            ),
+            models.Index(
+                fields=['user', 'video_height', 'video_width'],
+                name='core_pdd_user_resolution_idx'
+            ),
+            models.Index(
+                fields=['user', 'video_codec'],
+                name='core_pdd_user_codec_idx'
+            ),
+            models.Index(
+                fields=['user', 'video_bitrate'],
+                name='core_pdd_user_bitrate_idx'
+            ),
+            # Browsing by date in the admin, see core.admin.PddAdmin.
+            models.Index(
+                fields=['timestamp'],
+                name='core_pdd_timestamp_idx'
+            ),
+            # Looking up the PDD objects of a stored file, see core.blobs
+            # and core.orphans.
+            models.Index(
+                fields=['videofile'],
+                name='core_pdd_videofile_idx'
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'videofile' in instance.__dict__:
+            # Remember the stored file to spot replaced videos on save.
+            instance._loaded_videofile = instance.__dict__['videofile']
+        return instance
+
+    def __str__(self):
+        return self.name
+
+
+class ListVersion(models.Model):
+    """
+    Version of the list of one model of a user, bumped by every write
+    changing it, see core.listversions
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE
+    )
+    # Label of the model listed, e.g. `core.pdd`.
+    model = models.CharField(max_length=100)
+    version = models.PositiveBigIntegerField(default=0)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'model'],
+                name='core_listversion_user_model'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.model} of user {self.user_id}: {self.version}'
+
+
+class VideoBlob(models.Model):
+    """A content-addressed video file shared by PDD objects"""
+    name = models.CharField(max_length=255, unique=True)
+    digest = models.CharField(max_length=64, db_index=True)
+    size = models.PositiveBigIntegerField()
+    refcount = models.IntegerField(default=0)
 
     def __str__(self):
         return self.name
+
+
+class UploadSession(models.Model):
+    """Resumable, chunked upload of a video file to a PDD object"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE
+    )
+    pdd = models.ForeignKey(
+        'Pdd',
+        on_delete=models.CASCADE,
+        related_name='upload_sessions'
+    )
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def partial_path(self):
+        """Path of the file the chunks are written into"""
+        return os.path.join(
+            settings.MEDIA_ROOT, 'uploads/partial/', f'{self.id}.part'
+        )
+
+    def received_ranges(self):
+        """Return the merged [start, end) byte ranges received so far"""
+        ranges = []
+        for offset, length in self.chunks.order_by(
+                'offset').values_list('offset', 'length'):
+            end = offset + length
+            if ranges and offset <= ranges[-1][1]:
+                ranges[-1][1] = max(ranges[-1][1], end)
+            else:
+                ranges.append([offset, end])
+
+        return ranges
+
+    def __str__(self):
+        return self.filename
+
+
+class UploadChunk(models.Model):
+    """A byte range received for an upload session"""
+    session = models.ForeignKey(
+        'UploadSession',
+        on_delete=models.CASCADE,
+        related_name='chunks'
+    )
+    offset = models.PositiveBigIntegerField()
+    length = models.PositiveBigIntegerField()
+
+
+class Job(models.Model):
+    """A unit of background work, run by `manage.py run_workers`"""
+
+    class Status(models.TextChoices):
+        QUEUED = 'queued'
+        RUNNING = 'running'
+        DONE = 'done'
+        FAILED = 'failed'
+
+    name = models.CharField(max_length=255)
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    # Higher priorities run first.
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.QUEUED
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    # A running job not finished by then is handed to another worker.
+    locked_until = models.DateTimeField(null=True, blank=True)
+    lock_token = models.UUIDField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration = models.FloatField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # Claiming the next jobs, see core.jobs.claim.
+            models.Index(
+                fields=['status', '-priority', 'run_after', 'id'],
+                name='core_job_claim_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
+
+
+class RequestProfile(models.Model):
+    """A request run under the profiler, see core.profiling"""
+
+    class Trigger(models.TextChoices):
+        SIGNED = 'signed'
+        SAMPLED = 'sampled'
+
+    # Base name of the files written for the profile.
+    name = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=2000)
+    status_code = models.PositiveSmallIntegerField()
+    duration = models.FloatField()
+    queries = models.PositiveIntegerField()
+    sql_duration = models.FloatField()
+    trigger = models.CharField(max_length=10, choices=Trigger.choices)
+    requested_by = models.CharField(max_length=255, blank=True)
+
+    def __str__(self):
+        return f'{self.method} {self.path} ({self.name})'
@@ -0,0 +1,188 @@
+"""
+Removal of media files nothing refers to any more.
+
+Reference counting (core.blobs) deletes stored videos as PDD objects let
+go of them, but files slip through: those stored before the counting
+existed, those of rows removed with queryset or raw SQL deletes, scratch
+files of crashed uploads and the partial files of abandoned upload
+sessions. collect() walks
+
+    uploads/videos/   files no Pdd.videofile names, with their VideoBlob
+    uploads/partial/  files of upload sessions that no longer exist
+    uploads/tmp/      scratch files of the video storage
+
+with os.scandir() and looks the candidates up BATCH_SIZE at a time, so
+memory stays bounded whatever the number of files. Files modified within
+the grace period are left alone: they may belong to an upload in
+progress. Video files are checked again, with their VideoBlob rows
+locked, right before they are removed.
+"""
+import itertools
+import os
+import time
+import uuid
+
+from django.db import transaction
+
+from core.models import Pdd, UploadSession, VideoBlob
+from core.storage import video_storage
+
+BATCH_SIZE = 1000
+# Seconds since the last modification before a file may be collected.
+GRACE_PERIOD = 24 * 60 * 60
+
+
+class Report:
+    """What collect() found in one directory"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.scanned = 0
+        self.orphans = 0
+        self.bytes = 0
+
+    def __str__(self):
+        return (
+            f'{self.directory}: {self.scanned} files scanned, '
+            f'{self.orphans} orphaned, {self.bytes} bytes'
+        )
+
+
+class Throttle:
+    """Sleep as needed to keep below `rate` calls per second"""
+
+    def __init__(self, rate=None):
+        self.rate = rate
+        self.start = time.monotonic()
+        self.calls = 0
+
+    def __call__(self):
+        if self.rate:
+            delay = self.calls / self.rate - (time.monotonic() - self.start)
+            if delay > 0:
+                time.sleep(delay)
+        self.calls += 1
+
+
+def walk(directory):
+    """Yield the files below `directory`, depth first, as DirEntry"""
+    stack = [directory]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def storage_name(path):
+    """Return the name the storage knows the file at `path` by"""
+    relative = os.path.relpath(path, video_storage.location)
+    return relative.replace(os.sep, '/')
+
+
+def referenced_videos(names):
+    """Return the names among `names` some PDD object refers to"""
+    return set(Pdd.objects.filter(
+        videofile__in=names
+    ).values_list('videofile', flat=True))
+
+
+def live_sessions(entries):
+    """Return the paths of the partial files of existing upload sessions"""
+    ids = {}
+    for entry in entries:
+        try:
+            ids[uuid.UUID(os.path.splitext(entry.name)[0])] = entry
+        except ValueError:
+            continue
+    found = UploadSession.objects.filter(
+        id__in=list(ids)
+    ).values_list('id', flat=True)
+    return {ids[pk].path for pk in found}
+
+
+def collect(dry_run=False, grace=GRACE_PERIOD, rate=None, now=None,
+            batch_size=BATCH_SIZE):
+    """
+    Delete orphaned media files, at most `rate` per second, and return a
+    Report per directory. With `dry_run` nothing is deleted.
+    """
+    now = time.time() if now is None else now
+    throttle = Throttle(None if dry_run else rate)
+    sections = [
+        ('uploads/videos', _videos),
+        ('uploads/partial', _partial_files),
+        ('uploads/tmp', _scratch_files),
+    ]
+    reports = []
+    for directory, find_orphans in sections:
+        report = Report(directory)
+        old = (
+            (entry, entry.stat(follow_symlinks=False))
+            for entry in walk(video_storage.path(directory))
+        )
+        for batch in batches(old, batch_size):
+            report.scanned += len(batch)
+            batch = [
+                (entry, stat) for entry, stat in batch
+                if stat.st_mtime < now - grace
+            ]
+            if not batch:
+                continue
+            for entry, stat in find_orphans(batch, dry_run):
+                if not dry_run:
+                    throttle()
+                    try:
+                        os.remove(entry.path)
+                    except FileNotFoundError:
+                        continue
+                report.orphans += 1
+                report.bytes += stat.st_size
+        reports.append(report)
+
+    return reports
+
+
+def _videos(batch, dry_run):
+    candidates = {
+        storage_name(entry.path): (entry, stat) for entry, stat in batch
+    }
+    if dry_run:
+        referenced = referenced_videos(list(candidates))
+        return [item for name, item in candidates.items()
+                if name not in referenced]
+
+    with transaction.atomic():
+        # Hold off retain() for these files while deciding, see core.blobs.
+        list(VideoBlob.objects.select_for_update().filter(
+            name__in=list(candidates)
+        ).values_list('pk', flat=True))
+        referenced = referenced_videos(list(candidates))
+        orphans = [name for name in candidates if name not in referenced]
+        VideoBlob.objects.filter(name__in=orphans).delete()
+
+    return [candidates[name] for name in orphans]
+
+
+def _partial_files(batch, dry_run):
+    live = live_sessions(entry for entry, stat in batch)
+    return [(entry, stat) for entry, stat in batch if entry.path not in live]
+
+
+def _scratch_files(batch, dry_run):
+    return batch
@@ -0,0 +1,245 @@
+"""
+On-demand profiling of single requests.
+
+When PROFILING['ENABLED'] is set, ProfilingMiddleware runs a request under
+cProfile if it carries a token signed for a staff member, in the
+`X-Profile` header or the `profile` query parameter, or if it is picked
+by SAMPLE_RATE. Staff get a token on the profiles page of the admin.
+
+Each profile is stored in DIRECTORY as three files: the call graph
+(`.prof`, for pstats, snakeviz or gprof2dot), a text report of the
+slowest functions (`.txt`) and the SQL timeline (`.sql.json`). A
+RequestProfile row lists it in the admin, where the files are
+downloaded. Only the newest MAX_PROFILES are kept.
+
+With ENABLED off the middleware removes itself at start up, so requests
+do not pay anything. cProfile only sees the thread it runs in: the async
+views of core.threadpool are profiled through their synchronous
+counterparts.
+"""
+import asyncio
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import tempfile
+import time
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.utils import timezone
+
+from core import threadpool
+from core.models import RequestProfile
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    # Fraction of all requests profiled, between 0 and 1.
+    'SAMPLE_RATE': 0.0,
+    'DIRECTORY': os.path.join(tempfile.gettempdir(), 'pdd-profiles'),
+    # Older profiles are deleted.
+    'MAX_PROFILES': 200,
+    # Seconds a signed token stays valid.
+    'TOKEN_MAX_AGE': 3600,
+}
+
+SALT = 'core.profiling'
+HEADER = 'HTTP_X_PROFILE'
+QUERY_PARAMETER = 'profile'
+# File suffix of each kind of download.
+FILES = {
+    'callgraph': '.prof',
+    'report': '.txt',
+    'sql': '.sql.json',
+}
+# Statements longer than this are cut in the SQL timeline.
+SQL_MAX_LENGTH = 10000
+
+
+def profiling_settings():
+    return {**DEFAULTS, **getattr(settings, 'PROFILING', {})}
+
+
+def sign(user):
+    """Return a token making requests profiled on behalf of `user`"""
+    return signing.dumps({'user': user.email}, salt=SALT)
+
+
+def file_path(name, kind):
+    """Return the path of one file of the profile `name`"""
+    return os.path.join(
+        profiling_settings()['DIRECTORY'], name + FILES[kind]
+    )
+
+
+def delete_files(name):
+    for kind in FILES:
+        try:
+            os.remove(file_path(name, kind))
+        except FileNotFoundError:
+            pass
+
+
+class SqlTimeline:
+    """Database execute wrapper recording when each query ran"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'start': round((start - self.start) * 1000, 3),
+                'duration': round((time.perf_counter() - start) * 1000, 3),
+                'sql': sql[:SQL_MAX_LENGTH],
+                'many': many,
+            })
+
+    @property
+    def duration(self):
+        return sum(query['duration'] for query in self.queries) / 1000
+
+
+class ProfilingMiddleware:
+    """
+    Profile requests as configured in PROFILING.
+
+    Runs in the mode of the handler like MetricsMiddleware. Under ASGI a
+    profile shows the event loop thread, including whatever else it ran
+    in the meantime, but not the queries of the pool threads.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        config = profiling_settings()
+        if not config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = config['SAMPLE_RATE']
+        self.token_max_age = config['TOKEN_MAX_AGE']
+        if asyncio.iscoroutinefunction(get_response):
+            # Tell Django to await this middleware.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        trigger, requested_by = self.trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+
+        timeline = SqlTimeline()
+        profiler = cProfile.Profile()
+        with connection.execute_wrapper(timeline):
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+
+        return self.store(
+            request, response, profiler, timeline, trigger, requested_by
+        )
+
+    async def __acall__(self, request):
+        trigger, requested_by = self.trigger(request)
+        if trigger is None:
+            return await self.get_response(request)
+
+        timeline = SqlTimeline()
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profiler.disable()
+
+        # Writing files and rows blocks, leave it to the pool.
+        return await threadpool.run_db(
+            self.store,
+            request, response, profiler, timeline, trigger, requested_by
+        )
+
+    def store(self, request, response, profiler, timeline, trigger,
+              requested_by):
+        duration = time.perf_counter() - timeline.start
+        try:
+            profile = save(
+                request, response, profiler, timeline, duration, trigger,
+                requested_by
+            )
+        except OSError:
+            # The response must not fail because of a full disk.
+            logger.exception('Could not store the profile.')
+        else:
+            response['X-Profile-Id'] = profile.name
+        return response
+
+    def trigger(self, request):
+        """Return why and for whom to profile the request, if at all"""
+        token = request.META.get(HEADER) or \
+            request.GET.get(QUERY_PARAMETER)
+        if token:
+            try:
+                data = signing.loads(
+                    token, salt=SALT, max_age=self.token_max_age
+                )
+            except signing.BadSignature:
+                pass
+            else:
+                return RequestProfile.Trigger.SIGNED, data['user']
+
+        if self.sample_rate and random.random() < self.sample_rate:
+            return RequestProfile.Trigger.SAMPLED, ''
+        return None, None
+
+
+def save(request, response, profiler, timeline, duration, trigger,
+         requested_by):
+    """Write the files of a profile and list it, dropping old ones"""
+    config = profiling_settings()
+    name = f'{timezone.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}'
+    os.makedirs(config['DIRECTORY'], exist_ok=True)
+
+    profiler.dump_stats(file_path(name, 'callgraph'))
+    report = io.StringIO()
+    stats = pstats.Stats(profiler, stream=report)
+    stats.sort_stats('cumulative').print_stats(50)
+    stats.sort_stats('tottime').print_stats(25)
+    with open(file_path(name, 'report'), 'w') as file:
+        file.write(report.getvalue())
+    with open(file_path(name, 'sql'), 'w') as file:
+        json.dump(timeline.queries, file, indent=1)
+
+    profile = RequestProfile.objects.create(
+        name=name,
+        method=request.method,
+        path=request.get_full_path()[:2000],
+        status_code=response.status_code,
+        duration=duration,
+        queries=len(timeline.queries),
+        sql_duration=timeline.duration,
+        trigger=trigger,
+        requested_by=requested_by,
+    )
+
+    # Deleting the rows removes their files, see core.signals.
+    stale = RequestProfile.objects.order_by(
+        '-created_at', '-id'
+    ).values_list('pk', flat=True)[config['MAX_PROFILES']:]
+    RequestProfile.objects.filter(pk__in=list(stale)).delete()
+
+    return profile
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a view runs more SQL queries than it declared"""
+
+
+class QueryBudgetMixin:
+    """
+    Enforce a per-action upper bound on the number of SQL queries.
+
+    Viewsets declare `query_budget = {'list': 2, ...}`. The budget counts
+    every query executed while dispatching the request, authentication
+    included. Enforcement is off unless `QUERY_BUDGET_ENFORCE` is set,
+    which the test suite does, so production requests pay nothing.
+    """
+    query_budget = {}
+
+    def get_query_budget(self):
+        """Return the query budget of the current action, if any"""
+        return self.query_budget.get(getattr(self, 'action', None))
+
+    def dispatch(self, request, *args, **kwargs):
+        if not getattr(settings, 'QUERY_BUDGET_ENFORCE', False):
+            return super().dispatch(request, *args, **kwargs)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = super().dispatch(request, *args, **kwargs)
+
+        budget = self.get_query_budget()
+        if budget is not None and len(queries) > budget:
+            executed = '\n'.join(q['sql'] for q in queries.captured_queries)
+            raise QueryBudgetExceeded(
+                f'{self.__class__.__name__}.{self.action} ran '
+                f'{len(queries)} queries, budget is {budget}:\n{executed}'
+            )
+
+        return response
@@ -0,0 +1,252 @@
+"""
+Cache of rendered list responses, per user.
+
+Entries are keyed by the model listed, the user and the list ETag (see
+pdd.conditional), which already covers the route, the query string, the
+renderer and the state of the rows. A cached page therefore can never be
+served after the data changed, even by a process that missed the change.
+Writes still evict the entries of the affected user and model right away
+(see core.signals), so dead pages do not take up the memory budget.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+DEFAULTS = {
+    # Dotted path of the backend class, or None to disable the cache.
+    'BACKEND': 'core.response_cache.LocMemBackend',
+    # Upper bound for the size of the cached responses of each process
+    # (LocMemBackend) or of the whole directory (FileBackend).
+    'MAX_BYTES': 32 * 1024 ** 2,
+    # Directory of FileBackend.
+    'LOCATION': os.path.join(tempfile.gettempdir(), 'pdd-response-cache'),
+}
+
+
+def cache_settings():
+    return {**DEFAULTS, **getattr(settings, 'RESPONSE_CACHE', {})}
+
+
+def scope(model, user_id):
+    """Return the name of the entries of one user for one model"""
+    return f'{model._meta.label_lower}.{user_id}'
+
+
+class LocMemBackend:
+    """
+    LRU cache in the memory of the process, bounded by `max_bytes`.
+
+    Each worker process holds its own copy, which is always correct but
+    misses more often than a backend shared between processes.
+    """
+
+    def __init__(self, max_bytes, **options):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._keys_by_scope = {}
+
+    def get(self, scope, key):
+        with self._lock:
+            entry = self._entries.get((scope, key))
+            if entry is not None:
+                self._entries.move_to_end((scope, key))
+            return entry
+
+    def set(self, scope, key, entry):
+        size = _entry_size(entry)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._remove((scope, key))
+            self._entries[(scope, key)] = entry
+            self._keys_by_scope.setdefault(scope, set()).add(key)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def evict(self, scope):
+        with self._lock:
+            for key in list(self._keys_by_scope.get(scope, ())):
+                self._remove((scope, key))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_scope.clear()
+            self.size = 0
+
+    def _remove(self, item):
+        entry = self._entries.pop(item, None)
+        if entry is None:
+            return
+        self.size -= _entry_size(entry)
+        scope, key = item
+        keys = self._keys_by_scope[scope]
+        keys.discard(key)
+        if not keys:
+            del self._keys_by_scope[scope]
+
+
+class FileBackend:
+    """
+    Cache in a directory shared by all worker processes of a host.
+
+    Every entry is a file below `<location>/<scope>/`, written to a
+    temporary file and renamed into place, so readers never see partial
+    entries. Hits refresh the modification time, and once the directory
+    outgrows `max_bytes` the least recently used files are removed.
+    """
+    # Sets between two checks of the directory size.
+    cull_every = 20
+
+    def __init__(self, max_bytes, location, **options):
+        self.max_bytes = max_bytes
+        self.location = location
+        self._sets = 0
+
+    def get(self, scope, key):
+        path = self._path(scope, key)
+        try:
+            with open(path, 'rb') as file:
+                content_type = file.readline().rstrip(b'\n').decode()
+                content = file.read()
+            os.utime(path)
+        except OSError:
+            return None
+
+        return content, content_type
+
+    def set(self, scope, key, entry):
+        content, content_type = entry
+        if _entry_size(entry) > self.max_bytes:
+            return
+
+        path = self._path(scope, key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as file:
+                file.write(content_type.encode() + b'\n')
+                file.write(content)
+            os.replace(temp_path, path)
+        except OSError:
+            # Evicted concurrently, the entry is not needed any more.
+            return
+
+        self._sets += 1
+        if self._sets % self.cull_every == 0:
+            self.cull()
+
+    def evict(self, scope):
+        self._remove_files(os.path.join(self.location, scope))
+
+    def clear(self):
+        try:
+            scopes = os.listdir(self.location)
+        except FileNotFoundError:
+            return
+        for name in scopes:
+            self._remove_files(os.path.join(self.location, name))
+
+    def cull(self):
+        """Remove the least recently used files above the size budget"""
+        files = []
+        try:
+            scopes = list(os.scandir(self.location))
+        except FileNotFoundError:
+            return
+        for directory in scopes:
+            try:
+                for entry in os.scandir(directory.path):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+            except OSError:
+                continue
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def _path(self, scope, key):
+        name = hashlib.md5(key.encode()).hexdigest()
+        return os.path.join(self.location, scope, name)
+
+    def _remove_files(self, directory):
+        try:
+            entries = list(os.scandir(directory))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+class ResponseCache:
+    """Front end picking the backend configured in RESPONSE_CACHE"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._backend = None
+        self._config = None
+
+    @property
+    def backend(self):
+        config = cache_settings()
+        with self._lock:
+            if config != self._config:
+                path = config['BACKEND']
+                self._backend = import_string(path)(
+                    max_bytes=config['MAX_BYTES'],
+                    location=config['LOCATION']
+                ) if path else None
+                self._config = config
+            return self._backend
+
+    def get(self, model, user_id, key):
+        """Return the cached (content, content type) pair or None"""
+        backend = self.backend
+        if backend is None:
+            return None
+        return backend.get(scope(model, user_id), key)
+
+    def set(self, model, user_id, key, content, content_type):
+        backend = self.backend
+        if backend is not None:
+            backend.set(
+                scope(model, user_id), key, (content, content_type)
+            )
+
+    def evict(self, model, user_id):
+        """Forget the cached lists of `model` of a user"""
+        backend = self.backend
+        if backend is not None:
+            backend.evict(scope(model, user_id))
+
+    def clear(self):
+        backend = self.backend
+        if backend is not None:
+            backend.clear()
+
+
+def _entry_size(entry):
+    content, content_type = entry
+    return len(content) + len(content_type)
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,72 @@
+"""
+Ranked search over PDD names and video titles.
+
+On PostgreSQL each searchable table has a `search_vector` tsvector
+column, filled by a trigger on every insert and update of the text (bulk
+inserts and COPY included) and indexed together with the user in a GIN
+index. A row matches when its words start with every word searched for,
+or when the text is close to the search by trigram word similarity,
+which catches typos. Rows are ranked by the better of both scores.
+
+The column is not part of the models: Django never reads or writes it,
+so the other queries do not carry it along. See migration
+0015_search_vector, which only touches PostgreSQL databases. Other
+databases fall back to a case-insensitive substring match with the same
+rank for every row.
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Value
+from django.db.models.expressions import RawSQL
+
+from core.models import Pdd, VideoObj
+
+# The searchable text column of each model.
+FIELDS = {
+    Pdd: 'name',
+    VideoObj: 'title',
+}
+CONFIG = 'pg_catalog.simple'
+# Ordering of search results, for core pagination.
+ORDERING = ('-rank', 'id')
+
+
+def search(queryset, text):
+    """
+    Filter `queryset` to the rows matching `text` and annotate their
+    `rank`, higher is better
+    """
+    model = queryset.model
+    field = FIELDS[model]
+    words = re.findall(r'\w+', text)
+    if not words:
+        return queryset.none()
+
+    if connection.vendor != 'postgresql':
+        return queryset.filter(**{f'{field}__icontains': text}).annotate(
+            rank=Value(1.0, output_field=FloatField())
+        )
+
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    column = f'{table}.{quote(field)}'
+    vector = f'{table}.search_vector'
+    # Every word as a prefix: "mor run" finds "Morning run".
+    query = ' & '.join(f'{word}:*' for word in words)
+    tsquery = f"to_tsquery('{CONFIG}', %s)"
+    text = ' '.join(words)
+
+    # <% is trigram word similarity, served by the trigram index.
+    matches = RawSQL(
+        f'({vector} @@ {tsquery} OR %s <%% {column})',
+        (query, text), output_field=BooleanField()
+    )
+    # Both scores are `real`. As double precision the rank survives the
+    # round trip through a cursor, so ties compare equal on later pages.
+    rank = RawSQL(
+        f'GREATEST(ts_rank({vector}, {tsquery}), '
+        f'word_similarity(%s, {column}))::float8',
+        (query, text), output_field=FloatField()
+    )
+    return queryset.filter(matches).annotate(rank=rank)
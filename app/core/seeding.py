@@ -0,0 +1,209 @@
+"""
+Deterministic synthetic data for benchmarks and load tests.
+
+seed() creates users with API tokens, video objects and PDD objects, each
+PDD linked to some of its user's videos. The counts per user follow a
+chosen distribution around the requested means. Every user's data comes
+from a random generator seeded with the run seed and the user's index,
+so the same arguments always produce the same rows, whether a run went
+through at once or was resumed.
+
+Users are written in batches of about `batch_rows` rows, each batch in
+one transaction together with everything belonging to its users. An
+interrupted run therefore leaves only complete users behind, and the
+next run continues after the last of them. Rows are inserted with COPY
+on PostgreSQL and bulk_create() elsewhere; the password is hashed once
+and shared by all users. No signals are sent, which is fine for new
+rows: they hold no files and no cached responses yet.
+"""
+import io
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.db.models import AutoField
+from rest_framework.authtoken.models import Token
+
+from core.models import Pdd, VideoObj
+
+EMAIL = 'bench-{}@example.com'
+PASSWORD = 'benchmark'
+START = datetime(2020, 1, 1, tzinfo=timezone.utc)
+# Timestamps are spread over this many minutes after START.
+SPAN = 365 * 24 * 60
+BATCH_SIZE = 1000
+DISTRIBUTIONS = ('constant', 'uniform', 'pareto')
+
+
+def seeded_users():
+    """Return the users created by seed(), in order"""
+    return get_user_model().objects.filter(
+        email__startswith='bench-', email__endswith='@example.com'
+    ).order_by('id')
+
+
+def draw(rng, mean, distribution):
+    """Return a count with the given mean"""
+    if distribution == 'constant' or not mean:
+        return mean
+    if distribution == 'uniform':
+        return rng.randint(0, 2 * mean)
+    # Pareto with alpha 1.5 has a mean of 3: many light users and a
+    # few heavy ones, capped to keep batches bounded.
+    return min(int(mean * rng.paretovariate(1.5) / 3), 100 * mean)
+
+
+class UserPlan:
+    """Everything seed() creates for the user with a given index"""
+
+    def __init__(self, index, videos, pdds, fanout, seed, distribution):
+        rng = random.Random(f'{seed}-{index}')
+        self.email = EMAIL.format(index)
+        self.token = f'{rng.getrandbits(160):040x}'
+        self.videos = draw(rng, videos, distribution)
+        self.timestamps = [
+            START + timedelta(minutes=rng.randrange(SPAN))
+            for _ in range(draw(rng, pdds, distribution))
+        ]
+        # Positions of the linked videos among the user's videos.
+        self.links = [
+            rng.sample(
+                range(self.videos),
+                min(draw(rng, fanout, distribution), self.videos)
+            )
+            for _ in self.timestamps
+        ]
+
+    @property
+    def rows(self):
+        return 2 + self.videos + len(self.timestamps) + sum(
+            len(links) for links in self.links
+        )
+
+
+def seed(users=10, videos=50, pdds=200, fanout=3, seed=0,
+         distribution='constant', batch_rows=100000, progress=None):
+    """
+    Create `users` users, each with about `videos` video objects and
+    `pdds` PDD objects linked to about `fanout` of the videos, skipping
+    the users a previous run completed. `progress` is called after each
+    batch with the users done and the totals of rows and seconds.
+    """
+    done = seeded_users().count()
+    password = make_password(PASSWORD)
+    rows = 0
+    start = time.perf_counter()
+    while done < users:
+        batch = []
+        batch_size = 0
+        while done + len(batch) < users and batch_size < batch_rows:
+            plan = UserPlan(
+                done + len(batch), videos, pdds, fanout, seed, distribution
+            )
+            batch.append(plan)
+            batch_size += plan.rows
+
+        with transaction.atomic():
+            seed_users(batch, password)
+        done += len(batch)
+        rows += batch_size
+        if progress is not None:
+            progress(done, rows, time.perf_counter() - start)
+
+
+def seed_users(plans, password):
+    User = get_user_model()
+    insert([
+        User(email=plan.email, name=f'Benchmark user {plan.email}',
+             password=password)
+        for plan in plans
+    ])
+    user_ids = dict(User.objects.filter(
+        email__in=[plan.email for plan in plans]
+    ).values_list('email', 'id'))
+    insert([
+        Token(key=plan.token, user_id=user_ids[plan.email])
+        for plan in plans
+    ])
+
+    insert([
+        VideoObj(user_id=user_ids[plan.email], title=f'Video {index}')
+        for plan in plans
+        for index in range(plan.videos)
+    ])
+    video_ids = _ids_by_user(VideoObj, user_ids.values())
+
+    insert([
+        Pdd(user_id=user_ids[plan.email], name=f'PDD {index}',
+            timestamp=timestamp)
+        for plan in plans
+        for index, timestamp in enumerate(plan.timestamps)
+    ])
+    pdd_ids = _ids_by_user(Pdd, user_ids.values())
+
+    Link = Pdd.videos.through
+    links = []
+    for plan in plans:
+        user_id = user_ids[plan.email]
+        for pdd_id, positions in zip(pdd_ids[user_id], plan.links):
+            links += [
+                Link(pdd_id=pdd_id, videoobj_id=video_ids[user_id][position])
+                for position in positions
+            ]
+    insert(links)
+
+
+def _ids_by_user(model, user_ids):
+    """Return the ids of the rows of each user, in insertion order"""
+    ids = {user_id: [] for user_id in user_ids}
+    rows = model.objects.filter(
+        user_id__in=ids
+    ).order_by('id').values_list('user_id', 'id')
+    for user_id, pk in rows.iterator(chunk_size=BATCH_SIZE * 10):
+        ids[user_id].append(pk)
+    return ids
+
+
+def insert(objs):
+    """Insert unsaved instances of one model, with COPY on PostgreSQL"""
+    if not objs:
+        return
+    model = type(objs[0])
+    if connection.vendor != 'postgresql':
+        model.objects.bulk_create(objs, batch_size=BATCH_SIZE)
+        return
+
+    fields = [
+        field for field in model._meta.concrete_fields
+        if not isinstance(field, AutoField)
+    ]
+    buffer = io.StringIO()
+    for obj in objs:
+        buffer.write('\t'.join(
+            copy_value(field.get_db_prep_save(
+                field.pre_save(obj, add=True), connection
+            ))
+            for field in fields
+        ) + '\n')
+    buffer.seek(0)
+
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(field.column) for field in fields)
+    with connection.cursor() as cursor:
+        cursor.cursor.copy_expert(
+            f'COPY {quote(model._meta.db_table)} ({columns}) FROM STDIN',
+            buffer
+        )
+
+
+def copy_value(value):
+    """Format a value for the text format of COPY"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t') \
+        .replace('\n', '\\n').replace('\r', '\\r')
@@ -0,0 +1,120 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import pre_save, post_save, post_delete, \
+                                     pre_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from core import blobs, listversions, profiling, tasks
+from core.authentication import token_cache
+from core.models import ListVersion, Pdd, RequestProfile, VideoObj
+
+
+@receiver(pre_save, sender=Pdd)
+def load_previous_videofile(sender, instance, raw, **kwargs):
+    """Look up the stored file of PDD objects not loaded from the DB"""
+    if raw or instance.pk is None or \
+            hasattr(instance, '_loaded_videofile'):
+        return
+
+    instance._loaded_videofile = Pdd.objects.filter(
+        pk=instance.pk
+    ).values_list('videofile', flat=True).first()
+
+
+@receiver(post_save, sender=Pdd)
+def count_videofile_references(sender, instance, created, raw,
+                               update_fields, **kwargs):
+    """Move the file reference when a PDD object gets a new video"""
+    if raw or (update_fields is not None and
+               'videofile' not in update_fields):
+        return
+
+    old = None if created else getattr(instance, '_loaded_videofile', None)
+    new = instance.videofile.name or None
+    if old != new:
+        blobs.retain(new)
+        blobs.release(old)
+        if new:
+            # Read by a worker, in the transaction of the save if any.
+            tasks.extract_video_metadata.delay(instance.pk, new)
+    instance._loaded_videofile = new
+
+
+@receiver(post_delete, sender=Pdd)
+def release_videofile(sender, instance, **kwargs):
+    """Drop the file reference of a deleted PDD object"""
+    blobs.release(
+        getattr(instance, '_loaded_videofile', instance.videofile.name)
+    )
+
+
+@receiver(m2m_changed, sender=Pdd.videos.through)
+def touch_pdds_on_video_links(sender, instance, action, reverse, pk_set,
+                              **kwargs):
+    """Mark PDD objects as modified when their videos are relinked"""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+
+    if not reverse:
+        pdds = Pdd.objects.filter(pk=instance.pk)
+    elif action == 'pre_clear':
+        pdds = Pdd.objects.filter(videos=instance)
+    else:
+        pdds = Pdd.objects.filter(pk__in=pk_set)
+    pdds.update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=VideoObj)
+@receiver(pre_delete, sender=VideoObj)
+def touch_pdds_of_video(sender, instance, raw=False, created=False,
+                        **kwargs):
+    """PDD details render video titles, see their validators change too"""
+    if raw or created:
+        return
+
+    Pdd.objects.filter(videos=instance).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Pdd)
+@receiver(post_delete, sender=Pdd)
+@receiver(m2m_changed, sender=Pdd.videos.through)
+def bump_pdd_lists(sender, instance, action=None, **kwargs):
+    """Change the PDD list version of a user whose PDDs changed"""
+    if action in ('pre_add', 'pre_remove', 'pre_clear'):
+        return
+
+    listversions.bump(instance.user_id, Pdd)
+
+
+@receiver(post_save, sender=VideoObj)
+@receiver(post_delete, sender=VideoObj)
+def bump_video_lists(sender, instance, **kwargs):
+    """Change the video list version, and the PDD one as PDDs link videos"""
+    listversions.bump(instance.user_id, VideoObj, Pdd)
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def evict_token(sender, instance, **kwargs):
+    """Stop trusting a cached token once it changed or was revoked"""
+    token_cache.evict_token(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def evict_user_tokens(sender, instance, **kwargs):
+    """Drop cached tokens when their user changes, e.g. is deactivated"""
+    token_cache.evict_user(instance.pk)
+
+
+@receiver(post_delete, sender=get_user_model())
+def delete_list_versions(sender, instance, **kwargs):
+    """Drop the list versions bumped while the user's data was deleted"""
+    ListVersion.objects.filter(user_id=instance.pk).delete()
+
+
+@receiver(post_delete, sender=RequestProfile)
+def delete_profile_files(sender, instance, **kwargs):
+    """Remove the files of a deleted request profile"""
+    profiling.delete_files(instance.name)
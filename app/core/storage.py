@@ -0,0 +1,122 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+BLOCK_SIZE = 64 * 1024
+
+blob_name_re = re.compile(
+    r'^uploads/videos/[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})(\.[a-z0-9]+)?$'
+)
+
+
+def blob_digest(name):
+    """Return the SHA-256 digest a stored file is named after, if any"""
+    match = blob_name_re.match(name or '')
+    return match.group('digest') if match else None
+
+
+def blob_name(digest, filename):
+    """Return the storage name of a file with the given content digest"""
+    ext = os.path.splitext(filename)[1].lower()
+    if not re.match(r'^\.[a-z0-9]{1,10}$', ext):
+        ext = ''
+
+    return f'uploads/videos/{digest[:2]}/{digest}{ext}'
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage naming every file after the SHA-256 of its content.
+
+    The digest is computed while the upload is streamed into a temporary
+    file next to the final location, which is then renamed into place. An
+    upload whose content is already stored is discarded, so identical
+    videos share one file. Files are removed by `core.blobs` once no PDD
+    object references them any more; `delete()` therefore does nothing.
+    """
+
+    @property
+    def temp_dir(self):
+        """Scratch directory on the same file system as the stored files"""
+        return os.path.join(self.location, 'uploads/tmp')
+
+    def temp_file(self):
+        """Return an open scratch file and its path, see adopt()"""
+        os.makedirs(self.temp_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.temp_dir)
+        return os.fdopen(fd, 'wb'), temp_path
+
+    def _save(self, name, content):
+        if getattr(content, 'sha256', None) and os.path.dirname(
+                content.temporary_file_path()) == self.temp_dir:
+            # Hashed while it was uploaded, see core.uploads.
+            return self.adopt(
+                content.temporary_file_path(), name, content.sha256
+            )
+
+        temp, temp_path = self.temp_file()
+        try:
+            sha256 = hashlib.sha256()
+            with temp:
+                for chunk in content.chunks(BLOCK_SIZE):
+                    sha256.update(chunk)
+                    temp.write(chunk)
+            return self._store(temp_path, sha256.hexdigest(), name)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def adopt(self, path, filename, digest=None):
+        """
+        Move a complete file below `location` into the store.
+
+        The file is read once to compute its digest, unless the caller
+        hashed it while writing and passes `digest`, but never copied.
+        """
+        if digest is None:
+            sha256 = hashlib.sha256()
+            with open(path, 'rb') as source:
+                for chunk in iter(lambda: source.read(BLOCK_SIZE), b''):
+                    sha256.update(chunk)
+            digest = sha256.hexdigest()
+
+        try:
+            return self._store(path, digest, filename)
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _store(self, temp_path, digest, filename):
+        """Rename `temp_path` to its content address unless already there"""
+        name = blob_name(digest, filename)
+        path = self.path(name)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.chmod(temp_path, self.file_permissions_mode or 0o644)
+            os.replace(temp_path, path)
+        else:
+            # Reused: restart the grace period of core.orphans, the new
+            # reference may not be committed when it scans the file.
+            os.utime(path)
+
+        return name
+
+    def get_available_name(self, name, max_length=None):
+        # Names are derived from the content in _save(), never suffixed.
+        return name
+
+    def delete(self, name):
+        # Other PDD objects may share the file, see core.blobs.release().
+        pass
+
+    def purge(self, name):
+        """Remove a stored file for good"""
+        super().delete(name)
+
+
+video_storage = ContentAddressedStorage()
@@ -0,0 +1,70 @@
+import logging
+
+from django.utils import timezone
+
+from core import deletion, listversions, videometa
+from core.jobs import job
+from core.models import Pdd
+from core.storage import video_storage
+
+logger = logging.getLogger(__name__)
+
+METADATA_FIELDS = {
+    'duration': 'video_duration',
+    'width': 'video_width',
+    'height': 'video_height',
+    'codec': 'video_codec',
+    'bitrate': 'video_bitrate',
+}
+
+
+@job(name='core.extract_video_metadata', priority=5)
+def extract_video_metadata(pdd_id, name):
+    """
+    Store the container metadata of the video `name` on a PDD object.
+
+    Nothing is written if the PDD object got another video since the job
+    was queued; the job queued for that video takes care of it.
+    """
+    pdd = Pdd.objects.filter(pk=pdd_id).values('user_id', 'videofile').first()
+    if pdd is None or pdd['videofile'] != name:
+        return
+
+    # Identical uploads share one file, reuse what was read before.
+    values = Pdd.objects.filter(
+        user_id=pdd['user_id'],
+        videofile=name,
+        video_duration__isnull=False
+    ).values(*METADATA_FIELDS.values()).first()
+
+    if values is None:
+        try:
+            with video_storage.open(name) as file:
+                meta = videometa.probe(file)
+        except videometa.VideoMetadataError as exc:
+            # Not a format we read, retrying would not change that.
+            logger.info('No metadata for %s: %s', name, exc)
+            return
+        values = {
+            column: meta[key] for key, column in METADATA_FIELDS.items()
+        }
+        # Unknown codecs are named by the file, keep them within the column.
+        values['video_codec'] = (values['video_codec'] or '')[
+            :Pdd._meta.get_field('video_codec').max_length
+        ]
+
+    # Updates send no signals, bump the validators and list version here.
+    Pdd.objects.filter(pk=pdd_id, videofile=name).update(
+        updated_at=timezone.now(), **values
+    )
+    listversions.bump(pdd['user_id'], Pdd)
+
+
+@job(name='core.delete_user', priority=-5, timeout=3600)
+def delete_user(user_id):
+    """Delete a deactivated user with all their data, see core.deletion"""
+    deleted = deletion.delete_user(user_id)
+    if not deleted:
+        logger.info('Kept user %s, active again or gone', user_id)
+        return
+    logger.info('Deleted user %s: %s', user_id, deleted)
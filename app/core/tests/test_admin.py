@@ -1,7 +1,14 @@
+from datetime import datetime, timezone
+
 from django.test import TestCase, Client
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from core.admin import EstimatedCountPaginator, estimated_count
+from core.models import Pdd, VideoObj
+
 
 class AdminSiteTests(TestCase):
 
@@ -41,3 +48,99 @@ class AdminSiteTests(TestCase):
         response = self.client.get(url)
 
         self.assertEqual(response.status_code, 200)
+
+
+class ScalableAdminTests(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.admin_user = get_user_model().objects.create_superuser(
+            email='admin@google.com',
+            password='pw2uiofof'
+        )
+        self.client.force_login(self.admin_user)
+        self.video = VideoObj.objects.create(
+            user=self.admin_user, title='Morning run'
+        )
+        VideoObj.objects.create(user=self.admin_user, title='Evening walk')
+        for i in range(5):
+            Pdd.objects.create(
+                user=get_user_model().objects.create_user(
+                    f'user{i}@google.com', 'testpass'
+                ),
+                name=f'PDD {i}',
+                timestamp=datetime(2020, 6, 1, tzinfo=timezone.utc)
+            )
+
+    def test_changelist_queries(self):
+        """Test the changelist does not query the user of every row"""
+        url = reverse('admin:core_pdd_changelist')
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(url)
+        Pdd.objects.create(
+            user=get_user_model().objects.create_user(
+                'another@google.com', 'testpass'
+            ),
+            name='Another',
+            timestamp=datetime(2020, 6, 1, tzinfo=timezone.utc)
+        )
+
+        with CaptureQueriesContext(connection) as more:
+            response = self.client.get(url)
+
+        self.assertContains(response, 'Another')
+        self.assertEqual(len(more), len(few))
+
+    def test_change_form_widgets(self):
+        """Test the change form does not list every video and user"""
+        pdd = Pdd.objects.first()
+        url = reverse('admin:core_pdd_change', args=[pdd.id])
+
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'Morning run')
+        self.assertNotContains(response, 'user1@google.com')
+
+    def test_search(self):
+        """Test videos are searched in the changelist"""
+        url = reverse('admin:core_videoobj_changelist')
+
+        response = self.client.get(url, {'q': 'morning'})
+
+        self.assertContains(response, 'Morning run')
+        self.assertNotContains(response, 'Evening walk')
+
+    def test_autocomplete(self):
+        """Test the video autocomplete of the PDD form"""
+        url = reverse('admin:core_videoobj_autocomplete')
+
+        response = self.client.get(url, {'term': 'run'})
+
+        self.assertEqual(
+            [result['id'] for result in response.json()['results']],
+            [str(self.video.id)]
+        )
+
+    def test_date_hierarchy(self):
+        """Test PDD objects can be browsed by date"""
+        url = reverse('admin:core_pdd_changelist')
+
+        response = self.client.get(url, {'timestamp__year': 2020})
+
+        self.assertContains(response, 'PDD 4')
+
+    def test_estimated_count(self):
+        """Test the row count is only estimated on PostgreSQL"""
+        paginator = EstimatedCountPaginator(
+            Pdd.objects.order_by('id'), 100
+        )
+
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE core_pdd')
+            self.assertEqual(estimated_count(Pdd.objects.all()), 5)
+        else:
+            self.assertIsNone(estimated_count(Pdd.objects.all()))
+        self.assertIsNone(estimated_count(Pdd.objects.filter(name='PDD 1')))
+        self.assertEqual(paginator.count, 5)
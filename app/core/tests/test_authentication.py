@@ -0,0 +1,150 @@
+import time
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.authentication import TokenCache, token_cache
+
+
+ME_URL = reverse('user:me')
+SHARED_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'token-auth-tests',
+    },
+}
+
+
+class CachedTokenAuthenticationTests(TestCase):
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@gmail.com',
+            'testpass',
+            name='Test'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_token_lookup_cached(self):
+        """Test the token is only looked up in the database once"""
+        with self.assertNumQueries(1):
+            res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+        self.assertEqual(res.data['email'], self.user.email)
+        self.assertEqual(
+            token_cache.stats(),
+            {'hits': 1, 'misses': 1, 'evictions': 0, 'size': 1}
+        )
+
+    def test_invalid_token_not_cached(self):
+        """Test unknown tokens are rejected every time"""
+        self.client.credentials(HTTP_AUTHORIZATION='Token nope')
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(token_cache.stats()['size'], 0)
+
+    def test_deleted_token_rejected(self):
+        """Test a revoked token stops working right away"""
+        self.client.get(ME_URL)
+
+        self.token.delete()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected(self):
+        """Test deactivating a user invalidates the cached token"""
+        self.client.get(ME_URL)
+
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_invalidates(self):
+        """Test changing the password through the API drops the entry"""
+        self.client.get(ME_URL)
+
+        self.client.patch(ME_URL, {'password': 'newpassword'})
+
+        self.assertEqual(token_cache.stats()['size'], 0)
+
+    def test_cached_user_not_shared_between_requests(self):
+        """Test changes to request.user do not leak into the cache"""
+        self.client.get(ME_URL)
+
+        with patch.object(get_user_model(), 'save'):
+            self.client.patch(ME_URL, {'name': 'Changed'})
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'Test')
+
+    def test_entries_expire(self):
+        """Test cached tokens are looked up again after the TTL"""
+        self.client.get(ME_URL)
+
+        with patch('core.authentication.time.monotonic') as monotonic:
+            monotonic.return_value = 10 ** 9
+            with self.assertNumQueries(1):
+                self.client.get(ME_URL)
+
+    def test_other_processes_expire_revoked_tokens(self):
+        """Test without a shared tier revoked tokens expire in seconds"""
+        token = Token.objects.select_related('user').get(pk=self.token.pk)
+        other_process = TokenCache()
+        other_process.set(token)
+
+        token_cache.evict_user(self.user.pk)
+        self.assertIsNotNone(other_process.get(token.key))
+
+        later = time.monotonic() + 10
+        with patch('core.authentication.time.monotonic') as monotonic:
+            monotonic.return_value = later
+            self.assertIsNone(other_process.get(token.key))
+
+    @override_settings(TOKEN_AUTH_CACHE={'MAX_SIZE': 1})
+    def test_least_recently_used_evicted(self):
+        """Test the cache keeps at most MAX_SIZE tokens"""
+        user2 = get_user_model().objects.create_user('o@gmail.com', 'pass')
+        token2 = Token.objects.create(user=user2)
+        self.client.get(ME_URL)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token2.key}')
+        self.client.get(ME_URL)
+
+        self.assertEqual(token_cache.stats()['evictions'], 1)
+        self.assertIsNone(token_cache.get(self.token.key))
+        self.assertIsNotNone(token_cache.get(token2.key))
+
+    @override_settings(
+        CACHES=SHARED_CACHES,
+        TOKEN_AUTH_CACHE={'SHARED_CACHE': 'shared'}
+    )
+    def test_shared_tier_invalidates_other_processes(self):
+        """Test invalidating in one process reaches the others"""
+        token = Token.objects.select_related('user').get(pk=self.token.pk)
+        other_process = TokenCache()
+        token_cache.set(token)
+
+        # Filled from the shared tier on a local miss.
+        self.assertEqual(other_process.get(token.key).user, self.user)
+
+        token_cache.evict_user(self.user.pk)
+
+        self.assertIsNone(other_process.get(token.key))
@@ -0,0 +1,157 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import Count, F
+from django.test import TestCase, TransactionTestCase
+
+from core import benchmark, seeding
+from core.models import Pdd, VideoObj
+
+
+def sample_results(**route):
+    """Return benchmark results with one route"""
+    result = {
+        'requests': 100, 'errors': 0, 'throughput': 100.0,
+        'p50': 10.0, 'p95': 20.0, 'p99': 30.0, 'queries': 3.0,
+    }
+    result.update(route)
+    return {'routes': {'pdd:pdd-list get': result}, 'peak_rss': 1000}
+
+
+class SeedingTests(TestCase):
+
+    def test_seed(self):
+        """Test the requested volumes are created, once"""
+        seeding.seed(users=2, videos=3, pdds=4, fanout=2)
+        seeding.seed(users=2, videos=3, pdds=4, fanout=2)
+
+        self.assertEqual(seeding.seeded_users().count(), 2)
+        self.assertEqual(VideoObj.objects.count(), 6)
+        self.assertEqual(Pdd.objects.count(), 8)
+        self.assertEqual(Pdd.videos.through.objects.count(), 16)
+        user = seeding.seeded_users().first()
+        self.assertTrue(user.check_password(seeding.PASSWORD))
+        self.assertTrue(user.auth_token.key)
+
+    def test_seed_deterministic(self):
+        """Test the same seed gives the same data"""
+        seeding.seed(users=1, pdds=20, seed=3)
+        first = list(Pdd.objects.values_list('timestamp', flat=True))
+        get_user_model().objects.all().delete()
+
+        seeding.seed(users=1, pdds=20, seed=3)
+
+        self.assertEqual(
+            list(Pdd.objects.values_list('timestamp', flat=True)), first
+        )
+
+    def test_seed_resumed(self):
+        """Test a run in batches gives the same data as one at once"""
+        options = {'pdds': 5, 'distribution': 'pareto', 'seed': 1}
+        seeding.seed(users=4, **options)
+        first = list(Pdd.objects.values_list('timestamp', flat=True))
+        links = Pdd.videos.through.objects.count()
+        get_user_model().objects.all().delete()
+
+        seeding.seed(users=1, batch_rows=1, **options)
+        seeding.seed(users=4, batch_rows=1, **options)
+
+        self.assertEqual(
+            list(Pdd.objects.values_list('timestamp', flat=True)), first
+        )
+        self.assertEqual(Pdd.videos.through.objects.count(), links)
+
+    def test_seed_distribution(self):
+        """Test the counts vary around the mean"""
+        seeding.seed(users=50, videos=4, pdds=10, distribution='uniform')
+
+        counts = set(
+            seeding.seeded_users().annotate(
+                count=Count('pdd')
+            ).values_list('count', flat=True)
+        )
+        self.assertGreater(len(counts), 1)
+        self.assertLessEqual(max(counts), 20)
+        self.assertAlmostEqual(Pdd.objects.count() / 50, 10, delta=3)
+
+    def test_links_within_user(self):
+        """Test PDD objects are only linked to videos of their user"""
+        seeding.seed(users=3, videos=3, pdds=4, fanout=2)
+
+        self.assertFalse(Pdd.videos.through.objects.exclude(
+            pdd__user=F('videoobj__user')
+        ).exists())
+
+    def test_copy_value(self):
+        """Test values are escaped for COPY"""
+        self.assertEqual(seeding.copy_value(None), '\\N')
+        self.assertEqual(seeding.copy_value(True), 't')
+        self.assertEqual(seeding.copy_value(3), '3')
+        self.assertEqual(
+            seeding.copy_value('a\tb\\c\n'), 'a\\tb\\\\c\\n'
+        )
+
+    def test_command(self):
+        """Test seed_data reports progress and continues earlier runs"""
+        seeding.seed(users=1, videos=1, pdds=1)
+        out = StringIO()
+
+        call_command(
+            'seed_data', users=3, videos=1, pdds=1, batch_rows=1, stdout=out
+        )
+
+        self.assertEqual(seeding.seeded_users().count(), 3)
+        self.assertIn('Continuing after 1 seeded users.', out.getvalue())
+        self.assertIn('3 users, ', out.getvalue())
+
+
+class BenchmarkTests(TransactionTestCase):
+
+    def test_every_route_covered(self):
+        """Test each route of the user and pdd apps has a scenario"""
+        self.assertEqual(benchmark.uncovered_routes(), set())
+
+    def test_run(self):
+        """Test a scenario is run and measured"""
+        seeding.seed(users=2, videos=3, pdds=4)
+
+        results = benchmark.run(
+            concurrency=2, requests=4, only='pdd:pdd-detail get'
+        )
+
+        result = results['routes']['pdd:pdd-detail get']
+        self.assertEqual(list(results['routes']), ['pdd:pdd-detail get'])
+        self.assertEqual(result['requests'], 4)
+        self.assertEqual(result['errors'], 0)
+        self.assertGreater(result['queries'], 0)
+        self.assertLessEqual(result['p50'], result['p99'])
+
+
+class CompareTests(TestCase):
+
+    def test_no_regression(self):
+        """Test results within the tolerance pass"""
+        results = sample_results(p95=23.0, throughput=90.0)
+
+        self.assertEqual(
+            benchmark.compare(results, sample_results(), 0.2), []
+        )
+
+    def test_regressions(self):
+        """Test slower routes and added queries are reported"""
+        results = sample_results(p99=40.0, throughput=50.0, queries=4.0)
+
+        regressions = benchmark.compare(results, sample_results(), 0.2)
+
+        self.assertEqual(len(regressions), 3)
+        self.assertIn('p99', regressions[0])
+
+    def test_new_route_ignored(self):
+        """Test routes missing from the baseline are not compared"""
+        baseline = sample_results()
+        baseline['routes'] = {}
+
+        self.assertEqual(
+            benchmark.compare(sample_results(), baseline, 0.2), []
+        )
@@ -0,0 +1,167 @@
+import os
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import deletion, tasks
+from core.models import Job, Pdd, UploadSession, VideoBlob, VideoObj
+
+
+def sample_account(email, pdds=3, content=None):
+    """Create a user with linked PDD and video objects"""
+    user = get_user_model().objects.create_user(email, 'testpass')
+    videos = [
+        VideoObj.objects.create(user=user, title=f'Video {i}')
+        for i in range(2)
+    ]
+    for i in range(pdds):
+        pdd = Pdd.objects.create(
+            user=user, name=f'PDD {i}',
+            timestamp=datetime(2020, 1, 1, tzinfo=timezone.utc)
+        )
+        pdd.videos.set(videos)
+        if content is not None:
+            pdd.videofile.save('video.mp4', ContentFile(content))
+    return user
+
+
+class DeleteUserTests(TestCase):
+
+    def setUp(self):
+        self.user = sample_account('user@gmail.com')
+        self.other = sample_account('other@gmail.com')
+
+    def test_delete_user(self):
+        """Test the user and their data are deleted, nothing else"""
+        UploadSession.objects.create(
+            user=self.user, pdd=Pdd.objects.filter(user=self.user).first(),
+            filename='video.mp4', size=10
+        )
+
+        deletion.close(self.user)
+
+        deleted = deletion.delete_user(self.user.pk, batch_size=2)
+
+        self.assertEqual(deleted['core.Pdd'], 3)
+        self.assertEqual(deleted['core.VideoObj'], 2)
+        self.assertEqual(deleted['core.Pdd_videos'], 6)
+        self.assertEqual(deleted['core.UploadSession'], 1)
+        self.assertFalse(
+            get_user_model().objects.filter(pk=self.user.pk).exists()
+        )
+        self.assertEqual(Pdd.objects.count(), 3)
+        self.assertEqual(VideoObj.objects.count(), 2)
+        self.assertEqual(Pdd.videos.through.objects.count(), 6)
+
+    def test_queries_independent_of_rows(self):
+        """Test the number of statements only grows with the batches"""
+        heavy = sample_account('heavy@gmail.com', pdds=30)
+        deletion.close(self.user)
+        deletion.close(heavy)
+
+        with CaptureQueriesContext(connection) as light_queries:
+            deletion.delete_user(self.user.pk)
+        with CaptureQueriesContext(connection) as heavy_queries:
+            deletion.delete_user(heavy.pk)
+
+        self.assertEqual(len(heavy_queries), len(light_queries))
+
+    def test_active_user_kept(self):
+        """Test a user reactivated before the job ran is not deleted"""
+        job = deletion.schedule(self.user)
+        self.user.is_active = True
+        self.user.save()
+
+        tasks.delete_user(*job.args)
+
+        self.assertEqual(Pdd.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(deletion.delete_user(self.user.pk), {})
+
+    def test_schedule(self):
+        """Test the account is closed at once and the deletion queued"""
+        Token.objects.create(user=self.user)
+
+        job = deletion.schedule(self.user)
+
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertFalse(Token.objects.filter(user=self.user).exists())
+        self.assertEqual(job.name, 'core.delete_user')
+        self.assertEqual(job.args, [self.user.pk])
+
+        tasks.delete_user(*job.args)
+        self.assertFalse(Pdd.objects.filter(user_id=self.user.pk).exists())
+
+    def test_api(self):
+        """Test users close their own account through the API"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        res = client.delete(reverse('user:me'))
+
+        self.assertEqual(res.status_code, 202)
+        self.assertEqual(Job.objects.get().name, 'core.delete_user')
+
+    def test_admin(self):
+        """Test the admin counts the data and schedules the deletion"""
+        admin = get_user_model().objects.create_superuser(
+            'admin@gmail.com', 'testpass'
+        )
+        client = Client()
+        client.force_login(admin)
+        url = reverse('admin:core_user_delete', args=[self.user.pk])
+
+        res = client.get(url)
+        self.assertContains(res, 'Pdds: 3')
+
+        client.post(url, {'post': 'yes'})
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertEqual(Job.objects.get().args, [self.user.pk])
+
+    def test_command(self):
+        """Test delete_users deletes right away with --now"""
+        out = StringIO()
+
+        call_command('delete_users', 'user@gmail.com', '--now', stdout=out)
+
+        self.assertIn('3 core.Pdd,', out.getvalue())
+        self.assertFalse(Pdd.objects.filter(user_id=self.user.pk).exists())
+
+
+class DeleteUserFilesTests(TransactionTestCase):
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings = self.settings(MEDIA_ROOT=media_root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_files_released(self):
+        """Test files are removed with their last reference"""
+        user = sample_account('user@gmail.com', content=b'shared')
+        other = sample_account('other@gmail.com', content=b'shared')
+        sample_account('third@gmail.com', pdds=1, content=b'own')
+        own = Pdd.objects.get(user__email='third@gmail.com').videofile
+        third = get_user_model().objects.get(email='third@gmail.com')
+        deletion.close(user)
+        deletion.close(third)
+
+        deletion.delete_user(user.pk)
+        deletion.delete_user(third.pk)
+
+        shared = Pdd.objects.filter(user=other).first().videofile
+        self.assertTrue(os.path.exists(shared.path))
+        self.assertEqual(VideoBlob.objects.get().refcount, 3)
+        self.assertFalse(os.path.exists(own.path))
@@ -0,0 +1,173 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase
+from django.utils import timezone
+
+from core import jobs
+from core.management.commands.run_workers import Command
+from core.models import Job
+
+
+calls = []
+
+
+@jobs.job(name='tests.record')
+def record(value):
+    calls.append(value)
+
+
+@jobs.job(name='tests.fail', max_attempts=2)
+def fail():
+    raise RuntimeError('Broken')
+
+
+@jobs.job(name='tests.limited', concurrency=1)
+def limited():
+    pass
+
+
+class JobQueueTests(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_in_transaction(self):
+        """Test a job is rolled back together with the transaction"""
+        try:
+            with transaction.atomic():
+                jobs.enqueue('tests.record', 1)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+
+        self.assertFalse(Job.objects.exists())
+
+    def test_enqueue_unknown_job(self):
+        """Test only registered jobs can be queued"""
+        with self.assertRaises(KeyError):
+            jobs.enqueue('tests.unknown')
+
+    def test_claim_by_priority(self):
+        """Test higher priorities are claimed first, then older jobs"""
+        low = jobs.enqueue('tests.record', 1)
+        high = jobs.enqueue('tests.record', 2, priority=10)
+        later = record.delay(3)
+        jobs.enqueue('tests.record', 4, delay=60)
+
+        claimed = jobs.claim(10)
+
+        self.assertEqual(
+            [job.pk for job in claimed], [high.pk, low.pk, later.pk]
+        )
+        self.assertTrue(all(
+            job.status == Job.Status.RUNNING for job in claimed
+        ))
+
+    def test_claim_concurrency_limit(self):
+        """Test no more jobs of a kind run than its concurrency allows"""
+        jobs.enqueue('tests.limited')
+        jobs.enqueue('tests.limited')
+
+        self.assertEqual(len(jobs.claim(10)), 1)
+        self.assertEqual(jobs.claim(10), [])
+
+    def test_visibility_timeout(self):
+        """Test a job whose worker went away is claimed again"""
+        job = jobs.enqueue('tests.record', 1)
+        jobs.claim(1)
+        self.assertEqual(jobs.claim(1), [])
+
+        Job.objects.filter(pk=job.pk).update(
+            locked_until=timezone.now() - timedelta(seconds=1)
+        )
+        claimed = jobs.claim(1)
+
+        self.assertEqual([job.pk for job in claimed], [job.pk])
+        self.assertEqual(claimed[0].attempts, 2)
+
+    def test_run_job(self):
+        """Test a successful run is recorded with its duration"""
+        job = jobs.enqueue('tests.record', 42)
+        claimed = jobs.claim(1)[0]
+
+        name, status, duration = jobs.run(job.pk, claimed.lock_token)
+
+        self.assertEqual(calls, [42])
+        self.assertEqual(status, Job.Status.DONE)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.DONE)
+        self.assertEqual(job.duration, duration)
+        self.assertIsNone(job.lock_token)
+
+    def test_retry_with_backoff(self):
+        """Test failed jobs are retried later, then given up"""
+        job = jobs.enqueue('tests.fail')
+
+        jobs.run(job.pk, jobs.claim(1)[0].lock_token)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.QUEUED)
+        self.assertIn('RuntimeError: Broken', job.last_error)
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertEqual(jobs.claim(1), [])
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        jobs.run(job.pk, jobs.claim(1)[0].lock_token)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.FAILED)
+
+    def test_run_after_lost_claim(self):
+        """Test a worker that timed out does not overwrite the new claim"""
+        job = jobs.enqueue('tests.record', 1)
+        stale = jobs.claim(1)[0].lock_token
+        Job.objects.filter(pk=job.pk).update(
+            locked_until=timezone.now() - timedelta(seconds=1)
+        )
+        current = jobs.claim(1)[0].lock_token
+
+        jobs.run(job.pk, stale)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.RUNNING)
+        self.assertEqual(job.lock_token, current)
+
+    def test_run_workers_command(self):
+        """Test the command runs all runnable jobs and reports timings"""
+        jobs.enqueue('tests.record', 1)
+        jobs.enqueue('tests.record', 2, priority=1)
+        out = StringIO()
+
+        call_command('run_workers', processes=0, once=True, stdout=out)
+
+        self.assertEqual(calls, [2, 1])
+        self.assertEqual(out.getvalue().count('tests.record: done in'), 2)
+        self.assertFalse(
+            Job.objects.exclude(status=Job.Status.DONE).exists()
+        )
+
+    def test_run_workers_survives_errors(self):
+        """Test a job run raising is logged and leaves the job claimed"""
+        job = jobs.enqueue('tests.record', 1)
+
+        with patch('core.jobs.run', side_effect=Job.DoesNotExist), \
+                self.assertLogs('core.management.commands.run_workers'):
+            call_command('run_workers', processes=0, once=True)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.RUNNING)
+
+    def test_run_workers_broken_pool(self):
+        """Test results of a broken pool are logged and reported as such"""
+        command = Command(stdout=StringIO())
+        done, broken = Future(), Future()
+        done.set_result(('tests.record', 'done', 0.1))
+        broken.set_exception(BrokenProcessPool())
+
+        with self.assertLogs('core.management.commands.run_workers'):
+            self.assertTrue(command.collect(done))
+            self.assertFalse(command.collect(broken))
@@ -0,0 +1,183 @@
+import asyncio
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.test import AsyncClient, TestCase, TransactionTestCase, \
+    override_settings
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import metrics
+from core.models import Pdd
+
+
+PDD_URL = reverse('pdd:pdd-list')
+TOKEN_URL = reverse('user:token')
+METRICS_URL = reverse('metrics')
+ASYNC_ME_URL = reverse('user:async-me')
+
+
+def server_timing(response):
+    """Return the Server-Timing metrics of a response by name"""
+    return {
+        metric.split(';')[0]: metric
+        for metric in response['Server-Timing'].split(', ')
+    }
+
+
+class ServerTimingTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        Pdd.objects.create(
+            user=self.user, name='PDD',
+            timestamp=datetime(2020, 1, 1, tzinfo=timezone.utc)
+        )
+
+    @override_settings(SERVER_TIMING={'SAMPLE_RATE': 1})
+    def test_sampled_request(self):
+        """Test a sampled request reports where its time went"""
+        self.client.force_authenticate(self.user)
+
+        res = self.client.get(PDD_URL)
+
+        timings = server_timing(res)
+        self.assertEqual(
+            set(timings),
+            {'db', 'auth', 'serialize', 'render', 'total', 'size'}
+        )
+        # List version, page and videos; forced auth runs no query.
+        self.assertIn('desc="3 queries"', timings['db'])
+        self.assertEqual(
+            timings['size'], f'size;desc="{len(res.content)} bytes"'
+        )
+
+    @override_settings(SERVER_TIMING={'SAMPLE_RATE': 1})
+    def test_token_view_timed(self):
+        """Test the password check of the token view is timed"""
+        res = self.client.post(
+            TOKEN_URL, {'email': 'test@test.com', 'password': 'testpass'}
+        )
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('serialize', server_timing(res))
+
+    def test_not_sampled(self):
+        """Test no header is added with sampling off"""
+        self.client.force_authenticate(self.user)
+
+        res = self.client.get(PDD_URL)
+
+        self.assertFalse(res.has_header('Server-Timing'))
+
+
+class MetricsEndpointTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_disabled(self):
+        """Test /metrics does not exist without a metrics directory"""
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, 404)
+
+    def test_histograms_merged(self):
+        """Test the histograms of all worker processes are added up"""
+        other = metrics.Histograms(self.directory.name, 5)
+        other.observe('user:token', 'POST', 0.02, 10, None)
+        other.observe('user:token', 'POST', 3, 10, None)
+        other.flush()
+
+        with self.settings(SERVER_TIMING={
+                'METRICS_DIR': self.directory.name}):
+            self.client.post(TOKEN_URL, {'email': 'x', 'password': 'y'})
+            res = self.client.get(METRICS_URL)
+
+        text = res.content.decode()
+        labels = 'route="user:token",method="POST"'
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(
+            f'http_request_duration_seconds_count{{{labels}}} 3', text
+        )
+        self.assertIn(
+            f'http_request_duration_seconds_bucket{{{labels},le="2.5"}} 2',
+            text
+        )
+        self.assertIn(
+            f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 3',
+            text
+        )
+        self.assertEqual(len(os.listdir(self.directory.name)), 2)
+
+    def test_token_required(self):
+        """Test /metrics is refused without the configured token"""
+        with self.settings(SERVER_TIMING={
+                'METRICS_DIR': self.directory.name,
+                'METRICS_TOKEN': 'secret'}):
+            refused = self.client.get(METRICS_URL)
+            allowed = self.client.get(
+                METRICS_URL, HTTP_AUTHORIZATION='Bearer secret'
+            )
+
+        self.assertEqual(refused.status_code, 403)
+        self.assertEqual(allowed.status_code, 200)
+
+    def test_sampled_phases_recorded(self):
+        """Test sampled requests add their phases and queries"""
+        histograms = metrics.Histograms(self.directory.name, 5)
+        timings = metrics.Timings()
+        timings.add('db', 0.5)
+        timings.queries = 4
+
+        histograms.observe('pdd:pdd-list', 'GET', 1, None, timings)
+        histograms.flush()
+
+        with open(histograms.path) as file:
+            entry = json.load(file)['pdd:pdd-list GET']
+        self.assertEqual(entry['queries'], 4)
+        self.assertEqual(entry['phases'], {'db': 0.5})
+        self.assertEqual(entry['bytes'], 0)
+
+
+class AsyncMiddlewareTests(TransactionTestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.token = Token.objects.create(user=self.user)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_asgi_chain_stays_async(self):
+        """Test the middleware keeps ASGI requests off a shared thread"""
+        with self.settings(SERVER_TIMING={
+                'SAMPLE_RATE': 1, 'METRICS_DIR': self.directory}):
+            chain = ASGIHandler()._middleware_chain
+
+        self.assertTrue(asyncio.iscoroutinefunction(chain))
+
+    @override_settings(SERVER_TIMING={'SAMPLE_RATE': 1})
+    async def test_async_sampled_request(self):
+        """Test async views report the queries of their pool threads"""
+        res = await AsyncClient().get(
+            ASYNC_ME_URL, authorization=f'Token {self.token.key}'
+        )
+
+        self.assertEqual(res.status_code, 200)
+        self.assertNotIn('desc="0 queries"', server_timing(res)['db'])
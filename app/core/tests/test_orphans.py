@@ -0,0 +1,158 @@
+import hashlib
+import os
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase
+
+from core import orphans
+from core.models import Pdd, UploadSession, VideoBlob
+from core.storage import blob_name, video_storage
+
+ORPHAN = b'orphaned video'
+
+
+def sample_pdd_with_video(user, content):
+    """Create a PDD object and store `content` as its video"""
+    pdd = Pdd.objects.create(
+        user=user,
+        name='PDD',
+        timestamp=datetime.now(timezone.utc)
+    )
+    pdd.videofile.save('video.mp4', ContentFile(content))
+    return pdd
+
+
+def make_old(path):
+    """Move the modification time of a file past the grace period"""
+    past = time.time() - orphans.GRACE_PERIOD - 60
+    os.utime(path, (past, past))
+
+
+def write_file(name, content=b'leftover'):
+    """Write a file below MEDIA_ROOT and return its path"""
+    path = video_storage.path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as file:
+        file.write(content)
+    return path
+
+
+class OrphanTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings = self.settings(MEDIA_ROOT=media_root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.user = get_user_model().objects.create_user(
+            'user@gmail.com', 'testpass'
+        )
+        self.kept = sample_pdd_with_video(self.user, b'kept video')
+        # A reference count gone wrong, nothing uses the file.
+        orphan = VideoBlob.objects.create(
+            name=blob_name(hashlib.sha256(ORPHAN).hexdigest(), 'video.mp4'),
+            digest=hashlib.sha256(ORPHAN).hexdigest(),
+            size=len(ORPHAN),
+            refcount=1
+        )
+        self.paths = [
+            self.kept.videofile.path,
+            write_file(orphan.name, ORPHAN),
+            write_file('uploads/tmp/tmp1234'),
+            write_file(f'uploads/partial/{uuid.uuid4()}.part'),
+        ]
+        for path in self.paths:
+            make_old(path)
+
+    def test_collect(self):
+        """Test only unreferenced files are deleted and counted"""
+        reports = orphans.collect()
+
+        self.assertTrue(os.path.exists(self.kept.videofile.path))
+        for path in self.paths[1:]:
+            self.assertFalse(os.path.exists(path))
+        self.assertEqual(
+            [report.orphans for report in reports], [1, 1, 1]
+        )
+        self.assertEqual(reports[0].bytes, len(ORPHAN))
+        self.assertEqual(
+            list(VideoBlob.objects.values_list('name', flat=True)),
+            [self.kept.videofile.name]
+        )
+
+    def test_dry_run(self):
+        """Test a dry run reports the orphans and deletes nothing"""
+        reports = orphans.collect(dry_run=True)
+
+        self.assertEqual(
+            [report.orphans for report in reports], [1, 1, 1]
+        )
+        for path in self.paths:
+            self.assertTrue(os.path.exists(path))
+        self.assertEqual(VideoBlob.objects.count(), 2)
+
+    def test_grace_period(self):
+        """Test recently modified files are kept"""
+        os.utime(self.paths[1])
+        os.utime(self.paths[2])
+
+        reports = orphans.collect()
+
+        self.assertTrue(os.path.exists(self.paths[1]))
+        self.assertTrue(os.path.exists(self.paths[2]))
+        self.assertEqual(reports[0].orphans, 0)
+
+    def test_reused_file_kept(self):
+        """Test an orphan stored again is kept before it is referenced"""
+        # As if the PDD object saving it was not committed yet.
+        name = video_storage.save('video.mp4', ContentFile(ORPHAN))
+
+        self.assertEqual(video_storage.path(name), self.paths[1])
+        self.assertGreater(os.path.getmtime(self.paths[1]), time.time() - 60)
+        orphans.collect()
+        self.assertTrue(os.path.exists(self.paths[1]))
+
+    def test_live_upload_session_kept(self):
+        """Test the partial file of an existing upload session is kept"""
+        session = UploadSession.objects.create(
+            user=self.user, pdd=self.kept, filename='video.mp4', size=8
+        )
+        path = write_file(
+            os.path.relpath(session.partial_path, video_storage.location)
+        )
+        self.paths.append(path)
+        make_old(path)
+
+        orphans.collect()
+
+        self.assertTrue(os.path.exists(path))
+
+    def test_batches_and_rate(self):
+        """Test candidates are looked up in batches, deletions throttled"""
+        start = time.monotonic()
+
+        # Per video a savepoint, the lock, the lookup, the delete of the
+        # orphan and the release, then the lookup of the partial file.
+        with self.assertNumQueries(10):
+            orphans.collect(rate=20, batch_size=1)
+
+        # Three deletions at 20 per second take at least 0.1 seconds.
+        self.assertGreaterEqual(time.monotonic() - start, 0.1)
+
+    def test_command(self):
+        """Test gc_media reports the bytes reclaimed"""
+        out = StringIO()
+
+        call_command('gc_media', '--dry-run', stdout=out)
+
+        self.assertIn('Would reclaim', out.getvalue())
+        self.assertIn('in 3 files', out.getvalue())
@@ -0,0 +1,186 @@
+import asyncio
+import json
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.handlers.asgi import ASGIHandler
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient, Client, TestCase, \
+    TransactionTestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core import profiling
+from core.models import RequestProfile
+
+
+PDD_URL = reverse('pdd:pdd-list')
+
+
+class ProfilingMiddlewareTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings = override_settings(PROFILING={
+            'ENABLED': True, 'DIRECTORY': self.directory,
+        })
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.staff = get_user_model().objects.create_superuser(
+            'admin@test.com',
+            'testpass'
+        )
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_disabled(self):
+        """Test the middleware removes itself when profiling is off"""
+        with self.settings(PROFILING={'ENABLED': False}):
+            with self.assertRaises(MiddlewareNotUsed):
+                profiling.ProfilingMiddleware(lambda request: None)
+
+    def test_not_profiled_by_default(self):
+        """Test requests without a token are not profiled"""
+        res = self.client.get(PDD_URL)
+
+        self.assertFalse(res.has_header('X-Profile-Id'))
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_signed_header(self):
+        """Test a signed header profiles the request"""
+        res = self.client.get(
+            PDD_URL, HTTP_X_PROFILE=profiling.sign(self.staff)
+        )
+
+        profile = RequestProfile.objects.get()
+        self.assertEqual(res['X-Profile-Id'], profile.name)
+        self.assertEqual(profile.path, PDD_URL)
+        self.assertEqual(profile.status_code, 200)
+        self.assertEqual(profile.trigger, RequestProfile.Trigger.SIGNED)
+        self.assertEqual(profile.requested_by, self.staff.email)
+        with open(profiling.file_path(profile.name, 'sql')) as file:
+            timeline = json.load(file)
+        self.assertEqual(len(timeline), profile.queries)
+        self.assertGreater(profile.queries, 0)
+        with open(profiling.file_path(profile.name, 'report')) as file:
+            self.assertIn('function calls', file.read())
+
+    def test_signed_query_parameter(self):
+        """Test the token is also accepted as query parameter"""
+        self.client.get(PDD_URL, {'profile': profiling.sign(self.staff)})
+
+        self.assertTrue(RequestProfile.objects.exists())
+
+    def test_forged_token(self):
+        """Test a token with a bad signature is ignored"""
+        token = profiling.sign(self.staff)
+
+        res = self.client.get(PDD_URL, HTTP_X_PROFILE=token[:-1] + 'x')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_sampled(self):
+        """Test requests are picked at the sample rate"""
+        with self.settings(PROFILING={
+                'ENABLED': True, 'DIRECTORY': self.directory,
+                'SAMPLE_RATE': 1}):
+            self.client.get(PDD_URL)
+
+        profile = RequestProfile.objects.get()
+        self.assertEqual(profile.trigger, RequestProfile.Trigger.SAMPLED)
+
+    def test_rotation(self):
+        """Test only the newest profiles and their files are kept"""
+        token = profiling.sign(self.staff)
+        with self.settings(PROFILING={
+                'ENABLED': True, 'DIRECTORY': self.directory,
+                'MAX_PROFILES': 2}):
+            names = [
+                self.client.get(PDD_URL, HTTP_X_PROFILE=token)
+                ['X-Profile-Id']
+                for _ in range(3)
+            ]
+
+        self.assertEqual(
+            set(RequestProfile.objects.values_list('name', flat=True)),
+            set(names[1:])
+        )
+        self.assertEqual(len(os.listdir(self.directory)), 6)
+
+    def test_admin_download(self):
+        """Test staff download the files of a profile from the admin"""
+        self.client.get(PDD_URL, HTTP_X_PROFILE=profiling.sign(self.staff))
+        profile = RequestProfile.objects.get()
+        url = reverse(
+            'admin:core_requestprofile_download', args=[profile.pk, 'sql']
+        )
+        admin = Client()
+        admin.force_login(self.staff)
+
+        res = admin.get(url)
+        changelist = admin.get(
+            reverse('admin:core_requestprofile_changelist')
+        )
+
+        self.assertEqual(res.status_code, 200)
+        timeline = json.loads(b''.join(res.streaming_content))
+        self.assertEqual(len(timeline), profile.queries)
+        self.assertContains(changelist, profile.path)
+        self.assertContains(changelist, 'X-Profile')
+
+    def test_admin_download_requires_staff(self):
+        """Test other users cannot download profiles"""
+        self.client.get(PDD_URL, HTTP_X_PROFILE=profiling.sign(self.staff))
+        profile = RequestProfile.objects.get()
+        url = reverse(
+            'admin:core_requestprofile_download', args=[profile.pk, 'sql']
+        )
+        client = Client()
+        client.force_login(self.user)
+
+        res = client.get(url)
+
+        self.assertEqual(res.status_code, 302)
+
+
+class AsyncProfilingTests(TransactionTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(PROFILING={
+            'ENABLED': True, 'DIRECTORY': directory.name,
+        })
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.staff = get_user_model().objects.create_superuser(
+            'admin@test.com',
+            'testpass'
+        )
+
+    def test_asgi_chain_stays_async(self):
+        """Test profiling keeps ASGI requests off a shared thread"""
+        chain = ASGIHandler()._middleware_chain
+
+        self.assertTrue(asyncio.iscoroutinefunction(chain))
+
+    def test_async_request_profiled(self):
+        """Test requests served by the async handler are profiled"""
+        res = async_to_sync(AsyncClient().get)(
+            reverse('user:async-me'), x_profile=profiling.sign(self.staff)
+        )
+
+        profile = RequestProfile.objects.get()
+        self.assertEqual(res['X-Profile-Id'], profile.name)
+        self.assertEqual(profile.status_code, res.status_code)
@@ -0,0 +1,188 @@
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Pdd, VideoObj
+from core.response_cache import FileBackend, LocMemBackend, \
+    response_cache
+
+
+PDD_URL = reverse('pdd:pdd-list')
+PDD_BULK_URL = reverse('pdd:pdd-bulk')
+
+
+def sample_pdd_obj(user, **params):
+    """Create and return a sample pdd object"""
+    defaults = {
+        'name': 'Sample PDD object',
+        'timestamp': datetime(2020, 1, 1, tzinfo=timezone.utc),
+    }
+    defaults.update(params)
+    return Pdd.objects.create(user=user, **defaults)
+
+
+class LocMemBackendTests(TestCase):
+
+    def test_lru_byte_budget(self):
+        """Test the least recently used entries go once over budget"""
+        backend = LocMemBackend(max_bytes=25)
+        backend.set('a', '1', (b'x' * 8, 'ct'))
+        backend.set('a', '2', (b'x' * 8, 'ct'))
+        backend.get('a', '1')
+
+        backend.set('b', '3', (b'x' * 8, 'ct'))
+
+        self.assertIsNotNone(backend.get('a', '1'))
+        self.assertIsNone(backend.get('a', '2'))
+        self.assertIsNotNone(backend.get('b', '3'))
+        self.assertEqual(backend.size, 20)
+
+    def test_oversized_entry_skipped(self):
+        """Test an entry larger than the whole budget is not stored"""
+        backend = LocMemBackend(max_bytes=10)
+
+        backend.set('a', '1', (b'x' * 20, 'ct'))
+
+        self.assertIsNone(backend.get('a', '1'))
+        self.assertEqual(backend.size, 0)
+
+    def test_evict_scope(self):
+        """Test evicting a scope leaves other scopes alone"""
+        backend = LocMemBackend(max_bytes=100)
+        backend.set('a', '1', (b'x', 'ct'))
+        backend.set('a', '2', (b'x', 'ct'))
+        backend.set('b', '1', (b'x', 'ct'))
+
+        backend.evict('a')
+
+        self.assertIsNone(backend.get('a', '1'))
+        self.assertIsNone(backend.get('a', '2'))
+        self.assertEqual(backend.get('b', '1'), (b'x', 'ct'))
+        self.assertEqual(backend.size, 3)
+
+
+class FileBackendTests(TestCase):
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location)
+
+    def test_set_get_evict(self):
+        """Test entries round-trip through files and are evicted"""
+        backend = FileBackend(max_bytes=100, location=self.location)
+        backend.set('a', '1', (b'{"a": 1}', 'application/json'))
+        backend.set('b', '1', (b'[]', 'application/json'))
+
+        other = FileBackend(max_bytes=100, location=self.location)
+        self.assertEqual(
+            other.get('a', '1'), (b'{"a": 1}', 'application/json')
+        )
+        other.evict('a')
+
+        self.assertIsNone(backend.get('a', '1'))
+        self.assertIsNotNone(backend.get('b', '1'))
+
+    def test_cull_least_recently_used(self):
+        """Test culling removes the oldest files above the budget"""
+        backend = FileBackend(max_bytes=25, location=self.location)
+        for key in '123':
+            backend.set('a', key, (b'x' * 8, 'ct'))
+            os.utime(backend._path('a', key), (int(key), int(key)))
+
+        backend.cull()
+
+        self.assertIsNone(backend.get('a', '1'))
+        self.assertIsNotNone(backend.get('a', '2'))
+        self.assertIsNotNone(backend.get('a', '3'))
+
+
+class ListResponseCacheTests(TestCase):
+    """Test list responses are cached and invalidated on writes"""
+
+    def setUp(self):
+        response_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_served_from_cache(self):
+        """Test a repeated list request only runs the ETag query"""
+        sample_pdd_obj(user=self.user)
+        res1 = self.client.get(PDD_URL)
+
+        with self.assertNumQueries(1):
+            res2 = self.client.get(PDD_URL)
+
+        self.assertEqual(res2.content, res1.content)
+        self.assertEqual(res2['ETag'], res1['ETag'])
+
+    def test_cache_evicted_on_write(self):
+        """Test saving a PDD drops the cached lists of its user"""
+        pdd_obj = sample_pdd_obj(user=self.user)
+        etag = self.client.get(PDD_URL)['ETag']
+        self.assertIsNotNone(response_cache.get(Pdd, self.user.pk, etag))
+
+        pdd_obj.save()
+
+        self.assertIsNone(response_cache.get(Pdd, self.user.pk, etag))
+
+    def test_cache_evicted_on_video_links(self):
+        """Test relinking videos, as the admin does, drops cached lists"""
+        pdd_obj = sample_pdd_obj(user=self.user)
+        video = VideoObj.objects.create(user=self.user, title='Video')
+        etag = self.client.get(PDD_URL)['ETag']
+
+        pdd_obj.videos.set([video])
+        res = self.client.get(PDD_URL)
+
+        self.assertIsNone(response_cache.get(Pdd, self.user.pk, etag))
+        self.assertEqual(res.data['results'][0]['videos'], [video.id])
+
+    def test_cache_evicted_on_bulk_create(self):
+        """Test bulk created PDDs show up in the next list"""
+        etag = self.client.get(PDD_URL)['ETag']
+
+        res = self.client.post(PDD_BULK_URL, [{
+            'name': 'Bulk',
+            'timestamp': '2020-01-01T00:00:00Z',
+            'videos': [],
+        }], format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        self.assertIsNone(response_cache.get(Pdd, self.user.pk, etag))
+        res = self.client.get(PDD_URL)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_cache_per_user(self):
+        """Test users never see each other's cached lists"""
+        sample_pdd_obj(user=self.user)
+        self.client.get(PDD_URL)
+        other = get_user_model().objects.create_user(
+            'other@test.com',
+            'testpass'
+        )
+        self.client.force_authenticate(other)
+
+        res = self.client.get(PDD_URL)
+
+        self.assertEqual(res.data['results'], [])
+
+    @override_settings(RESPONSE_CACHE={'BACKEND': None})
+    def test_cache_disabled(self):
+        """Test lists are rendered every time without a backend"""
+        sample_pdd_obj(user=self.user)
+        self.client.get(PDD_URL)
+
+        with self.assertNumQueries(3):
+            self.client.get(PDD_URL)
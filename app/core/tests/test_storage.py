@@ -0,0 +1,126 @@
+import hashlib
+import os
+from datetime import datetime, timezone
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import TestCase, TransactionTestCase
+
+from core import models
+from core.storage import blob_name, blob_digest, video_storage
+
+
+CONTENT = b'the same recording'
+DIGEST = hashlib.sha256(CONTENT).hexdigest()
+
+
+def sample_pdd_with_video(user, content=CONTENT):
+    """Create a PDD object and store `content` as its video"""
+    pdd = models.Pdd.objects.create(
+        user=user,
+        name='PDD',
+        timestamp=datetime.now(timezone.utc)
+    )
+    pdd.videofile.save('video.MP4', ContentFile(content))
+    return pdd
+
+
+class StorageNameTests(TestCase):
+
+    def test_blob_name(self):
+        """Test stored files are named after their digest"""
+        self.assertEqual(
+            blob_name(DIGEST, 'uploads/videos/x.MP4'),
+            f'uploads/videos/{DIGEST[:2]}/{DIGEST}.mp4'
+        )
+
+    def test_blob_name_odd_extension(self):
+        """Test unusual extensions are dropped from the name"""
+        self.assertEqual(
+            blob_name(DIGEST, 'video.m p4'),
+            f'uploads/videos/{DIGEST[:2]}/{DIGEST}'
+        )
+
+    def test_blob_digest(self):
+        """Test the digest is recovered from stored names only"""
+        self.assertEqual(blob_digest(blob_name(DIGEST, 'a.mp4')), DIGEST)
+        self.assertIsNone(blob_digest('uploads/videos/some-uuid.mp4'))
+
+
+class DeduplicationTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@gmail.com',
+            'testpass'
+        )
+
+    def tearDown(self):
+        for blob in models.VideoBlob.objects.all():
+            video_storage.purge(blob.name)
+
+    def test_identical_uploads_share_file(self):
+        """Test the same video uploaded twice is stored once"""
+        pdd1 = sample_pdd_with_video(self.user)
+        pdd2 = sample_pdd_with_video(self.user)
+
+        self.assertEqual(pdd1.videofile.name, pdd2.videofile.name)
+        self.assertEqual(pdd1.videofile.name, blob_name(DIGEST, 'v.mp4'))
+        blob = models.VideoBlob.objects.get()
+        self.assertEqual(blob.refcount, 2)
+        self.assertEqual(blob.size, len(CONTENT))
+        self.assertEqual(pdd1.videofile.read(), CONTENT)
+
+    def test_deleting_pdd_releases_reference(self):
+        """Test the file survives while other PDD objects use it"""
+        pdd1 = sample_pdd_with_video(self.user)
+        sample_pdd_with_video(self.user)
+
+        pdd1.delete()
+
+        blob = models.VideoBlob.objects.get()
+        self.assertEqual(blob.refcount, 1)
+        self.assertTrue(video_storage.exists(blob.name))
+
+    def test_replacing_video_moves_reference(self):
+        """Test a new video releases the previous file"""
+        pdd = sample_pdd_with_video(self.user)
+        pdd.videofile.save('other.mp4', ContentFile(b'another recording'))
+
+        self.assertFalse(
+            models.VideoBlob.objects.filter(digest=DIGEST).exists()
+        )
+        self.assertEqual(
+            models.VideoBlob.objects.get().name, pdd.videofile.name
+        )
+
+    def test_reference_counted_for_pdd_loaded_elsewhere(self):
+        """Test saving a PDD object not loaded from the DB"""
+        pdd = sample_pdd_with_video(self.user)
+        copy = models.Pdd(
+            id=pdd.id,
+            user=self.user,
+            name='Renamed',
+            timestamp=pdd.timestamp
+        )
+
+        copy.save()
+
+        self.assertFalse(models.VideoBlob.objects.exists())
+
+
+class GarbageCollectionTests(TransactionTestCase):
+
+    def test_last_reference_removes_file(self):
+        """Test the file is deleted with the last PDD object using it"""
+        user = get_user_model().objects.create_user(
+            'test@gmail.com',
+            'testpass'
+        )
+        pdd = sample_pdd_with_video(user)
+        path = pdd.videofile.path
+
+        pdd.delete()
+
+        self.assertFalse(models.VideoBlob.objects.exists())
+        self.assertFalse(os.path.exists(path))
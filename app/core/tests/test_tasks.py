@@ -0,0 +1,106 @@
+from datetime import datetime, timezone
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import TestCase
+
+from core import tasks
+from core.models import Job, Pdd
+from core.tests.test_videometa import sample_mp4, sample_webm
+
+
+def sample_pdd_obj(user, **params):
+    """Create and return a sample pdd object"""
+    defaults = {
+        'name': 'Sample PDD object',
+        'timestamp': datetime(2020, 1, 1, tzinfo=timezone.utc),
+    }
+    defaults.update(params)
+    return Pdd.objects.create(user=user, **defaults)
+
+
+class VideoMetadataTaskTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.pdd = sample_pdd_obj(user=self.user)
+
+    def test_job_queued_on_new_video(self):
+        """Test storing a video queues the metadata extraction"""
+        self.pdd.videofile.save('video.mp4', ContentFile(sample_mp4()))
+
+        job = Job.objects.get()
+        self.assertEqual(job.name, 'core.extract_video_metadata')
+        self.assertEqual(job.args, [self.pdd.pk, self.pdd.videofile.name])
+
+    def test_no_job_without_new_video(self):
+        """Test saving other fields does not queue anything"""
+        self.pdd.name = 'Renamed'
+        self.pdd.save()
+
+        self.assertFalse(Job.objects.exists())
+
+    def test_extract_video_metadata(self):
+        """Test the metadata read from the file is stored on the PDD"""
+        self.pdd.videofile.save('video.mp4', ContentFile(sample_mp4()))
+        updated_at = Pdd.objects.get(pk=self.pdd.pk).updated_at
+
+        tasks.extract_video_metadata(self.pdd.pk, self.pdd.videofile.name)
+
+        pdd = Pdd.objects.get(pk=self.pdd.pk)
+        self.assertEqual(pdd.video_duration, 90.0)
+        self.assertEqual((pdd.video_width, pdd.video_height), (1920, 1080))
+        self.assertEqual(pdd.video_codec, 'h264')
+        self.assertGreater(pdd.video_bitrate, 0)
+        self.assertGreater(pdd.updated_at, updated_at)
+
+    def test_extract_reuses_shared_file(self):
+        """Test a second PDD with the same video does not read the file"""
+        content = ContentFile(sample_mp4())
+        self.pdd.videofile.save('video.mp4', content)
+        tasks.extract_video_metadata(self.pdd.pk, self.pdd.videofile.name)
+        other = sample_pdd_obj(user=self.user)
+        other.videofile.save('copy.mp4', content)
+
+        # The PDD, the metadata of the other PDD, the update and the bump
+        # of the list version.
+        with self.assertNumQueries(4):
+            tasks.extract_video_metadata(other.pk, other.videofile.name)
+
+        other.refresh_from_db()
+        self.assertEqual(other.video_codec, 'h264')
+
+    def test_extract_skips_replaced_video(self):
+        """Test nothing is written once the PDD got another video"""
+        self.pdd.videofile.save('video.mp4', ContentFile(sample_mp4()))
+        name = self.pdd.videofile.name
+        self.pdd.videofile.save('other.mp4', ContentFile(b'not a video'))
+
+        tasks.extract_video_metadata(self.pdd.pk, name)
+
+        self.pdd.refresh_from_db()
+        self.assertIsNone(self.pdd.video_duration)
+
+    def test_extract_long_codec(self):
+        """Test an unknown codec id is cut to the length of the column"""
+        self.pdd.videofile.save(
+            'video.webm', ContentFile(sample_webm(codec=b'V_' + b'X' * 60))
+        )
+
+        tasks.extract_video_metadata(self.pdd.pk, self.pdd.videofile.name)
+
+        self.pdd.refresh_from_db()
+        self.assertEqual(self.pdd.video_codec, 'v_' + 'x' * 30)
+
+    def test_extract_unreadable_video(self):
+        """Test files that are no known container are left alone"""
+        self.pdd.videofile.save('video.mp4', ContentFile(b'not a video'))
+
+        tasks.extract_video_metadata(self.pdd.pk, self.pdd.videofile.name)
+
+        self.pdd.refresh_from_db()
+        self.assertIsNone(self.pdd.video_duration)
+        self.assertEqual(self.pdd.video_codec, '')
@@ -0,0 +1,209 @@
+import struct
+from io import BytesIO
+
+from django.test import TestCase
+
+from core import videometa
+
+
+def box(kind, payload=b''):
+    """Return an MP4 box"""
+    return struct.pack('>I4s', 8 + len(payload), kind) + payload
+
+
+def full_box(kind, payload, version=0):
+    return box(kind, bytes([version, 0, 0, 0]) + payload)
+
+
+def sample_mp4(duration=90, timescale=1000, width=1920, height=1080,
+               codec=b'avc1', mdat=b'\0' * 1000, moov_first=True):
+    """Return a minimal MP4 file with one video and one audio track"""
+    mvhd = full_box(
+        b'mvhd',
+        struct.pack('>IIII', 0, 0, timescale, duration * timescale) +
+        b'\0' * 80
+    )
+    tkhd = full_box(
+        b'tkhd',
+        b'\0' * 20 + b'\0' * 16 + b'\0' * 36 +
+        struct.pack('>II', width << 16, height << 16)
+    )
+    visual_entry = box(
+        codec,
+        b'\0' * 6 + b'\0\x01' + b'\0' * 16 +
+        struct.pack('>HH', width, height) + b'\0' * 50
+    )
+    video = box(b'trak', tkhd + box(b'mdia', (
+        full_box(b'hdlr', b'\0' * 4 + b'vide' + b'\0' * 13) +
+        box(b'minf', box(b'stbl', (
+            full_box(b'stsd', struct.pack('>I', 1) + visual_entry) +
+            full_box(b'stsz', b'\0' * 4000)
+        )))
+    )))
+    audio = box(b'trak', box(b'mdia', (
+        full_box(b'hdlr', b'\0' * 4 + b'soun' + b'\0' * 13) +
+        box(b'minf', box(b'stbl', full_box(
+            b'stsd', struct.pack('>I', 1) + box(b'mp4a', b'\0' * 28)
+        )))
+    )))
+    moov = box(b'moov', mvhd + audio + video)
+    ftyp = box(b'ftyp', b'isom\0\0\0\0isomavc1')
+    mdat = box(b'mdat', mdat)
+
+    return ftyp + (moov + mdat if moov_first else mdat + moov)
+
+
+def vint_size(size):
+    """Encode an EBML element size in eight bytes"""
+    return bytes([0x01]) + size.to_bytes(7, 'big')
+
+
+def element(element_id, payload):
+    """Return an EBML element"""
+    length = (element_id.bit_length() + 7) // 8
+    return element_id.to_bytes(length, 'big') + vint_size(len(payload)) + \
+        payload
+
+
+def sample_webm(duration_ms=12500.0, width=640, height=360,
+                codec=b'V_VP9', tracks_first=True, cluster=None,
+                cluster_length=None):
+    """
+    Return a minimal WebM file.
+
+    `cluster` replaces the media data, `cluster_length` is its length in
+    the final file when only its header is passed.
+    """
+    header = element(videometa.EBML_HEADER, element(
+        videometa.EBML_DOCTYPE, b'webm'
+    ))
+    info = element(videometa.MKV_INFO, (
+        element(videometa.MKV_TIMECODE_SCALE, (1000000).to_bytes(3, 'big')) +
+        element(videometa.MKV_DURATION, struct.pack('>d', duration_ms))
+    ))
+    tracks = element(videometa.MKV_TRACKS, (
+        element(videometa.MKV_TRACK_ENTRY, (
+            element(videometa.MKV_TRACK_TYPE, b'\x02') +
+            element(videometa.MKV_CODEC_ID, b'A_OPUS')
+        )) +
+        element(videometa.MKV_TRACK_ENTRY, (
+            element(videometa.MKV_TRACK_TYPE, b'\x01') +
+            element(videometa.MKV_CODEC_ID, codec) +
+            element(videometa.MKV_VIDEO, (
+                element(videometa.MKV_PIXEL_WIDTH, width.to_bytes(2, 'big')) +
+                element(videometa.MKV_PIXEL_HEIGHT, height.to_bytes(2, 'big'))
+            ))
+        ))
+    ))
+    if cluster is None:
+        cluster = element(videometa.MKV_CLUSTER, b'\0' * 5000)
+    cluster_length = cluster_length or len(cluster)
+    if tracks_first:
+        body = info + tracks + cluster
+    else:
+        # Tracks behind the media, only reachable through the SeekHead.
+        seek = element(videometa.MKV_SEEK, (
+            element(videometa.MKV_SEEK_ID, (
+                videometa.MKV_TRACKS.to_bytes(4, 'big')
+            )) +
+            element(videometa.MKV_SEEK_POSITION, (0).to_bytes(8, 'big'))
+        ))
+        seekhead_length = len(element(videometa.MKV_SEEKHEAD, seek))
+        position = seekhead_length + len(info) + cluster_length
+        seek = seek.replace(
+            element(videometa.MKV_SEEK_POSITION, (0).to_bytes(8, 'big')),
+            element(videometa.MKV_SEEK_POSITION, position.to_bytes(8, 'big'))
+        )
+        body = element(videometa.MKV_SEEKHEAD, seek) + info + cluster + \
+            tracks
+
+    segment_length = len(body) + cluster_length - len(cluster)
+    return header + videometa.MKV_SEGMENT.to_bytes(4, 'big') + \
+        vint_size(segment_length) + body
+
+
+class ProbeTests(TestCase):
+
+    def test_mp4(self):
+        """Test reading an MP4 file with the moov box first"""
+        data = sample_mp4()
+
+        meta = videometa.probe(BytesIO(data))
+
+        self.assertEqual(meta, {
+            'duration': 90.0,
+            'width': 1920,
+            'height': 1080,
+            'codec': 'h264',
+            'bitrate': int(len(data) * 8 / 90),
+        })
+
+    def test_mp4_moov_at_end(self):
+        """Test the media data is skipped, not read, to reach the moov"""
+        data = sample_mp4(codec=b'hvc1', mdat=b'\0' * 1000000,
+                          moov_first=False)
+        file = videometa.CountingFile(BytesIO(data))
+
+        meta = videometa.probe(file)
+
+        self.assertEqual(meta['codec'], 'hevc')
+        self.assertEqual(meta['height'], 1080)
+        self.assertLess(file.bytes_read, 1000)
+
+    def test_mp4_large_box(self):
+        """Test boxes with a 64 bit size are skipped correctly"""
+        data = sample_mp4(moov_first=False, mdat=b'')
+        ftyp, rest = data[:24], data[24:]
+        large_mdat = struct.pack('>I4sQ', 1, b'mdat', 16)
+        data = ftyp + large_mdat + rest[8:]
+
+        self.assertEqual(videometa.probe(BytesIO(data))['width'], 1920)
+
+    def test_webm(self):
+        """Test reading a WebM file"""
+        data = sample_webm()
+
+        meta = videometa.probe(BytesIO(data))
+
+        self.assertEqual(meta['duration'], 12.5)
+        self.assertEqual(meta['codec'], 'vp9')
+        self.assertEqual((meta['width'], meta['height']), (640, 360))
+
+    def test_webm_seekhead(self):
+        """Test tracks stored after the clusters are found by seeking"""
+        data = sample_webm(codec=b'V_AV1', tracks_first=False)
+        file = videometa.CountingFile(BytesIO(data))
+
+        meta = videometa.probe(file)
+
+        self.assertEqual(meta['codec'], 'av1')
+        self.assertEqual(meta['width'], 640)
+        self.assertLess(file.bytes_read, 1000)
+
+    def test_webm_invalid_duration(self):
+        """Test NaN, infinite or negative durations are dropped"""
+        for duration_ms in (float('nan'), float('inf'), -1000.0):
+            meta = videometa.probe(BytesIO(sample_webm(duration_ms)))
+
+            self.assertIsNone(meta['duration'])
+            self.assertIsNone(meta['bitrate'])
+
+    def test_unknown_format(self):
+        """Test files that are no video container are refused"""
+        with self.assertRaises(videometa.VideoMetadataError):
+            videometa.probe(BytesIO(b'just some text, no video here'))
+
+    def test_truncated_file(self):
+        """Test a cut off header raises instead of returning garbage"""
+        data = sample_mp4(moov_first=False)
+
+        with self.assertRaises(videometa.VideoMetadataError):
+            videometa.probe(BytesIO(data[:-100]))
+
+    def test_truncated_box(self):
+        """Test a box too short for its fields raises the same error"""
+        moov = box(b'moov', full_box(b'mvhd', b'\0' * 4))
+        data = box(b'ftyp', b'isom\0\0\0\0') + moov
+
+        with self.assertRaises(videometa.VideoMetadataError):
+            videometa.probe(BytesIO(data))
@@ -0,0 +1,83 @@
+"""
+Bounded thread pool for the blocking work of async views.
+
+Under ASGI, Django 3.1 runs every synchronous view on one shared thread,
+so a slow database query holds up all other synchronous requests. Async
+views instead hand their ORM calls and file I/O to this pool, whose size
+(`ASYNC_THREADS`) caps the database connections opened for them, and
+keep the event loop free to serve slow clients in the meantime.
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from core import metrics
+
+_lock = threading.Lock()
+_executor = None
+
+
+def executor():
+    """Return the shared pool, created on first use"""
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'ASYNC_THREADS', 8),
+                thread_name_prefix='async-sync'
+            )
+        return _executor
+
+
+async def run_sync(func, *args, **kwargs):
+    """Run blocking `func` in the pool and wait for it without blocking"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor(), functools.partial(func, *args, **kwargs)
+    )
+
+
+async def run_db(func, *args, **kwargs):
+    """
+    Like run_sync() for functions using the ORM.
+
+    Connections of the pool threads are recycled like those of request
+    threads, honouring CONN_MAX_AGE.
+    """
+    return await run_sync(_with_connections, func, *args, **kwargs)
+
+
+def _with_connections(func, *args, **kwargs):
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def pooled_view(view):
+    """
+    Turn a synchronous view into an async one running in the pool.
+
+    The response is rendered in the pool as well, so only sending it is
+    left to the event loop.
+    """
+    @functools.wraps(view)
+    async def async_view(request, *args, **kwargs):
+        return await run_db(_render, view, request, *args, **kwargs)
+
+    return async_view
+
+
+def _render(view, request, *args, **kwargs):
+    # Sampled requests are timed in this thread as well, see core.metrics.
+    with metrics.activate(getattr(request, 'server_timing', None)):
+        response = view(request, *args, **kwargs)
+        if callable(getattr(response, 'render', None)):
+            with metrics.timed('render'):
+                response.render()
+    return response
@@ -0,0 +1,180 @@
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.db import transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import MultiPartParser
+
+from core.models import UploadChunk, pddobj_video_file_path
+from core.storage import video_storage
+
+# Bytes read from the request body per write.
+CHUNK_SIZE = 64 * 1024
+
+
+class IncompleteChunk(Exception):
+    """Raised when the request body is shorter than the announced range"""
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_code = 'too_large'
+
+    def __init__(self, limit):
+        super().__init__(f'Videos are limited to {limit} bytes.')
+
+
+def max_size(user):
+    """Return the largest video `user` may upload, in bytes"""
+    limit = getattr(user, 'video_upload_max_size', None)
+    return settings.VIDEO_UPLOAD_MAX_SIZE if limit is None else limit
+
+
+class HashedUploadedFile(UploadedFile):
+    """
+    A file uploaded into the scratch directory of the video storage,
+    with its SHA-256 digest. Removed on close unless the storage took it.
+    """
+
+    def __init__(self, path, name, content_type, size, charset, sha256,
+                 content_type_extra=None):
+        super().__init__(
+            open(path, 'rb'), name, content_type, size, charset,
+            content_type_extra
+        )
+        self.path = path
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        return self.path
+
+    def close(self):
+        try:
+            return self.file.close()
+        finally:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+class VideoUploadHandler(FileUploadHandler):
+    """
+    Write uploaded files straight into the scratch directory of the video
+    storage, hashing them on the way.
+
+    The storage renames the finished file into place, see
+    ContentAddressedStorage._save(), so each byte hits the disk once.
+    Files larger than the user's limit are refused as soon as they
+    cross it.
+    """
+    chunk_size = CHUNK_SIZE
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.limit = max_size(getattr(self.request, 'user', None))
+        self.file, self.path = video_storage.temp_file()
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > self.limit:
+            self.discard()
+            raise UploadTooLarge(self.limit)
+        self.sha256.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.close()
+        return HashedUploadedFile(
+            self.path, self.file_name, self.content_type, file_size,
+            self.charset, self.sha256.hexdigest(), self.content_type_extra
+        )
+
+    def discard(self):
+        self.file.close()
+        os.remove(self.path)
+
+
+class VideoUploadParser(MultiPartParser):
+    """Multipart parser storing files with VideoUploadHandler"""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']._request
+        request.upload_handlers = [VideoUploadHandler(request)]
+        return super().parse(stream, media_type, parser_context)
+
+
+def create_partial_file(session):
+    """Create the sparse file the chunks of `session` are written into"""
+    os.makedirs(os.path.dirname(session.partial_path), exist_ok=True)
+    with open(session.partial_path, 'wb') as partial:
+        partial.truncate(session.size)
+
+
+def write_chunk(session, start, length, stream):
+    """
+    Copy `length` bytes from `stream` into the session file at `start`.
+
+    Positional writes let chunks arrive in any order and from parallel
+    requests without any locking.
+    """
+    if stream is None:
+        raise IncompleteChunk(f'Expected {length} bytes, got 0')
+
+    fd = os.open(session.partial_path, os.O_WRONLY)
+    try:
+        offset, end = start, start + length
+        while offset < end:
+            data = stream.read(min(CHUNK_SIZE, end - offset))
+            if not data:
+                raise IncompleteChunk(
+                    f'Expected {length} bytes, got {offset - start}'
+                )
+            view = memoryview(data)
+            while view:
+                written = os.pwrite(fd, view, offset)
+                offset += written
+                view = view[written:]
+    finally:
+        os.close(fd)
+
+    return UploadChunk.objects.create(
+        session=session,
+        offset=start,
+        length=length
+    )
+
+
+def attach(pdd, path, filename, digest=None):
+    """
+    Make the complete file at `path` the video of a PDD object.
+
+    The file must sit below MEDIA_ROOT; it is moved into the
+    content-addressed store instead of being copied through it.
+    """
+    name = pddobj_video_file_path(pdd, filename)
+    pdd.videofile.name = video_storage.adopt(path, name, digest)
+    pdd.save(update_fields=['videofile', 'updated_at'])
+    return pdd
+
+
+def finalize(session):
+    """Attach the assembled file of a complete session to its PDD object"""
+    with transaction.atomic():
+        pdd = attach(session.pdd, session.partial_path, session.filename)
+        session.delete()
+
+    return pdd
+
+
+def abort(session):
+    """Delete an upload session together with the bytes received"""
+    try:
+        os.remove(session.partial_path)
+    except FileNotFoundError:
+        pass
+    session.delete()
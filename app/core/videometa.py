@@ -0,0 +1,351 @@
+"""
+Read duration, resolution, codec and bitrate from video container headers.
+
+Only the header structures are parsed: MP4/MOV boxes and Matroska/WebM
+EBML elements are walked by their sizes and everything in between, the
+media data in particular, is skipped with seek(). A typical file costs a
+few kilobytes of reads whatever its size, and nothing is decoded.
+"""
+import math
+import struct
+from io import BytesIO
+
+# Largest header structure read into memory; larger ones are truncated.
+LEAF_LIMIT = 64 * 1024
+
+# MP4 boxes holding the boxes we look for.
+MP4_CONTAINERS = {b'moov', b'trak', b'mdia', b'minf', b'stbl'}
+MP4_CODECS = {
+    b'avc1': 'h264', b'avc3': 'h264',
+    b'hvc1': 'hevc', b'hev1': 'hevc',
+    b'av01': 'av1', b'vp08': 'vp8', b'vp09': 'vp9',
+    b'mp4v': 'mpeg4', b'jpeg': 'mjpeg',
+}
+
+EBML_HEADER = 0x1A45DFA3
+EBML_DOCTYPE = 0x4282
+MKV_SEGMENT = 0x18538067
+MKV_SEEKHEAD = 0x114D9B74
+MKV_SEEK = 0x4DBB
+MKV_SEEK_ID = 0x53AB
+MKV_SEEK_POSITION = 0x53AC
+MKV_INFO = 0x1549A966
+MKV_TIMECODE_SCALE = 0x2AD7B1
+MKV_DURATION = 0x4489
+MKV_TRACKS = 0x1654AE6B
+MKV_TRACK_ENTRY = 0xAE
+MKV_TRACK_TYPE = 0x83
+MKV_CODEC_ID = 0x86
+MKV_VIDEO = 0xE0
+MKV_PIXEL_WIDTH = 0xB0
+MKV_PIXEL_HEIGHT = 0xBA
+MKV_CLUSTER = 0x1F43B675
+MKV_CODECS = {
+    'V_MPEG4/ISO/AVC': 'h264', 'V_MPEGH/ISO/HEVC': 'hevc',
+    'V_AV1': 'av1', 'V_VP8': 'vp8', 'V_VP9': 'vp9',
+    'V_MPEG4/ISO/ASP': 'mpeg4', 'V_MJPEG': 'mjpeg',
+}
+
+
+class VideoMetadataError(ValueError):
+    """Raised for files that are not a supported or intact container"""
+
+
+class CountingFile:
+    """File wrapper counting the bytes read, used by the benchmark"""
+
+    def __init__(self, file):
+        self.file = file
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def seek(self, offset, whence=0):
+        return self.file.seek(offset, whence)
+
+    def tell(self):
+        return self.file.tell()
+
+
+def probe(file):
+    """
+    Return the metadata of the video in the binary, seekable `file`.
+
+    The result has the keys `duration` (seconds), `width`, `height`,
+    `codec` and `bitrate` (bits per second of the whole file); values the
+    headers do not provide are None.
+    """
+    size = file.seek(0, 2)
+    file.seek(0)
+    head = file.read(12)
+    if len(head) < 8:
+        raise VideoMetadataError('File too short.')
+
+    file.seek(0)
+    if head[:4] == struct.pack('>I', EBML_HEADER):
+        parse = _probe_matroska
+    elif head[4:8] in (b'ftyp', b'moov', b'mdat', b'free', b'wide'):
+        parse = _probe_mp4
+    else:
+        raise VideoMetadataError('Unknown container format.')
+    try:
+        meta = parse(file, size)
+    except VideoMetadataError:
+        raise
+    except (struct.error, IndexError, ValueError) as exc:
+        # Structures cut short inside a box or element.
+        raise VideoMetadataError(f'Corrupt header: {exc}') from exc
+
+    duration = meta['duration']
+    meta['bitrate'] = int(size * 8 / duration) if duration else None
+    return meta
+
+
+def _metadata():
+    return dict.fromkeys(('duration', 'width', 'height', 'codec'))
+
+
+def _read(file, size):
+    data = file.read(size)
+    if len(data) < size:
+        raise VideoMetadataError('Unexpected end of file.')
+    return data
+
+
+def _mp4_boxes(file, start, end):
+    """Yield (type, payload offset, payload size) of the boxes in a range"""
+    offset = start
+    while offset + 8 <= end:
+        file.seek(offset)
+        size, kind = struct.unpack('>I4s', _read(file, 8))
+        header = 8
+        if size == 1:
+            size = struct.unpack('>Q', _read(file, 8))[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header or offset + size > end:
+            raise VideoMetadataError(f'Corrupt {kind!r} box.')
+
+        yield kind, offset + header, size - header
+        offset += size
+
+
+def _probe_mp4(file, size):
+    meta = _metadata()
+    for kind, offset, length in _mp4_boxes(file, 0, size):
+        if kind == b'moov':
+            _parse_moov(file, offset, offset + length, meta)
+            return meta
+
+    raise VideoMetadataError('No moov box.')
+
+
+def _parse_moov(file, start, end, meta):
+    track_duration = None
+    for kind, offset, length in _mp4_boxes(file, start, end):
+        file.seek(offset)
+        if kind == b'mvhd':
+            data = _read(file, min(length, 32))
+            if data[0] == 1:
+                timescale, duration = struct.unpack('>IQ', data[20:32])
+            else:
+                timescale, duration = struct.unpack('>II', data[12:20])
+            if timescale and duration:
+                meta['duration'] = duration / timescale
+        elif kind == b'trak' and meta['codec'] is None:
+            track = _parse_trak(file, offset, offset + length)
+            if track is not None:
+                track_duration = track.pop('duration')
+                meta.update(track)
+
+    if meta['duration'] is None:
+        meta['duration'] = track_duration
+
+
+def _parse_trak(file, start, end):
+    """Return the metadata of a video track, or None for other tracks"""
+    track = {'duration': None, 'width': None, 'height': None,
+             'codec': None}
+    handler = None
+    pending = [(start, end)]
+    while pending:
+        for kind, offset, length in _mp4_boxes(file, *pending.pop()):
+            if kind in MP4_CONTAINERS:
+                pending.append((offset, offset + length))
+                continue
+            file.seek(offset)
+            if kind == b'tkhd':
+                data = _read(file, min(length, LEAF_LIMIT))
+                # Width and height close the box as 16.16 fixed point.
+                width, height = struct.unpack('>II', data[-8:])
+                track['width'] = (width >> 16) or None
+                track['height'] = (height >> 16) or None
+            elif kind == b'hdlr':
+                handler = _read(file, 12)[8:12]
+            elif kind == b'mdhd':
+                data = _read(file, min(length, 32))
+                if data[0] == 1:
+                    timescale, duration = struct.unpack('>IQ', data[20:32])
+                else:
+                    timescale, duration = struct.unpack('>II', data[12:20])
+                if timescale and duration:
+                    track['duration'] = duration / timescale
+            elif kind == b'stsd':
+                data = _read(file, min(length, LEAF_LIMIT))
+                if len(data) >= 44:
+                    fourcc = data[12:16]
+                    track['codec'] = MP4_CODECS.get(
+                        fourcc, fourcc.decode('latin-1').strip()
+                    )
+                    # Coded size of the visual sample entry.
+                    width, height = struct.unpack('>HH', data[40:44])
+                    track['width'] = track['width'] or width or None
+                    track['height'] = track['height'] or height or None
+
+    return track if handler == b'vide' else None
+
+
+def _read_vint(file, keep_marker=False):
+    """Read an EBML variable size integer, None for an unknown size"""
+    first = _read(file, 1)[0]
+    length = 1
+    while length <= 8 and not first & (0x80 >> (length - 1)):
+        length += 1
+    if length > 8:
+        raise VideoMetadataError('Invalid EBML number.')
+
+    value = first if keep_marker else first & (0xFF >> length)
+    rest = _read(file, length - 1)
+    for byte in rest:
+        value = (value << 8) | byte
+    if not keep_marker and value == (1 << (7 * length)) - 1:
+        return None, length
+    return value, length
+
+
+def _ebml_elements(file, start, end):
+    """Yield (id, payload offset, payload size) of the elements in a range"""
+    offset = start
+    while offset < end:
+        file.seek(offset)
+        element_id, id_length = _read_vint(file, keep_marker=True)
+        size, size_length = _read_vint(file)
+        data_start = offset + id_length + size_length
+        if size is None:
+            size = end - data_start
+        yield element_id, data_start, size
+        offset = data_start + size
+
+
+def _ebml_children(data):
+    """Return the (id, payload) pairs of the elements in a buffer"""
+    buffer = BytesIO(data)
+    children = []
+    try:
+        for element_id, offset, size in _ebml_elements(
+                buffer, 0, len(data)):
+            children.append((element_id, data[offset:offset + size]))
+    except VideoMetadataError:
+        # Truncated at LEAF_LIMIT, keep what was complete.
+        pass
+    return children
+
+
+def _uint(data):
+    return int.from_bytes(data, 'big')
+
+
+def _probe_matroska(file, size):
+    meta = _metadata()
+    elements = _ebml_elements(file, 0, size)
+    element_id, offset, length = next(elements)
+    file.seek(offset)
+    header = dict(_ebml_children(_read(file, min(length, LEAF_LIMIT))))
+    doctype = header.get(EBML_DOCTYPE, b'').decode('ascii', 'replace')
+    if doctype not in ('matroska', 'webm'):
+        raise VideoMetadataError(f'Unsupported EBML document {doctype!r}.')
+
+    for element_id, offset, length in elements:
+        if element_id == MKV_SEGMENT:
+            _parse_segment(file, offset, min(offset + length, size), meta)
+            return meta
+
+    raise VideoMetadataError('No Matroska segment.')
+
+
+def _parse_segment(file, start, end, meta):
+    positions = {}
+    seen = set()
+    for element_id, offset, length in _ebml_elements(file, start, end):
+        if element_id == MKV_SEEKHEAD:
+            file.seek(offset)
+            positions = _parse_seekhead(_read(file, min(length, LEAF_LIMIT)))
+        elif element_id in (MKV_INFO, MKV_TRACKS):
+            file.seek(offset)
+            _parse_level1(
+                element_id, _read(file, min(length, LEAF_LIMIT)), meta
+            )
+            seen.add(element_id)
+        elif element_id == MKV_CLUSTER:
+            # Media data starts, look for anything missing via SeekHead.
+            break
+        if seen == {MKV_INFO, MKV_TRACKS}:
+            return
+
+    for element_id in {MKV_INFO, MKV_TRACKS} - seen:
+        if element_id not in positions:
+            continue
+        for found_id, offset, length in _ebml_elements(
+                file, start + positions[element_id], end):
+            if found_id == element_id:
+                file.seek(offset)
+                _parse_level1(
+                    element_id, _read(file, min(length, LEAF_LIMIT)), meta
+                )
+            break
+
+
+def _parse_seekhead(data):
+    """Map level 1 element ids to their offsets in the segment"""
+    positions = {}
+    for element_id, seek in _ebml_children(data):
+        if element_id != MKV_SEEK:
+            continue
+        fields = dict(_ebml_children(seek))
+        if MKV_SEEK_ID in fields and MKV_SEEK_POSITION in fields:
+            positions[_uint(fields[MKV_SEEK_ID])] = _uint(
+                fields[MKV_SEEK_POSITION]
+            )
+    return positions
+
+
+def _parse_level1(element_id, data, meta):
+    children = _ebml_children(data)
+    if element_id == MKV_INFO:
+        fields = dict(children)
+        scale = _uint(fields.get(MKV_TIMECODE_SCALE, b'')) or 1000000
+        duration = fields.get(MKV_DURATION)
+        if duration is not None and len(duration) in (4, 8):
+            value = struct.unpack('>f' if len(duration) == 4 else '>d',
+                                  duration)[0] * scale / 1e9
+            # Floats may be NaN, infinite or negative in a corrupt file.
+            if math.isfinite(value) and value > 0:
+                meta['duration'] = value
+        return
+
+    for child_id, entry in children:
+        if child_id != MKV_TRACK_ENTRY:
+            continue
+        fields = dict(_ebml_children(entry))
+        if _uint(fields.get(MKV_TRACK_TYPE, b'')) != 1:
+            continue
+        codec = fields.get(MKV_CODEC_ID, b'').decode('ascii', 'replace')
+        meta['codec'] = MKV_CODECS.get(codec, codec.lower() or None)
+        video = dict(_ebml_children(fields.get(MKV_VIDEO, b'')))
+        meta['width'] = _uint(video.get(MKV_PIXEL_WIDTH, b'')) or None
+        meta['height'] = _uint(video.get(MKV_PIXEL_HEIGHT, b'')) or None
+        return
@@ -0,0 +1,29 @@
+"""
+Entry points of the processes started by `manage.py run_workers`.
+
+Pool processes are spawned, so this module must be importable before
+Django is set up: anything touching models is imported inside the
+functions.
+"""
+import signal
+
+import django
+from django.db import connections
+
+
+def init_worker():
+    """Prepare a pool process"""
+    django.setup()
+    from core import jobs
+    jobs.autodiscover()
+    # Let the parent decide when to stop on Ctrl-C.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def run_job(job_id, lock_token):
+    """Run a claimed job, see core.jobs.run()"""
+    from core import jobs
+    try:
+        return jobs.run(job_id, lock_token)
+    finally:
+        connections.close_all()
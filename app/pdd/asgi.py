@@ -0,0 +1,182 @@
+"""
+Streaming video uploads for ASGI deployments.
+
+Django's ASGI handler reads the whole request body into a temporary file
+before any view runs. StreamingUploadMiddleware sits in front of it and
+takes over
+
+    PUT /api/pdd/async/pddobjects/<id>/upload-video/?filename=<name>
+
+with the raw video as body. Each chunk received is hashed and written to
+the content-addressed storage from the thread pool of core.threadpool as
+it arrives, so neither the event loop nor memory are held up by the
+transfer, and the finished file is renamed into place without reading it
+again. All other requests go to Django unchanged.
+"""
+import hashlib
+import os
+import re
+from urllib.parse import parse_qs
+
+from django.db import transaction
+from django.http import Http404
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+
+from core import uploads
+from core.authentication import CachedTokenAuthentication
+from core.models import Pdd
+from core.storage import video_storage
+from core.threadpool import run_db, run_sync
+
+from pdd.serializers import PddVideoSerializer
+
+upload_path_re = re.compile(
+    r'^/api/pdd/async/pddobjects/(?P<pk>\d+)/upload-video/$'
+)
+
+
+class ClientDisconnected(Exception):
+    """Raised when the client goes away in the middle of an upload"""
+
+
+class StreamingUploadMiddleware:
+    """ASGI middleware streaming raw video uploads to the storage"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['method'] == 'PUT':
+            path = scope['path'][len(scope.get('root_path', '')):]
+            match = upload_path_re.match(path)
+            if match:
+                return await self.upload(
+                    scope, receive, send, int(match.group('pk'))
+                )
+
+        return await self.app(scope, receive, send)
+
+    async def upload(self, scope, receive, send, pk):
+        headers = {
+            name.decode('latin-1').lower(): value.decode('latin-1')
+            for name, value in scope['headers']
+        }
+        try:
+            pdd = await run_db(
+                authorize, headers.get('authorization', ''), pk
+            )
+        except exceptions.AuthenticationFailed as exc:
+            return await send_json(send, 401, {'detail': str(exc.detail)})
+        except Http404:
+            return await send_json(send, 404, {'detail': 'Not found.'})
+
+        try:
+            length = int(headers['content-length'])
+        except (KeyError, ValueError):
+            return await send_json(
+                send, 411, {'detail': 'Content-Length is required.'}
+            )
+        limit = uploads.max_size(pdd.user)
+        if length > limit:
+            return await send_json(send, 413, {
+                'detail': f'Videos are limited to {limit} bytes.'
+            })
+
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        filename = query.get('filename', ['video'])[0]
+
+        file, temp_path = await run_sync(video_storage.temp_file)
+        try:
+            digest, received = await receive_body(receive, file, length)
+        except ClientDisconnected:
+            await run_sync(discard, file, temp_path)
+            return
+        except Exception:
+            await run_sync(discard, file, temp_path)
+            raise
+        await run_sync(file.close)
+
+        if received != length:
+            await run_sync(discard, file, temp_path)
+            return await send_json(send, 400, {
+                'detail': f'Expected {length} bytes, got {received}.'
+            })
+
+        data = await run_db(store, pdd, temp_path, filename, digest)
+        await send_json(send, 200, data)
+
+
+def authorize(header, pk):
+    """Return the PDD object `pk` of the user owning the token in `header`"""
+    keyword, _, key = header.partition(' ')
+    if keyword != 'Token' or not key:
+        raise exceptions.AuthenticationFailed(
+            'Authentication credentials were not provided.'
+        )
+    user, token = CachedTokenAuthentication().authenticate_credentials(
+        key.strip()
+    )
+
+    try:
+        pdd = Pdd.objects.get(pk=pk, user=user)
+    except Pdd.DoesNotExist:
+        raise Http404
+    pdd.user = user
+    return pdd
+
+
+async def receive_body(receive, file, limit):
+    """
+    Write the request body to `file`, return its digest and length.
+
+    Stops early once more than `limit` bytes arrived.
+    """
+    sha256 = hashlib.sha256()
+    received = 0
+    more_body = True
+    while more_body and received <= limit:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise ClientDisconnected
+        chunk = message.get('body', b'')
+        if chunk:
+            await run_sync(write, file, sha256, chunk)
+            received += len(chunk)
+        more_body = message.get('more_body', False)
+
+    return sha256.hexdigest(), received
+
+
+def write(file, sha256, chunk):
+    sha256.update(chunk)
+    file.write(chunk)
+
+
+def discard(file, path):
+    file.close()
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def store(pdd, temp_path, filename, digest):
+    """Attach the received file to the PDD object, return the response"""
+    with transaction.atomic():
+        uploads.attach(pdd, temp_path, filename, digest)
+
+    return PddVideoSerializer(pdd).data
+
+
+async def send_json(send, status, data):
+    body = JSONRenderer().render(data)
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
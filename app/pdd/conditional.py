@@ -0,0 +1,182 @@
+"""
+Conditional requests for API resources.
+
+Validators of a single object come from its `updated_at` column, those
+of a list from the version of the user's list of that model, see
+core.listversions. Both are checked before anything is serialized, so an
+unchanged resource costs one lookup by key, whatever the number of rows,
+and an empty 304 response. Rendered lists are kept in
+core.response_cache under their ETag.
+"""
+import hashlib
+
+from django.db import transaction
+from django.utils.cache import get_conditional_response, \
+    patch_vary_headers
+from django.http import HttpResponse
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.response import Response
+
+from core import listversions, media
+from core.response_cache import response_cache
+
+
+def has_preconditions(request):
+    """Check whether a write request asks for a precondition check"""
+    return 'HTTP_IF_MATCH' in request.META or \
+        'HTTP_IF_UNMODIFIED_SINCE' in request.META
+
+
+class ConditionalMixin:
+    """
+    ETag and Last-Modified support for list, retrieve and update actions.
+
+    GET requests whose If-None-Match or If-Modified-Since validators still
+    match get a 304 response. PUT and PATCH requests with If-Match or
+    If-Unmodified-Since get a 412 response when the object changed since
+    the client read it.
+    """
+    # Keep rendered JSON lists in core.response_cache.
+    cache_list = True
+    # Responses contain signed media URLs, which change with every window
+    # of core.media. The validators change with them.
+    signs_media_urls = False
+    # Load the object for update, set by update().
+    lock_object = False
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.lock_object:
+            queryset = queryset.select_for_update()
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        # Validate the query parameters before answering with a 304.
+        queryset = self.filter_queryset(self.get_queryset())
+        validators = self.get_list_validators(queryset)
+        response = get_conditional_response(request, **validators)
+        if response is None:
+            response = self.cached_list(
+                request, validators['etag'], *args, **kwargs
+            )
+
+        return self.set_validators(response, **validators)
+
+    def cached_list(self, request, etag, *args, **kwargs):
+        """Return the list response from the cache, or render and cache it"""
+        if not self.cache_list or request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+
+        model, user_id = self.queryset.model, request.user.pk
+        cached = response_cache.get(model, user_id, etag)
+        if cached is not None:
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response = self.finalize_response(
+                request, response, *args, **kwargs
+            )
+            response.render()
+            response_cache.set(
+                model, user_id, etag,
+                response.content, response['Content-Type']
+            )
+
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        validators = self.get_object_validators(instance)
+        response = get_conditional_response(request, **validators)
+        if response is None:
+            serializer = self.get_serializer(instance)
+            response = Response(serializer.data)
+
+        return self.set_validators(response, **validators)
+
+    def update(self, request, *args, **kwargs):
+        if not has_preconditions(request):
+            return super().update(request, *args, **kwargs)
+
+        # No savepoint: a failure rolls the whole request back anyway.
+        with transaction.atomic(savepoint=False):
+            # Lock the row so no other write slips in between the check
+            # and the update.
+            self.lock_object = True
+            instance = self.get_object()
+            self.lock_object = False
+            validators = self.get_object_validators(instance)
+            response = get_conditional_response(request, **validators)
+            if response is not None:
+                return self.set_validators(response, **validators)
+
+            # UpdateModelMixin.update() on the locked instance, without
+            # loading it a second time.
+            serializer = self.get_serializer(
+                instance, data=request.data,
+                partial=kwargs.pop('partial', False)
+            )
+            serializer.is_valid(raise_exception=True)
+            self.perform_update(serializer)
+            return Response(serializer.data)
+
+    def get_list_validators(self, queryset):
+        """Return the ETag and Last-Modified time of a list response"""
+        number, last = listversions.get(
+            queryset.model, self.request.user.pk
+        )
+        window = self.media_window()
+        version = '|'.join([
+            str(self.request.user.pk),
+            self.request.get_full_path(),
+            self.request.accepted_media_type,
+            str(number),
+            str(window or ''),
+        ])
+        etag = hashlib.md5(version.encode()).hexdigest()
+        last_modified = int(last.timestamp()) if last else None
+        if window and last_modified:
+            last_modified = max(last_modified, window)
+
+        return {
+            'etag': f'"{etag}"',
+            'last_modified': last_modified,
+        }
+
+    def get_object_validators(self, instance):
+        """Return the ETag and Last-Modified time of a single object"""
+        changed = instance.updated_at
+        renderer = self.request.accepted_renderer.format
+        etag = f'{instance.pk}-{changed.timestamp():.6f}-{renderer}'
+        last_modified = int(changed.timestamp())
+        window = self.media_window()
+        if window:
+            etag = f'{etag}-{window}'
+            last_modified = max(last_modified, window)
+
+        return {
+            'etag': f'"{etag}"',
+            'last_modified': last_modified,
+        }
+
+    def media_window(self):
+        """Return the start of the current signed URL window, if any"""
+        if self.signs_media_urls:
+            return media.window_start()
+        return None
+
+    def set_validators(self, response, etag, last_modified):
+        if response.status_code not in (status.HTTP_200_OK,
+                                        status.HTTP_304_NOT_MODIFIED):
+            return response
+
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        # Responses differ per user, shared caches must not store them.
+        response['Cache-Control'] = 'private, no-cache'
+        patch_vary_headers(response, ('Accept', 'Authorization'))
+        return response
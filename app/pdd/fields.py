@@ -0,0 +1,114 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils.translation import gettext_lazy as _
+from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS, ManyRelatedField
+
+from core import media
+
+
+class BatchedManyRelatedField(ManyRelatedField):
+    """
+    Resolve all submitted primary keys with a single `id__in` query.
+
+    Unknown ids are reported together in one error. The objects fetched
+    are returned as the validated value, so `save()` writes the links
+    without looking them up again. BulkCreateListSerializer preloads the
+    ids of every item through `preload()`, which makes a whole batch cost
+    one query.
+    """
+    default_error_messages = {
+        'does_not_exist': _(
+            'Invalid pks "{pk_values}" - objects do not exist.'
+        ),
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        pks = [self.to_pk(item) for item in data]
+        found = self.lookup(pks)
+        missing = [pk for pk in dict.fromkeys(pks) if pk not in found]
+        if missing:
+            self.fail(
+                'does_not_exist',
+                pk_values=', '.join(str(pk) for pk in missing)
+            )
+
+        return [found[pk] for pk in dict.fromkeys(pks)]
+
+    def to_pk(self, value):
+        """Convert a submitted value to a primary key"""
+        child = self.child_relation
+        if isinstance(value, bool):
+            child.fail('incorrect_type', data_type=type(value).__name__)
+        try:
+            return child.get_queryset().model._meta.pk.to_python(value)
+        except (DjangoValidationError, TypeError):
+            child.fail('incorrect_type', data_type=type(value).__name__)
+
+    def lookup(self, pks):
+        """Return a {pk: object} mapping of the accessible objects"""
+        preloaded = getattr(self, '_preloaded', None)
+        if preloaded is not None:
+            return {pk: preloaded[pk] for pk in pks if pk in preloaded}
+
+        return self.child_relation.get_queryset().in_bulk(set(pks))
+
+    def preload(self, values):
+        """Fetch the objects for many lists of submitted ids at once"""
+        pks = set()
+        for data in values:
+            if isinstance(data, str) or not hasattr(data, '__iter__'):
+                continue
+            for value in data:
+                try:
+                    pks.add(self.to_pk(value))
+                except serializers.ValidationError:
+                    pass
+        self._preloaded = self.child_relation.get_queryset().in_bulk(pks)
+
+    def clear_preloaded(self):
+        self._preloaded = None
+
+
+class OwnedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Primary key relation limited to objects of the requesting user"""
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+
+        return BatchedManyRelatedField(**list_kwargs)
+
+    def get_queryset(self):
+        """Return the objects owned by the user of the request"""
+        request = self.context.get('request')
+        queryset = super().get_queryset()
+        if request is None:
+            return queryset.none()
+
+        return queryset.filter(user=request.user)
+
+
+class SignedMediaField(serializers.Field):
+    """Read-only URL of a stored video, signed and expiring, see core.media"""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+
+        url = media.signed_url(value.name)
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
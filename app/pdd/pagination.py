@@ -0,0 +1,192 @@
+import json
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, Cursor
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination seeking on the full ordering tuple.
+
+    DRF's CursorPagination only seeks on the first ordering field and
+    walks duplicates with an OFFSET. Here the cursor holds the values of
+    every ordering field of the boundary row, so each page is a single
+    `WHERE a >= x AND (a, b) > (x, y) ... LIMIT n` query starting its
+    index scan at the cursor, whatever the depth. The last ordering field
+    must be unique. No COUNT(*) is ever issued.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            reverse, position = False, None
+        else:
+            reverse, position = self.cursor.reverse, self.cursor.position
+
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(_invert(field) for field in ordering)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            position = self.to_python(queryset, position)
+            queryset = queryset.filter(_seek(ordering, position))
+
+        # Fetch one extra row to learn whether there is a following page.
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+
+        return self.page
+
+    def get_ordering(self, request, queryset, view):
+        """Return the ordering declared on the view or this paginator"""
+        ordering = getattr(view, 'pagination_ordering', None) or self.ordering
+        if isinstance(ordering, str):
+            return (ordering,)
+
+        return tuple(ordering)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+
+        position = self._get_position_from_instance(
+            self.page[-1], self.ordering
+        )
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=False, position=position)
+        )
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+
+        if self.page:
+            position = self._get_position_from_instance(
+                self.page[0], self.ordering
+            )
+        else:
+            # Paged past the end, go back to the last real row.
+            position = self.cursor.position
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=True, position=position)
+        )
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        if cursor is None or cursor.position is None:
+            return cursor
+
+        try:
+            position = json.loads(cursor.position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or \
+                len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        return Cursor(offset=0, reverse=cursor.reverse, position=position)
+
+    def to_python(self, queryset, position):
+        """
+        Convert the values of a decoded cursor with the fields they are
+        compared to, rejecting cursors not made for this ordering
+        """
+        values = []
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            if name in queryset.query.annotations:
+                model_field = queryset.query.annotations[name].output_field
+            else:
+                model_field = queryset.model._meta.get_field(name)
+            if not isinstance(value, str):
+                raise NotFound(self.invalid_cursor_message)
+            try:
+                values.append(model_field.to_python(value))
+            except ValidationError:
+                raise NotFound(self.invalid_cursor_message)
+
+        return values
+
+    def encode_cursor(self, cursor):
+        position = cursor.position
+        if position is not None:
+            position = json.dumps(position, separators=(',', ':'))
+
+        return super().encode_cursor(cursor._replace(position=position))
+
+    def _get_position_from_instance(self, instance, ordering):
+        position = []
+        for field in ordering:
+            name = field.lstrip('-')
+            if isinstance(instance, dict):
+                value = instance[name]
+            else:
+                value = getattr(instance, name)
+            position.append(str(value))
+
+        return position
+
+
+def _invert(field):
+    """Flip the direction of an ordering field"""
+    return field[1:] if field.startswith('-') else '-' + field
+
+
+def _seek(ordering, position):
+    """
+    Build the row-value comparison `ordering > position` as a Q object.
+
+    (a, b, c) > (x, y, z) expands to
+    a >= x AND (a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z))
+    with `>` replaced by `<` for descending fields. The leading `a >= x`
+    lets the database start the index scan at the cursor.
+    """
+    clauses = []
+    for i, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        equal = {
+            prev.lstrip('-'): value
+            for prev, value in zip(ordering[:i], position[:i])
+        }
+        clauses.append(Q(**equal, **{f'{name}__{lookup}': position[i]}))
+
+    seek = reduce(or_, clauses)
+    if len(ordering) > 1:
+        first = ordering[0]
+        lookup = 'lte' if first.startswith('-') else 'gte'
+        seek = Q(**{f'{first.lstrip("-")}__{lookup}': position[0]}) & seek
+
+    return seek
+
+
+class PddPagination(KeysetPagination):
+    """Page PDD objects in chronological order"""
+    ordering = ('timestamp', 'id')
+
+
+class VideoObjPagination(KeysetPagination):
+    """Page video objects by descending title"""
+    ordering = ('-title', 'id')
@@ -1,6 +1,80 @@
+from django.db import connection, transaction
+from django.db.models import prefetch_related_objects
 from rest_framework import serializers
 
-from core.models import VideoObj, Pdd
+from core import uploads
+from core.models import VideoObj, Pdd, UploadSession
+
+from pdd.fields import BatchedManyRelatedField, \
+    OwnedPrimaryKeyRelatedField, SignedMediaField
+
+
+class BulkCreateListSerializer(serializers.ListSerializer):
+    """
+    Create all items with batched INSERTs in a single transaction.
+
+    Rows go in through `bulk_create()` and many-to-many links through one
+    `bulk_create()` on each through table, instead of a save() per item.
+    Backends that cannot return the ids of bulk inserted rows (SQLite)
+    fall back to saving the rows one by one.
+    """
+    batch_size = 1000
+
+    def to_internal_value(self, data):
+        # Resolve the related ids of all items with one query per field.
+        fields = [
+            field for field in self.child.fields.values()
+            if isinstance(field, BatchedManyRelatedField) and
+            not field.read_only
+        ]
+        if isinstance(data, list):
+            for field in fields:
+                field.preload(
+                    item.get(field.field_name, ()) for item in data
+                    if isinstance(item, dict)
+                )
+        try:
+            return super().to_internal_value(data)
+        finally:
+            for field in fields:
+                field.clear_preloaded()
+
+    def create(self, validated_data):
+        model = self.child.Meta.model
+        m2m_fields = [field.name for field in model._meta.many_to_many]
+        objs, related = [], []
+        for attrs in validated_data:
+            attrs = dict(attrs)
+            related.append({
+                name: attrs.pop(name) for name in m2m_fields if name in attrs
+            })
+            objs.append(model(**attrs))
+
+        with transaction.atomic():
+            if connection.features.can_return_rows_from_bulk_insert:
+                model.objects.bulk_create(objs, batch_size=self.batch_size)
+            else:
+                for obj in objs:
+                    obj.save()
+
+            for name in m2m_fields:
+                field = model._meta.get_field(name)
+                through = field.remote_field.through
+                source = f'{field.m2m_field_name()}_id'
+                target = f'{field.m2m_reverse_field_name()}_id'
+                links = {
+                    (obj.pk, value.pk)
+                    for obj, values in zip(objs, related)
+                    for value in values.get(name, ())
+                }
+                through.objects.bulk_create(
+                    [through(**{source: a, target: b}) for a, b in links],
+                    batch_size=self.batch_size
+                )
+
+        # Load the links for the response in one query per field.
+        prefetch_related_objects(objs, *m2m_fields)
+        return objs
 
 
 class VideoObjSerializer(serializers.ModelSerializer):
@@ -10,22 +84,30 @@ class VideoObjSerializer(serializers.ModelSerializer):
         model = VideoObj
         fields = ('id', 'title')
         read_only_Fields = ('id',)
+        list_serializer_class = BulkCreateListSerializer
 
 
 class PddSerializer(serializers.ModelSerializer):
     """Serialize a PDD object"""
 
-    videos = serializers.PrimaryKeyRelatedField(
+    videos = OwnedPrimaryKeyRelatedField(
         many=True,
         queryset=VideoObj.objects.all()
     )
+    video_url = SignedMediaField(source='videofile')
 
     class Meta:
         model = Pdd
         fields = (
-            'id', 'videos', 'timestamp', 'name',
+            'id', 'videos', 'timestamp', 'name', 'video_url',
+            'video_duration', 'video_width', 'video_height', 'video_codec',
+            'video_bitrate',
         )
-        read_only_fields = ('id',)
+        read_only_fields = (
+            'id', 'video_duration', 'video_width', 'video_height',
+            'video_codec', 'video_bitrate',
+        )
+        list_serializer_class = BulkCreateListSerializer
 
 
 class PddDetailSerializer(PddSerializer):
@@ -41,3 +123,69 @@ class PddVideoSerializer(serializers.ModelSerializer):
             'id', 'videofile',
         )
         read_only_fields = ('id',)
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """Serializer for a resumable video upload session"""
+    received = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadSession
+        fields = ('id', 'pdd', 'filename', 'size', 'received')
+        read_only_fields = ('id',)
+        extra_kwargs = {'size': {'min_value': 1}}
+
+    def get_received(self, obj):
+        """Return the byte ranges stored so far"""
+        return obj.received_ranges()
+
+    def validate_pdd(self, value):
+        """Only allow uploads to PDD objects of the requesting user"""
+        if value.user_id != self.context['request'].user.id:
+            raise serializers.ValidationError(
+                f'Invalid pk "{value.pk}" - object does not exist.'
+            )
+        return value
+
+    def validate_size(self, value):
+        """Refuse files above the upload limit of the user"""
+        limit = uploads.max_size(self.context['request'].user)
+        if value > limit:
+            raise serializers.ValidationError(
+                f'Ensure this value is less than or equal to {limit}.'
+            )
+        return value
+
+
+class PddVideoLinkSerializer(serializers.Serializer):
+    """Serializer for attaching an already stored video by its digest"""
+    sha256 = serializers.RegexField(r'^[0-9a-fA-F]{64}$')
+
+
+class TimeRangeSerializer(serializers.Serializer):
+    """Query parameters limiting PDD objects to [start, end)"""
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        """Check the range is not reversed"""
+        if 'start' in attrs and 'end' in attrs and \
+                attrs['start'] > attrs['end']:
+            raise serializers.ValidationError('start must not be after end.')
+        return attrs
+
+
+class SearchSerializer(serializers.Serializer):
+    """Query parameter searching names or titles"""
+    search = serializers.CharField(
+        required=False, allow_blank=True, max_length=200
+    )
+
+
+class PddHistogramSerializer(TimeRangeSerializer):
+    """Query parameters of the PDD histogram"""
+    bucket = serializers.ChoiceField(
+        choices=('hour', 'day', 'week'),
+        default='day'
+    )
+    videos = serializers.BooleanField(default=False)
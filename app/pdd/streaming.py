@@ -0,0 +1,196 @@
+"""
+Serve video files with HTTP range support.
+
+Single ranges are returned as a file object limited to the range. Django
+hands that object to the WSGI server's `wsgi.file_wrapper`, which servers
+like gunicorn transmit with `os.sendfile()` (zero-copy, bounded by the
+Content-Length header). Servers without a file wrapper fall back to the
+chunked iteration of `FileResponse`. Multiple ranges are streamed as
+`multipart/byteranges` in blocks of `BLOCK_SIZE`, so memory use never
+depends on the size of the file.
+"""
+import mimetypes
+import os
+import re
+import uuid
+
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+BLOCK_SIZE = 64 * 1024
+# More ranges than this in one request are served as a full response.
+MAX_RANGES = 16
+
+range_re = re.compile(r'^\s*(\d*)\s*-\s*(\d*)\s*$')
+
+
+class RangeFile:
+    """Read-only view of the byte range [start, start + length) of a file"""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def file_etag(stat):
+    """Return a strong ETag for a file from its modification time and size"""
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def parse_range_header(header, size):
+    """
+    Parse a `Range: bytes=...` header into sorted, merged (start, end)
+    pairs with inclusive ends.
+
+    Return None when the header is missing, malformed or asks for too
+    many ranges, so the whole file is sent, and [] when no range can be
+    satisfied.
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not spec:
+        return None
+
+    ranges = []
+    parts = spec.split(',')
+    if len(parts) > MAX_RANGES:
+        return None
+    for part in parts:
+        match = range_re.match(part)
+        if not match or match.groups() == ('', ''):
+            return None
+        first, last = match.groups()
+        if not first:
+            # Suffix range, the last `last` bytes of the file.
+            start, end = max(size - int(last), 0), size - 1
+        else:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+            if last and int(last) < start:
+                return None
+        if start < size and start <= end:
+            ranges.append((start, end))
+
+    ranges.sort()
+    merged = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+
+    return merged
+
+
+def if_range_passes(request, etag, mtime):
+    """Check whether a `Range` header still applies to this file version"""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        # Weak validators never match for range requests.
+        return if_range == etag
+
+    return parse_http_date_safe(if_range) == int(mtime)
+
+
+def serve_file(request, path, content_type=None):
+    """Return a response streaming `path`, honouring Range and If-Range"""
+    file = open(path, 'rb')
+    stat = os.fstat(file.fileno())
+    size = stat.st_size
+    etag = file_etag(stat)
+    content_type = content_type or \
+        mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime)
+    )
+    if response is not None:
+        file.close()
+        return _set_validators(response, etag, stat)
+
+    ranges = None
+    if 'HTTP_RANGE' in request.META and if_range_passes(
+            request, etag, stat.st_mtime):
+        ranges = parse_range_header(request.META['HTTP_RANGE'], size)
+
+    if ranges == []:
+        file.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    elif ranges is None:
+        response = FileResponse(
+            RangeFile(file, 0, size), content_type=content_type
+        )
+        response['Content-Length'] = size
+    elif len(ranges) == 1:
+        start, end = ranges[0]
+        response = FileResponse(
+            RangeFile(file, start, end - start + 1),
+            status=206,
+            content_type=content_type
+        )
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    else:
+        response = _multipart_response(file, ranges, size, content_type)
+
+    response.block_size = BLOCK_SIZE
+    return _set_validators(response, etag, stat)
+
+
+def _set_validators(response, etag, stat):
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = 'private'
+    return response
+
+
+def _multipart_response(file, ranges, size, content_type):
+    """Stream several ranges of `file` as multipart/byteranges"""
+    boundary = uuid.uuid4().hex
+    headers = [
+        (
+            f'\r\n--{boundary}\r\n'
+            f'Content-Type: {content_type}\r\n'
+            f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n'
+        ).encode('ascii')
+        for start, end in ranges
+    ]
+    closing = f'\r\n--{boundary}--\r\n'.encode('ascii')
+
+    def parts():
+        for header, (start, end) in zip(headers, ranges):
+            yield header
+            part = RangeFile(file, start, end - start + 1)
+            for block in iter(lambda: part.read(BLOCK_SIZE), b''):
+                yield block
+        yield closing
+
+    response = StreamingHttpResponse(
+        parts(),
+        status=206,
+        content_type=f'multipart/byteranges; boundary={boundary}'
+    )
+    response['Content-Length'] = (
+        sum(len(header) for header in headers) + len(closing) +
+        sum(end - start + 1 for start, end in ranges)
+    )
+    response._resource_closers.append(file.close)
+    return response
@@ -0,0 +1,221 @@
+import hashlib
+import os
+from datetime import datetime, timezone
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.test import AsyncClient, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+
+from core.models import Pdd, VideoBlob
+from core.storage import video_storage
+
+from pdd.asgi import StreamingUploadMiddleware
+
+
+ASYNC_PDD_URL = reverse('pdd:async-pdd-list')
+ASYNC_ME_URL = reverse('user:async-me')
+
+
+def detail_url(pdd_id):
+    """Return the async PDD obj detail URL"""
+    return reverse('pdd:async-pdd-detail', args=[pdd_id])
+
+
+def upload_url(pdd_id):
+    """Return the streaming upload URL"""
+    return f'/api/pdd/async/pddobjects/{pdd_id}/upload-video/'
+
+
+def sample_pdd_obj(user, **params):
+    """Create and return a sample pdd object"""
+    defaults = {
+        'name': 'Sample PDD object',
+        'timestamp': datetime(2020, 1, 1, tzinfo=timezone.utc),
+    }
+    defaults.update(params)
+    return Pdd.objects.create(user=user, **defaults)
+
+
+async def django_app(scope, receive, send):
+    """Stand-in for the Django application behind the middleware"""
+    await send({'type': 'http.response.start', 'status': 418,
+                'headers': []})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def call_upload(path, chunks, headers=(), method='PUT',
+                      query=b'filename=clip.mp4'):
+    """Send `chunks` through the middleware, return status and body"""
+    messages = [
+        {'type': 'http.request', 'body': chunk,
+         'more_body': index < len(chunks) - 1}
+        for index, chunk in enumerate(chunks)
+    ]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        'type': 'http',
+        'method': method,
+        'path': path,
+        'query_string': query,
+        'headers': [
+            (name.encode(), value.encode()) for name, value in headers
+        ],
+    }
+    await StreamingUploadMiddleware(django_app)(scope, receive, send)
+
+    return sent[0]['status'], sent[1]['body']
+
+
+upload = async_to_sync(call_upload)
+
+
+class AsyncPddApiTests(TransactionTestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.authorization = f'Token {self.token.key}'
+        self.client = AsyncClient()
+        self.pdd = sample_pdd_obj(user=self.user)
+
+    async def test_list(self):
+        """Test the async list returns the user's PDD objects"""
+        res = await self.client.get(
+            ASYNC_PDD_URL, authorization=self.authorization
+        )
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(
+            [pdd['id'] for pdd in res.json()['results']], [self.pdd.pk]
+        )
+
+    async def test_requires_authentication(self):
+        """Test the async endpoints reject anonymous requests"""
+        res = await AsyncClient().get(ASYNC_PDD_URL)
+
+        self.assertEqual(res.status_code, 401)
+
+    async def test_detail_update(self):
+        """Test updating a PDD object through the async detail view"""
+        res = await self.client.patch(
+            detail_url(self.pdd.pk), {'name': 'Renamed'},
+            content_type='application/json',
+            authorization=self.authorization
+        )
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()['name'], 'Renamed')
+
+    async def test_me(self):
+        """Test the async me endpoint returns the token's user"""
+        res = await self.client.get(
+            ASYNC_ME_URL, authorization=self.authorization
+        )
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()['email'], self.user.email)
+
+
+class StreamingUploadTests(TransactionTestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.pdd = sample_pdd_obj(user=self.user)
+
+    def tearDown(self):
+        self.pdd.refresh_from_db()
+        if self.pdd.videofile:
+            self.pdd.videofile.delete()
+
+    def headers(self, length):
+        return [
+            ('authorization', f'Token {self.token.key}'),
+            ('content-length', str(length)),
+        ]
+
+    def test_upload(self):
+        """Test a chunked body is stored under its digest"""
+        chunks = [b'a' * 1000, b'b' * 1000, b'c' * 10]
+        content = b''.join(chunks)
+
+        status, body = upload(
+            upload_url(self.pdd.pk), chunks, self.headers(len(content))
+        )
+
+        self.assertEqual(status, 200)
+        self.assertIn(b'videofile', body)
+        self.pdd.refresh_from_db()
+        self.assertTrue(self.pdd.videofile.name.endswith('.mp4'))
+        with self.pdd.videofile.open('rb') as file:
+            self.assertEqual(file.read(), content)
+        blob = VideoBlob.objects.get()
+        self.assertEqual(blob.digest, hashlib.sha256(content).hexdigest())
+        self.assertFalse(os.listdir(video_storage.temp_dir))
+
+    def test_upload_other_users_pdd(self):
+        """Test uploading to a PDD object of another user is refused"""
+        other = get_user_model().objects.create_user(
+            'other@test.com',
+            'testpass'
+        )
+        pdd = sample_pdd_obj(user=other)
+
+        status, body = upload(upload_url(pdd.pk), [b'data'], self.headers(4))
+
+        self.assertEqual(status, 404)
+
+    def test_upload_without_token(self):
+        """Test anonymous uploads are refused before reading the body"""
+        status, body = upload(
+            upload_url(self.pdd.pk), [b'data'], [('content-length', '4')]
+        )
+
+        self.assertEqual(status, 401)
+
+    @override_settings(VIDEO_UPLOAD_MAX_SIZE=10)
+    def test_upload_too_large(self):
+        """Test bodies announced larger than the limit are refused"""
+        status, body = upload(
+            upload_url(self.pdd.pk), [b'x' * 11], self.headers(11)
+        )
+
+        self.assertEqual(status, 413)
+        self.assertFalse(VideoBlob.objects.exists())
+
+    def test_upload_length_mismatch(self):
+        """Test a body not matching its Content-Length is discarded"""
+        status, body = upload(
+            upload_url(self.pdd.pk), [b'data'], self.headers(10)
+        )
+
+        self.assertEqual(status, 400)
+        self.pdd.refresh_from_db()
+        self.assertFalse(self.pdd.videofile)
+        self.assertFalse(os.listdir(video_storage.temp_dir))
+
+    def test_other_requests_passed_on(self):
+        """Test everything but upload PUTs reaches the Django app"""
+        status, body = upload(
+            upload_url(self.pdd.pk), [b''], self.headers(0), method='POST'
+        )
+
+        self.assertEqual(status, 418)
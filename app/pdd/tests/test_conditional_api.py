@@ -0,0 +1,267 @@
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import listversions, media
+from core.models import Pdd, VideoObj
+
+
+PDD_URL = reverse('pdd:pdd-list')
+VIDEOOBJ_URL = reverse('pdd:videoobj-list')
+TEST_DATE = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+
+def detail_url(pdd_id):
+    """Return PDD obj detail URL"""
+    return reverse('pdd:pdd-detail', args=[pdd_id])
+
+
+def video_detail_url(video_id):
+    """Return video obj detail URL"""
+    return reverse('pdd:videoobj-detail', args=[video_id])
+
+
+def sample_pdd_obj(user, **params):
+    """Create and return a sample pdd object"""
+    defaults = {
+        'name': 'Sample PDD object',
+        'timestamp': TEST_DATE,
+    }
+    defaults.update(params)
+    return Pdd.objects.create(user=user, **defaults)
+
+
+class ConditionalRequestTests(TestCase):
+    """Test ETag and Last-Modified handling of the PDD API"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_not_modified(self):
+        """Test an unchanged list is answered with 304 in one query"""
+        sample_pdd_obj(user=self.user)
+        res = self.client.get(PDD_URL)
+        self.assertIn('Last-Modified', res)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(PDD_URL, HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b'')
+        self.assertIn('private', res['Cache-Control'])
+
+    def test_list_etag_changes(self):
+        """Test creating, editing or deleting a PDD changes the list ETag"""
+        pdd_obj = sample_pdd_obj(user=self.user)
+        etags = [self.client.get(PDD_URL)['ETag']]
+
+        sample_pdd_obj(user=self.user)
+        etags.append(self.client.get(PDD_URL)['ETag'])
+        pdd_obj.name = 'Renamed'
+        pdd_obj.save()
+        etags.append(self.client.get(PDD_URL)['ETag'])
+        pdd_obj.delete()
+        etags.append(self.client.get(PDD_URL)['ETag'])
+
+        self.assertEqual(len(set(etags)), 4)
+
+    def test_etags_change_with_signed_url_window(self):
+        """Test responses with signed video URLs change every window"""
+        pdd_obj = sample_pdd_obj(user=self.user)
+        window = media.media_settings()['WINDOW']
+
+        etags = set()
+        for now in (window * 1000, window * 1001):
+            with patch('core.media.time.time', return_value=now):
+                etags.add(self.client.get(PDD_URL)['ETag'])
+                etags.add(self.client.get(detail_url(pdd_obj.id))['ETag'])
+
+        self.assertEqual(len(etags), 4)
+
+    def test_list_etag_changes_on_bulk_create(self):
+        """Test bulk inserts, which send no signals, change the list ETag"""
+        sample_pdd_obj(user=self.user)
+        etag = self.client.get(PDD_URL)['ETag']
+
+        res = self.client.post(reverse('pdd:pdd-bulk'), [{
+            'name': 'Bulk', 'timestamp': '2020-01-01T00:00:00Z',
+            'videos': [],
+        }], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertNotEqual(self.client.get(PDD_URL)['ETag'], etag)
+
+    def test_list_validators_ignore_row_count(self):
+        """Test validating a list reads the list version, not the rows"""
+        for _ in range(3):
+            sample_pdd_obj(user=self.user)
+        res = self.client.get(PDD_URL)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(PDD_URL, HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertEqual(len(queries), 1)
+        self.assertIn('core_listversion', queries[0]['sql'])
+        self.assertEqual(
+            listversions.get(Pdd, self.user.pk)[0], 3
+        )
+
+    def test_list_etag_depends_on_query(self):
+        """Test different pages or filters of the list never share ETags"""
+        sample_pdd_obj(user=self.user)
+
+        res1 = self.client.get(PDD_URL)
+        res2 = self.client.get(PDD_URL, {'start': '2019-01-01T00:00:00Z'})
+
+        self.assertNotEqual(res1['ETag'], res2['ETag'])
+
+    def test_videoobj_list_not_modified(self):
+        """Test the video list supports If-None-Match too"""
+        VideoObj.objects.create(user=self.user, title='Video')
+        res = self.client.get(VIDEOOBJ_URL)
+
+        res = self.client.get(VIDEOOBJ_URL, HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_retrieve_not_modified(self):
+        """Test an unchanged PDD is answered with 304 before serializing"""
+        pdd_obj = sample_pdd_obj(user=self.user)
+        res = self.client.get(detail_url(pdd_obj.id))
+
+        with self.assertNumQueries(1):
+            res = self.client.get(
+                detail_url(pdd_obj.id),
+                HTTP_IF_NONE_MATCH=res['ETag']
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_retrieve_if_modified_since(self):
+        """Test If-Modified-Since is honoured without an ETag"""
+        pdd_obj = sample_pdd_obj(user=self.user)
+        res = self.client.get(detail_url(pdd_obj.id))
+
+        res = self.client.get(
+            detail_url(pdd_obj.id),
+            HTTP_IF_MODIFIED_SINCE=res['Last-Modified']
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_retrieve_etag_changes_with_videos(self):
+        """Test linking or renaming a video changes the PDD ETag"""
+        pdd_obj = sample_pdd_obj(user=self.user)
+        video = VideoObj.objects.create(user=self.user, title='Video')
+        etags = [self.client.get(detail_url(pdd_obj.id))['ETag']]
+
+        pdd_obj.videos.add(video)
+        etags.append(self.client.get(detail_url(pdd_obj.id))['ETag'])
+        video.title = 'Renamed'
+        video.save()
+        etags.append(self.client.get(detail_url(pdd_obj.id))['ETag'])
+        video.pdd_set.clear()
+        etags.append(self.client.get(detail_url(pdd_obj.id))['ETag'])
+
+        self.assertEqual(len(set(etags)), 4)
+
+    def test_update_if_match(self):
+        """Test a PATCH with the current ETag is applied"""
+        pdd_obj = sample_pdd_obj(user=self.user)
+        etag = self.client.get(detail_url(pdd_obj.id))['ETag']
+
+        res = self.client.patch(
+            detail_url(pdd_obj.id),
+            {'name': 'Renamed'},
+            HTTP_IF_MATCH=etag
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        pdd_obj.refresh_from_db()
+        self.assertEqual(pdd_obj.name, 'Renamed')
+
+    def test_update_precondition_failed(self):
+        """Test a PATCH based on an outdated ETag is refused"""
+        pdd_obj = sample_pdd_obj(user=self.user)
+        etag = self.client.get(detail_url(pdd_obj.id))['ETag']
+        Pdd.objects.get(id=pdd_obj.id).save()
+
+        res = self.client.patch(
+            detail_url(pdd_obj.id),
+            {'name': 'Renamed'},
+            HTTP_IF_MATCH=etag
+        )
+
+        self.assertEqual(
+            res.status_code, status.HTTP_412_PRECONDITION_FAILED
+        )
+        pdd_obj.refresh_from_db()
+        self.assertEqual(pdd_obj.name, 'Sample PDD object')
+
+
+# Look the token up on every request: the query budgets count it.
+@override_settings(TOKEN_AUTH_CACHE={'TTL': 0})
+class ConditionalUpdateBudgetTests(TestCase):
+    """Test conditional updates of videos stay within their budgets"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.video = VideoObj.objects.create(user=self.user, title='Video')
+        sample_pdd_obj(user=self.user).videos.add(self.video)
+        self.url = video_detail_url(self.video.id)
+        self.etag = self.client.get(self.url)['ETag']
+
+    def test_patch_if_match(self):
+        """Test a PATCH with If-Match loads the video once"""
+        # The token, the locked video, the update, touching the linked
+        # PDDs and bumping the list versions.
+        with self.assertNumQueries(5):
+            res = self.client.patch(
+                self.url, {'title': 'Renamed'}, HTTP_IF_MATCH=self.etag
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.title, 'Renamed')
+
+    def test_put_if_match(self):
+        """Test a PUT with If-Match loads the video once"""
+        with self.assertNumQueries(5):
+            res = self.client.put(
+                self.url, {'title': 'Renamed'}, HTTP_IF_MATCH=self.etag
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_patch_precondition_failed(self):
+        """Test a refused PATCH stops after the locked read"""
+        VideoObj.objects.get(id=self.video.id).save()
+
+        with self.assertNumQueries(2):
+            res = self.client.patch(
+                self.url, {'title': 'Renamed'}, HTTP_IF_MATCH=self.etag
+            )
+
+        self.assertEqual(
+            res.status_code, status.HTTP_412_PRECONDITION_FAILED
+        )
@@ -1,20 +1,35 @@
+import hashlib
+import json
 import os
+from base64 import b64encode
 from datetime import datetime, timezone
+from unittest import skipUnless
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlencode, urlsplit
 
+from django.core.files.base import ContentFile
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 
-from core.models import Pdd, VideoObj
+from core.models import Pdd, VideoBlob, VideoObj
+from core.querybudget import QueryBudgetExceeded
+from core.storage import blob_name, video_storage
 
 from pdd.serializers import PddSerializer, PddDetailSerializer
+from pdd.views import PddViewSet
 
 
 PDD_URL = reverse('pdd:pdd-list')
+PDD_BULK_URL = reverse('pdd:pdd-bulk')
+HISTOGRAM_URL = reverse('pdd:pdd-histogram')
 TEST_DATE = datetime.now(timezone.utc)
 
 
@@ -28,11 +43,22 @@ def video_upload_url(pddobj_id):
     return reverse('pdd:pdd-upload-video', args=[pddobj_id])
 
 
+def link_video_url(pddobj_id):
+    """Return URL for attaching a stored video"""
+    return reverse('pdd:pdd-link-video', args=[pddobj_id])
+
+
 def detail_url(pdd_id):
     """Return PDD obj detail URL"""
     return reverse('pdd:pdd-detail', args=[pdd_id])
 
 
+def authenticate(client, user):
+    """Authenticate `client` as `user` with a real API token"""
+    token = Token.objects.create(user=user)
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+
 def sample_pdd_obj(user, **params):
     """Create and return a sample pdd object"""
     defaults = {
@@ -56,6 +82,8 @@ class PublicPddApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
+# Look the token up on every request: the query budgets count it.
+@override_settings(TOKEN_AUTH_CACHE={'TTL': 0})
 class PrivatePddApiTests(TestCase):
     """Test authenticated pdd API access"""
 
@@ -65,7 +93,7 @@ class PrivatePddApiTests(TestCase):
             'test@gmail.com',
             'testpass'
         )
-        self.client.force_authenticate(self.user)
+        authenticate(self.client, self.user)
 
     def test_retrieve_pdds(self):
         """Test retrieving list of pdds"""
@@ -74,10 +102,10 @@ class PrivatePddApiTests(TestCase):
 
         res = self.client.get(PDD_URL)
 
-        pdds = Pdd.objects.all().order_by('-id')
+        pdds = Pdd.objects.all().order_by('timestamp', 'id')
         serializer = PddSerializer(pdds, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_pdds_limited_to_user(self):
         """Test retrieving pdds for user"""
@@ -93,8 +121,8 @@ class PrivatePddApiTests(TestCase):
         pdds = Pdd.objects.filter(user=self.user)
         serializer = PddSerializer(pdds, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_view_pddobj_detail(self):
         """Test viewing a PDD object in detail"""
@@ -107,6 +135,266 @@ class PrivatePddApiTests(TestCase):
         serializer = PddDetailSerializer(pdd_obj)
         self.assertEqual(res.data, serializer.data)
 
+    def test_list_pdds_constant_queries(self):
+        """Test listing PDDs does not run one query per PDD"""
+        videos = [sample_videoobj(user=self.user) for _ in range(3)]
+        for _ in range(5):
+            sample_pdd_obj(user=self.user).videos.set(videos)
+
+        # The token lookup, the ETag aggregate, the PDD query and one
+        # prefetch for all videos.
+        with self.assertNumQueries(4):
+            res = self.client.get(PDD_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 5)
+
+    def test_list_pdds_paginated(self):
+        """Test walking the PDD list page by page in both directions"""
+        # Equal timestamps force the cursor to tie-break on id.
+        pdds = [sample_pdd_obj(user=self.user) for _ in range(5)]
+        pdds.append(
+            sample_pdd_obj(user=self.user, timestamp=datetime(
+                2019, 12, 25, tzinfo=timezone.utc
+            ))
+        )
+        expected = [pdds[-1].id] + [pdd.id for pdd in pdds[:-1]]
+
+        seen = []
+        url = f'{PDD_URL}?page_size=2'
+        while url:
+            with self.assertNumQueries(4):
+                res = self.client.get(url)
+            self.assertLessEqual(len(res.data['results']), 2)
+            seen += [pdd['id'] for pdd in res.data['results']]
+            last_page, url = res.data, res.data['next']
+        self.assertEqual(seen, expected)
+
+        res = self.client.get(last_page['previous'])
+        self.assertEqual(
+            [pdd['id'] for pdd in res.data['results']], expected[2:4]
+        )
+
+    def test_list_pdds_page_size_capped(self):
+        """Test the client chosen page size is limited by the server"""
+        with patch('pdd.pagination.PddPagination.max_page_size', 3):
+            for _ in range(4):
+                sample_pdd_obj(user=self.user)
+
+            res = self.client.get(f'{PDD_URL}?page_size=100')
+
+        self.assertEqual(len(res.data['results']), 3)
+        self.assertIsNotNone(res.data['next'])
+
+    def test_list_pdds_invalid_cursor(self):
+        """Test a malformed cursor is rejected"""
+        res = self.client.get(f'{PDD_URL}?cursor=garbage')
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_pdds_tampered_cursor(self):
+        """Test a cursor with values of the wrong type is rejected"""
+        position = urlencode({'p': json.dumps(['abc', 'zz'])})
+        cursor = b64encode(position.encode()).decode()
+
+        res = self.client.get(PDD_URL, {'cursor': cursor})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_pdds_search_cursor_without_search(self):
+        """Test a search cursor cannot page the unsearched list"""
+        for _ in range(2):
+            sample_pdd_obj(user=self.user, name='Morning run')
+        res = self.client.get(PDD_URL, {'search': 'morning', 'page_size': 1})
+        query = parse_qs(urlsplit(res.data['next']).query)
+
+        res = self.client.get(PDD_URL, {'cursor': query['cursor'][0]})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_retrieve_pdd_constant_queries(self):
+        """Test the detail view fetches nested videos in one query"""
+        pdd_obj = sample_pdd_obj(user=self.user)
+        pdd_obj.videos.set(
+            [sample_videoobj(user=self.user) for _ in range(5)]
+        )
+
+        with self.assertNumQueries(3):
+            res = self.client.get(detail_url(pdd_obj.id))
+
+        self.assertEqual(len(res.data['videos']), 5)
+
+    def test_query_budget_exceeded(self):
+        """Test a view running over its query budget fails loudly"""
+        sample_pdd_obj(user=self.user)
+
+        with patch.object(PddViewSet, 'query_budget', {'list': 1}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(PDD_URL)
+
+    def test_filter_pdds_by_time_range(self):
+        """Test listing only PDD objects between start and end"""
+        for day in (1, 2, 3, 4):
+            sample_pdd_obj(
+                user=self.user,
+                name=f'Day {day}',
+                timestamp=datetime(2020, 1, day, 12, tzinfo=timezone.utc)
+            )
+
+        res = self.client.get(PDD_URL, {
+            'start': '2020-01-02T12:00:00Z',
+            'end': '2020-01-04T12:00:00Z',
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [pdd['name'] for pdd in res.data['results']], ['Day 2', 'Day 3']
+        )
+
+    def test_filter_pdds_invalid_time_range(self):
+        """Test malformed or reversed ranges are rejected"""
+        res = self.client.get(PDD_URL, {'start': 'yesterday'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(PDD_URL, {
+            'start': '2020-01-02T00:00:00Z',
+            'end': '2020-01-01T00:00:00Z',
+        })
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_pdds(self):
+        """Test listing only the PDD objects whose name matches"""
+        sample_pdd_obj(user=self.user, name='Morning run')
+        sample_pdd_obj(user=self.user, name='Evening walk')
+        other = get_user_model().objects.create_user('o@gmail.com', 'pw')
+        sample_pdd_obj(user=other, name='Morning run')
+
+        with self.assertNumQueries(4):
+            res = self.client.get(PDD_URL, {'search': 'morning'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [pdd['name'] for pdd in res.data['results']], ['Morning run']
+        )
+
+    def test_search_pdds_paginated(self):
+        """Test walking search results page by page"""
+        ids = [
+            sample_pdd_obj(user=self.user, name=f'Run {i}').id
+            for i in range(5)
+        ]
+        sample_pdd_obj(user=self.user, name='Walk')
+
+        seen = []
+        url = f'{PDD_URL}?search=run&page_size=2'
+        while url:
+            res = self.client.get(url)
+            seen += [pdd['id'] for pdd in res.data['results']]
+            url = res.data['next']
+
+        self.assertCountEqual(seen, ids)
+
+    def test_search_pdds_tied_ranks_paginated(self):
+        """Test pages of equally ranked results do not overlap"""
+        ids = [
+            sample_pdd_obj(user=self.user, name='Morning run').id
+            for _ in range(5)
+        ]
+
+        pages = []
+        url = f'{PDD_URL}?search=run&page_size=2'
+        # Bounded: a cursor not moving past ties would loop forever.
+        while url and len(pages) < len(ids):
+            res = self.client.get(url)
+            pages.append([pdd['id'] for pdd in res.data['results']])
+            url = res.data['next']
+
+        self.assertIsNone(url)
+        self.assertEqual(sum(pages, []), ids)
+
+    def test_search_pdds_blank(self):
+        """Test a blank search lists everything and a long one fails"""
+        sample_pdd_obj(user=self.user)
+
+        res = self.client.get(PDD_URL, {'search': ''})
+        self.assertEqual(len(res.data['results']), 1)
+
+        res = self.client.get(PDD_URL, {'search': 'x' * 201})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @skipUnless(connection.vendor == 'postgresql', 'Needs PostgreSQL')
+    def test_search_pdds_ranked_with_typos(self):
+        """Test misspelled words match and exact matches come first"""
+        sample_pdd_obj(user=self.user, name='Morning runs')
+        sample_pdd_obj(user=self.user, name='Morning run')
+        sample_pdd_obj(user=self.user, name='Evening walk')
+
+        res = self.client.get(PDD_URL, {'search': 'mornnig run'})
+
+        self.assertEqual(
+            [pdd['name'] for pdd in res.data['results']][:1],
+            ['Morning run']
+        )
+        self.assertNotIn(
+            'Evening walk', [pdd['name'] for pdd in res.data['results']]
+        )
+
+    def test_histogram_per_local_day(self):
+        """Test PDD objects are counted per day of TIME_ZONE"""
+        video = sample_videoobj(user=self.user)
+        # 22:00 on Jan 1st and 01:00 on Jan 2nd in Vancouver.
+        late = sample_pdd_obj(
+            user=self.user,
+            timestamp=datetime(2020, 1, 2, 6, tzinfo=timezone.utc)
+        )
+        late.videos.add(video, sample_videoobj(user=self.user))
+        sample_pdd_obj(
+            user=self.user,
+            timestamp=datetime(2020, 1, 2, 9, tzinfo=timezone.utc)
+        ).videos.add(video)
+        sample_pdd_obj(
+            user=self.user,
+            timestamp=datetime(2020, 1, 2, 10, tzinfo=timezone.utc)
+        )
+
+        with self.assertNumQueries(2):
+            res = self.client.get(HISTOGRAM_URL, {'videos': 'true'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['timezone'], 'America/Vancouver')
+        results = [
+            (row['start'].isoformat(), row['pdds'], row['videos'])
+            for row in res.data['results']
+        ]
+        self.assertEqual(results, [
+            ('2020-01-01T00:00:00-08:00', 1, 2),
+            ('2020-01-02T00:00:00-08:00', 2, 1),
+        ])
+
+    def test_histogram_per_hour_in_range(self):
+        """Test hourly buckets limited to a time range"""
+        for hour in (1, 1, 2, 5):
+            sample_pdd_obj(
+                user=self.user,
+                timestamp=datetime(2020, 1, 1, hour, tzinfo=timezone.utc)
+            )
+
+        res = self.client.get(HISTOGRAM_URL, {
+            'bucket': 'hour',
+            'end': '2020-01-01T05:00:00Z',
+        })
+
+        self.assertEqual(
+            [row['pdds'] for row in res.data['results']], [2, 1]
+        )
+        self.assertNotIn('videos', res.data['results'][0])
+
+    def test_histogram_invalid_bucket(self):
+        """Test unsupported bucket sizes are rejected"""
+        res = self.client.get(HISTOGRAM_URL, {'bucket': 'fortnight'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_create_basic_pddobj(self):
         """Test creating PDD object"""
         payload = {
@@ -138,6 +426,111 @@ class PrivatePddApiTests(TestCase):
         self.assertIn(video1, videos)
         self.assertIn(video2, videos)
 
+    def test_bulk_create_pddobjs_with_videos(self):
+        """Test creating many PDD objects and their video links at once"""
+        video1 = sample_videoobj(user=self.user, title='Video 1')
+        video2 = sample_videoobj(user=self.user, title='Video 2')
+        payload = [
+            {'name': 'PDD 1', 'timestamp': TEST_DATE, 'videos': [video1.id]},
+            {
+                'name': 'PDD 2',
+                'timestamp': TEST_DATE,
+                'videos': [video1.id, video2.id, video2.id],
+            },
+            {'name': 'PDD 3', 'timestamp': TEST_DATE, 'videos': []},
+        ]
+
+        res = self.client.post(PDD_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [pdd['videos'] for pdd in res.data],
+            [[video1.id], [video1.id, video2.id], []]
+        )
+        pdds = Pdd.objects.filter(user=self.user).order_by('name')
+        self.assertEqual(pdds.count(), 3)
+        self.assertCountEqual(pdds[1].videos.all(), [video1, video2])
+
+    def test_bulk_create_pddobjs_invalid(self):
+        """Test one invalid PDD object fails the whole batch"""
+        payload = [
+            {'name': 'PDD 1', 'timestamp': TEST_DATE, 'videos': []},
+            {'name': 'PDD 2', 'videos': []},
+        ]
+
+        res = self.client.post(PDD_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('timestamp', res.data[1])
+        self.assertFalse(Pdd.objects.exists())
+
+    def test_create_pddobj_video_ids_checked_in_one_query(self):
+        """Test submitted video ids are resolved with a single query"""
+        def create_with(count):
+            videos = [sample_videoobj(user=self.user) for _ in range(count)]
+            payload = {
+                'name': f'PDD with {count} videos',
+                'timestamp': TEST_DATE,
+                'videos': [video.id for video in videos],
+            }
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.post(PDD_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            return len(queries)
+
+        self.assertEqual(create_with(2), create_with(30))
+
+    def test_create_pddobj_with_foreign_videos(self):
+        """Test videos of other users cannot be attached"""
+        user2 = get_user_model().objects.create_user(
+            'other@gmail.com',
+            'pass'
+        )
+        own = sample_videoobj(user=self.user)
+        foreign = sample_videoobj(user=user2)
+        payload = {
+            'name': 'PDD',
+            'timestamp': TEST_DATE,
+            'videos': [own.id, foreign.id, 9999],
+        }
+
+        res = self.client.post(PDD_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            res.data['videos'],
+            [f'Invalid pks "{foreign.id}, 9999" - objects do not exist.']
+        )
+        self.assertFalse(Pdd.objects.exists())
+
+    def test_create_pddobj_with_invalid_video_id(self):
+        """Test video ids of the wrong type are rejected"""
+        payload = {'name': 'PDD', 'timestamp': TEST_DATE, 'videos': ['x']}
+
+        res = self.client.post(PDD_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('videos', res.data)
+
+    def test_bulk_create_video_ids_checked_per_item(self):
+        """Test bulk creation reports foreign videos for each item"""
+        user2 = get_user_model().objects.create_user(
+            'other@gmail.com',
+            'pass'
+        )
+        own = sample_videoobj(user=self.user)
+        foreign = sample_videoobj(user=user2)
+        payload = [
+            {'name': 'PDD 1', 'timestamp': TEST_DATE, 'videos': [own.id]},
+            {'name': 'PDD 2', 'timestamp': TEST_DATE, 'videos': [foreign.id]},
+        ]
+
+        res = self.client.post(PDD_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('videos', res.data[1])
+
     def test_partial_update_pddobj(self):
         """Test updating a PDD object with patch"""
         pddobj = sample_pdd_obj(user=self.user)
@@ -173,6 +566,8 @@ class PrivatePddApiTests(TestCase):
         self.assertEqual(len(videos), 0)
 
 
+# Look the token up on every request: the query budgets count it.
+@override_settings(TOKEN_AUTH_CACHE={'TTL': 0})
 class VideoUploadTests(TestCase):
 
     def setUp(self):
@@ -181,7 +576,7 @@ class VideoUploadTests(TestCase):
             'user@gmail.com',
             'testpass'
         )
-        self.client.force_authenticate(self.user)
+        authenticate(self.client, self.user)
         self.pddobj = sample_pdd_obj(user=self.user)
 
     def tearDown(self):
@@ -203,6 +598,107 @@ class VideoUploadTests(TestCase):
         self.assertIn('videofile', res.data)
         self.assertTrue(os.path.exists(self.pddobj.videofile.path))
 
+    def test_upload_video_constant_queries(self):
+        """Test uploading a video only loads and updates the PDD"""
+        self.pddobj.videos.set(
+            [sample_videoobj(user=self.user) for _ in range(5)]
+        )
+        url = video_upload_url(self.pddobj.id)
+        video = SimpleUploadedFile('file.mp4', b'file_content')
+
+        # Look the token up, load and update the PDD, register the new
+        # stored file, queue the metadata job and bump the list version,
+        # two savepoints included.
+        with self.assertNumQueries(12):
+            res = self.client.post(
+                url, {'videofile': video}, format='multipart'
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_upload_video_written_once(self):
+        """Test the uploaded file is renamed into the store, not copied"""
+        content = b'file_content'
+        video = SimpleUploadedFile('file.mp4', content)
+
+        with patch.object(
+            video_storage, 'temp_file', wraps=video_storage.temp_file
+        ) as temp_file:
+            res = self.client.post(
+                video_upload_url(self.pddobj.id), {'videofile': video},
+                format='multipart'
+            )
+
+        self.pddobj.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(temp_file.call_count, 1)
+        self.assertEqual(
+            self.pddobj.videofile.name,
+            blob_name(hashlib.sha256(content).hexdigest(), 'file.mp4')
+        )
+        self.assertEqual(os.listdir(video_storage.temp_dir), [])
+
+    def test_upload_video_over_user_limit(self):
+        """Test uploads above the user's limit are refused and removed"""
+        self.user.video_upload_max_size = 5
+        self.user.save()
+        video = SimpleUploadedFile('file.mp4', b'file_content')
+
+        res = self.client.post(
+            video_upload_url(self.pddobj.id), {'videofile': video},
+            format='multipart'
+        )
+
+        self.pddobj.refresh_from_db()
+        self.assertEqual(
+            res.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        )
+        self.assertFalse(self.pddobj.videofile)
+        self.assertEqual(os.listdir(video_storage.temp_dir), [])
+
+    def test_link_video_by_digest(self):
+        """Test attaching an already uploaded video by its digest"""
+        content = b'file_content'
+        other = sample_pdd_obj(user=self.user)
+        other.videofile.save('file.mp4', ContentFile(content))
+
+        res = self.client.post(
+            link_video_url(self.pddobj.id),
+            {'sha256': hashlib.sha256(content).hexdigest()}
+        )
+
+        self.pddobj.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.pddobj.videofile.name, other.videofile.name)
+        self.assertEqual(VideoBlob.objects.get().refcount, 2)
+
+    def test_link_unknown_video(self):
+        """Test linking a digest the server does not hold"""
+        res = self.client.post(
+            link_video_url(self.pddobj.id),
+            {'sha256': '0' * 64}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_link_other_users_video(self):
+        """Test videos of other users cannot be linked by digest"""
+        user2 = get_user_model().objects.create_user(
+            'other@gmail.com',
+            'pass'
+        )
+        content = b'private recording'
+        sample_pdd_obj(user=user2).videofile.save(
+            'file.mp4', ContentFile(content)
+        )
+
+        res = self.client.post(
+            link_video_url(self.pddobj.id),
+            {'sha256': hashlib.sha256(content).hexdigest()}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_upload_video_bad_request(self):
         """Test uploading an invalid video"""
         url = video_upload_url(self.pddobj.id)
@@ -0,0 +1,129 @@
+import re
+from datetime import datetime, timedelta, timezone
+from unittest import skipUnless
+from unittest.mock import Mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+
+from core.models import Pdd, VideoObj
+from core.search import search
+
+from pdd.pagination import _seek
+from pdd.views import PddViewSet, VideoObjViewSet
+
+
+USERS = 3
+ROWS_PER_USER = 300
+
+
+def viewset_queryset(viewset_class, user, action='list'):
+    """Return the queryset a viewset builds for `user`"""
+    view = viewset_class()
+    view.request = Mock(user=user, query_params={})
+    view.action = action
+    view.format_kwarg = None
+    return view.get_queryset()
+
+
+class QueryPlanTests(TestCase):
+    """
+    Check the list queries are answered from an index in index order.
+
+    Postgres prefers sequential scans, or the foreign key index and a
+    sort, for tables this small, so both are disabled for the test
+    transaction: a plan that still contains one, or another index than
+    the expected one, means no suitable index exists.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+        users = [
+            get_user_model().objects.create_user(f'user{i}@gmail.com', 'pw')
+            for i in range(USERS)
+        ]
+        Pdd.objects.bulk_create(
+            Pdd(user=user, name=f'PDD {i}', timestamp=start + timedelta(i))
+            for user in users for i in range(ROWS_PER_USER)
+        )
+        VideoObj.objects.bulk_create(
+            VideoObj(user=user, title=f'Video {i % 50}')
+            for user in users for i in range(ROWS_PER_USER)
+        )
+        cls.user = users[1]
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('SET LOCAL enable_sort = off')
+
+    def assertIndexOnly(self, queryset, index):
+        """Assert the plan walks `index`, neither scanning nor sorting"""
+        plan = queryset.explain()
+        self.assertIn(index, plan, msg=f'\n{plan}')
+        if connection.vendor == 'postgresql':
+            forbidden = ('Seq Scan', 'Sort')
+        else:
+            forbidden = ('SCAN ', 'USE TEMP B-TREE')
+        for node in forbidden:
+            self.assertNotIn(node, plan, msg=f'\n{plan}')
+
+    def assertSeekBounded(self, queryset, column):
+        """Assert the index scan starts at the cursor on `column`"""
+        plan = queryset.explain()
+        if connection.vendor == 'postgresql':
+            bounded = re.search(
+                rf'Index Cond: .*\b{column} [<>]=', plan
+            )
+        else:
+            bounded = re.search(rf'USING .*INDEX .*\b{column}[<>]', plan)
+        self.assertTrue(bounded, msg=f'\n{plan}')
+
+    def test_pdd_list_plan(self):
+        """Test listing PDD objects walks the user/timestamp index"""
+        queryset = viewset_queryset(PddViewSet, self.user)
+
+        self.assertIndexOnly(queryset[:51], 'core_pdd_user_timestamp_idx')
+
+    def test_pdd_next_page_plan(self):
+        """Test seeking to a later page keeps using the index"""
+        queryset = viewset_queryset(PddViewSet, self.user)
+        ordering = ('timestamp', 'id')
+        position = [str(datetime(2020, 6, 1, tzinfo=timezone.utc)), '150']
+
+        page = queryset.filter(_seek(ordering, position))[:51]
+
+        self.assertIndexOnly(page, 'core_pdd_user_timestamp_idx')
+        self.assertSeekBounded(page, 'timestamp')
+
+    def test_videoobj_list_plan(self):
+        """Test listing videos walks the user/title index"""
+        queryset = viewset_queryset(VideoObjViewSet, self.user)
+
+        self.assertIndexOnly(queryset[:51], 'core_videoobj_user_title_idx')
+
+    def test_videoobj_next_page_plan(self):
+        """Test seeking to a later page of videos keeps using the index"""
+        queryset = viewset_queryset(VideoObjViewSet, self.user)
+        ordering = ('-title', 'id')
+
+        page = queryset.filter(_seek(ordering, ['Video 25', '400']))[:51]
+
+        self.assertIndexOnly(page, 'core_videoobj_user_title_idx')
+        self.assertSeekBounded(page, 'title')
+
+    @skipUnless(connection.vendor == 'postgresql', 'Needs PostgreSQL')
+    def test_search_plan(self):
+        """Test searching uses the search and trigram indexes"""
+        for viewset_class in (PddViewSet, VideoObjViewSet):
+            queryset = search(
+                viewset_queryset(viewset_class, self.user), 'video 2'
+            )
+
+            plan = queryset.explain()
+            self.assertNotIn('Seq Scan', plan, msg=f'\n{plan}')
+            self.assertIn('_search_idx', plan, msg=f'\n{plan}')
@@ -0,0 +1,181 @@
+import os
+from datetime import datetime, timezone
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Pdd, UploadSession
+
+
+SESSIONS_URL = reverse('pdd:uploadsession-list')
+CONTENT = b'0123456789' * 10
+
+
+def session_url(session_id):
+    """Return the URL of an upload session"""
+    return reverse('pdd:uploadsession-detail', args=[session_id])
+
+
+def finalize_url(session_id):
+    """Return the URL finalizing an upload session"""
+    return reverse('pdd:uploadsession-finalize', args=[session_id])
+
+
+def sample_pdd_obj(user, name='Sample PDD object'):
+    """Create and return a sample pdd object"""
+    return Pdd.objects.create(
+        user=user,
+        name=name,
+        timestamp=datetime.now(timezone.utc)
+    )
+
+
+class PublicUploadSessionApiTests(TestCase):
+    """Test unauthenticated access to the upload session API"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_required_auth(self):
+        """Test the authentication is required"""
+        res = self.client.post(SESSIONS_URL, {})
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateUploadSessionApiTests(TestCase):
+    """Test resumable uploads by an authenticated user"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@gmail.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.pddobj = sample_pdd_obj(user=self.user)
+
+    def tearDown(self):
+        for session in UploadSession.objects.all():
+            if os.path.exists(session.partial_path):
+                os.remove(session.partial_path)
+        self.pddobj.refresh_from_db()
+        self.pddobj.videofile.delete()
+
+    def create_session(self, size=len(CONTENT)):
+        """Open an upload session for the sample PDD object"""
+        payload = {'pdd': self.pddobj.id, 'filename': 'vid.mp4', 'size': size}
+        return self.client.post(SESSIONS_URL, payload)
+
+    def put_chunk(self, session_id, start, end, total=len(CONTENT)):
+        """Send CONTENT[start:end + 1] to an upload session"""
+        return self.client.put(
+            session_url(session_id),
+            CONTENT[start:end + 1],
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end}/{total}'
+        )
+
+    def test_create_session(self):
+        """Test opening an upload session"""
+        res = self.create_session()
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['received'], [])
+        session = UploadSession.objects.get(id=res.data['id'])
+        self.assertEqual(os.path.getsize(session.partial_path), len(CONTENT))
+
+    def test_create_session_other_users_pdd(self):
+        """Test uploading to someone else's PDD object is refused"""
+        user2 = get_user_model().objects.create_user(
+            'other@gmail.com',
+            'pass'
+        )
+        self.pddobj = sample_pdd_obj(user=user2)
+
+        res = self.create_session()
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_create_session_over_user_limit(self):
+        """Test files above the user's upload limit are refused"""
+        self.user.video_upload_max_size = len(CONTENT) - 1
+        self.user.save()
+
+        res = self.create_session()
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('size', res.data)
+
+    def test_chunks_out_of_order_and_finalize(self):
+        """Test chunks in any order are assembled into the video file"""
+        session_id = self.create_session().data['id']
+
+        res = self.put_chunk(session_id, 60, 99)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['received'], [[60, 100]])
+        self.put_chunk(session_id, 0, 29)
+        res = self.client.post(finalize_url(session_id))
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+
+        self.put_chunk(session_id, 30, 59)
+        res = self.client.get(session_url(session_id))
+        self.assertEqual(res.data['received'], [[0, 100]])
+        res = self.client.post(finalize_url(session_id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.pddobj.refresh_from_db()
+        self.assertTrue(self.pddobj.videofile.name.endswith('.mp4'))
+        with open(self.pddobj.videofile.path, 'rb') as videofile:
+            self.assertEqual(videofile.read(), CONTENT)
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_chunk_resent(self):
+        """Test a chunk can be sent again after a failure"""
+        session_id = self.create_session().data['id']
+
+        self.put_chunk(session_id, 0, 49)
+        res = self.put_chunk(session_id, 0, 99)
+
+        self.assertEqual(res.data['received'], [[0, 100]])
+
+    def test_chunk_invalid_range(self):
+        """Test ranges outside of the announced size are refused"""
+        session_id = self.create_session().data['id']
+
+        res = self.put_chunk(session_id, 90, 109, total=110)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.client.put(
+            session_url(session_id),
+            CONTENT,
+            content_type='application/octet-stream'
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_chunk_body_too_short(self):
+        """Test a body shorter than its Content-Range is refused"""
+        session_id = self.create_session().data['id']
+
+        res = self.client.put(
+            session_url(session_id),
+            CONTENT[:10],
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes 0-49/{len(CONTENT)}'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data.get('received'), None)
+
+    def test_abort_session(self):
+        """Test deleting a session removes the partial file"""
+        session_id = self.create_session().data['id']
+        partial_path = UploadSession.objects.get(id=session_id).partial_path
+
+        res = self.client.delete(session_url(session_id))
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(os.path.exists(partial_path))
@@ -0,0 +1,249 @@
+import time
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import media
+from core.models import Pdd
+
+
+CONTENT = bytes(range(256)) * 4
+
+
+def download_url(pddobj_id):
+    """Return URL for video download"""
+    return reverse('pdd:pdd-download-video', args=[pddobj_id])
+
+
+def content(res):
+    """Return the body of a (streaming) response"""
+    return b''.join(res.streaming_content)
+
+
+class PublicVideoDownloadApiTests(TestCase):
+    """Test unauthenticated access to video downloads"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_required_auth(self):
+        """Test the authentication is required"""
+        res = self.client.get(download_url(1))
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateVideoDownloadApiTests(TestCase):
+    """Test streaming videos to their owner"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@gmail.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.pddobj = Pdd.objects.create(
+            user=self.user,
+            name='PDD with video',
+            timestamp=datetime.now(timezone.utc)
+        )
+        self.pddobj.videofile.save('video.mp4', ContentFile(CONTENT))
+        self.url = download_url(self.pddobj.id)
+
+    def tearDown(self):
+        self.pddobj.videofile.delete()
+
+    def test_download_full_file(self):
+        """Test downloading the whole video"""
+        res = self.client.get(self.url, HTTP_ACCEPT='video/*')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'video/mp4')
+        self.assertEqual(res['Content-Length'], str(len(CONTENT)))
+        self.assertEqual(res['Accept-Ranges'], 'bytes')
+        self.assertEqual(content(res), CONTENT)
+
+    def test_download_without_video(self):
+        """Test downloading from a PDD object without a video"""
+        self.pddobj.videofile.delete()
+
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_download_other_users_video(self):
+        """Test videos of other users cannot be downloaded"""
+        user2 = get_user_model().objects.create_user(
+            'other@gmail.com',
+            'pass'
+        )
+        self.client.force_authenticate(user2)
+
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_single_range(self):
+        """Test seeking into the video with a single range"""
+        res = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+
+        self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(
+            res['Content-Range'], f'bytes 100-199/{len(CONTENT)}'
+        )
+        self.assertEqual(res['Content-Length'], '100')
+        self.assertEqual(content(res), CONTENT[100:200])
+
+    def test_suffix_and_open_ranges(self):
+        """Test ranges without start or end"""
+        res = self.client.get(self.url, HTTP_RANGE='bytes=-24')
+        self.assertEqual(content(res), CONTENT[-24:])
+
+        res = self.client.get(self.url, HTTP_RANGE='bytes=1000-')
+        self.assertEqual(content(res), CONTENT[1000:])
+
+    def test_multiple_ranges(self):
+        """Test several ranges are sent as multipart/byteranges"""
+        res = self.client.get(self.url, HTTP_RANGE='bytes=0-9, 500-509')
+
+        self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertTrue(
+            res['Content-Type'].startswith('multipart/byteranges')
+        )
+        body = content(res)
+        self.assertEqual(len(body), int(res['Content-Length']))
+        self.assertIn(CONTENT[0:10], body)
+        self.assertIn(CONTENT[500:510], body)
+        self.assertIn(b'Content-Range: bytes 500-509/1024', body)
+
+    def test_overlapping_ranges_merged(self):
+        """Test overlapping ranges collapse into a single range"""
+        res = self.client.get(self.url, HTTP_RANGE='bytes=0-9,5-19')
+
+        self.assertEqual(res['Content-Range'], 'bytes 0-19/1024')
+        self.assertEqual(content(res), CONTENT[:20])
+
+    def test_unsatisfiable_range(self):
+        """Test a range past the end of the file"""
+        res = self.client.get(self.url, HTTP_RANGE='bytes=5000-6000')
+
+        self.assertEqual(
+            res.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+        )
+        self.assertEqual(res['Content-Range'], 'bytes */1024')
+
+    def test_if_range(self):
+        """Test ranges only apply while If-Range matches the ETag"""
+        etag = self.client.get(self.url)['ETag']
+
+        res = self.client.get(
+            self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag
+        )
+        self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+
+        res = self.client.get(
+            self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"'
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(content(res), CONTENT)
+
+    def test_if_none_match(self):
+        """Test an unchanged video is answered with 304"""
+        etag = self.client.get(self.url)['ETag']
+
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class SignedMediaTests(TestCase):
+    """Test downloading videos through signed URLs"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@gmail.com',
+            'testpass'
+        )
+        self.pddobj = Pdd.objects.create(
+            user=self.user,
+            name='PDD with video',
+            timestamp=datetime.now(timezone.utc)
+        )
+        self.pddobj.videofile.save('video.mp4', ContentFile(CONTENT))
+        self.name = self.pddobj.videofile.name
+
+    def tearDown(self):
+        self.pddobj.videofile.delete()
+
+    def signed_url(self):
+        """Return the URL the API hands out for the sample video"""
+        self.client.force_authenticate(self.user)
+        res = self.client.get(reverse('pdd:pdd-detail', args=[self.pddobj.id]))
+        self.client.force_authenticate(None)
+        return res.data['video_url']
+
+    def test_download_without_database(self):
+        """Test a signed URL is served without auth or queries"""
+        url = self.signed_url()
+
+        with self.assertNumQueries(0):
+            res = self.client.get(url, HTTP_RANGE='bytes=0-9')
+
+        self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(content(res), CONTENT[:10])
+        self.assertEqual(res['Cache-Control'], 'private')
+
+    def test_url_stable_within_window(self):
+        """Test the same URL is handed out until the window ends"""
+        with patch('time.time', return_value=1200):
+            first = media.signed_url(self.name)
+        with patch('time.time', return_value=1499):
+            self.assertEqual(media.signed_url(self.name), first)
+        with patch('time.time', return_value=1500):
+            self.assertNotEqual(media.signed_url(self.name), first)
+
+    def test_tampered_or_expired(self):
+        """Test changed and expired URLs are refused"""
+        url = self.signed_url()
+
+        res = self.client.get(url.replace('signature=', 'signature=0'))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+        with patch('time.time', return_value=time.time() + 4000):
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_only_video_store(self):
+        """Test signed names outside the video store are not served"""
+        with patch('time.time', return_value=1000):
+            url = media.signed_url('../../etc/passwd')
+
+        with patch('time.time', return_value=1000):
+            res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_offload(self):
+        """Test the transfer can be handed to the front proxy"""
+        url = self.signed_url()
+
+        with self.settings(SIGNED_MEDIA={'OFFLOAD': 'x-accel-redirect'}):
+            res = self.client.get(url)
+        self.assertEqual(
+            res['X-Accel-Redirect'], f'/protected-media/{self.name}'
+        )
+        self.assertEqual(res['Content-Type'], 'video/mp4')
+        self.assertEqual(res.content, b'')
+
+        with self.settings(SIGNED_MEDIA={'OFFLOAD': 'x-sendfile'}):
+            res = self.client.get(url)
+        self.assertEqual(res['X-Sendfile'], self.pddobj.videofile.path)
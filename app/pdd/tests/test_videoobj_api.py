@@ -1,8 +1,11 @@
+from unittest.mock import patch
+
 from django.contrib.auth import get_user_model
 from django.urls import reverse
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 from rest_framework import status
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 
 from core.models import VideoObj
@@ -11,6 +14,7 @@ from pdd.serializers import VideoObjSerializer
 
 
 VIDEOS_URL = reverse('pdd:videoobj-list')
+VIDEOS_BULK_URL = reverse('pdd:videoobj-bulk')
 
 
 class PublicVideoObjApiTests(TestCase):
@@ -26,6 +30,8 @@ class PublicVideoObjApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
+# Look the token up on every request: the query budgets count it.
+@override_settings(TOKEN_AUTH_CACHE={'TTL': 0})
 class PrivateVideoObjApiTests(TestCase):
     """Test the authorized user video API"""
 
@@ -35,7 +41,8 @@ class PrivateVideoObjApiTests(TestCase):
             'password'
         )
         self.client = APIClient()
-        self.client.force_authenticate(self.user)
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
 
     def test_retrieve_videos(self):
         """Test retrieving videos"""
@@ -44,10 +51,10 @@ class PrivateVideoObjApiTests(TestCase):
 
         res = self.client.get(VIDEOS_URL)
 
-        videos = VideoObj.objects.all().order_by('-title')
+        videos = VideoObj.objects.all().order_by('-title', 'id')
         serializer = VideoObjSerializer(videos, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_videos_limited_to_user(self):
         """Test that videos returned are for authenticated user"""
@@ -64,8 +71,42 @@ class PrivateVideoObjApiTests(TestCase):
         res = self.client.get(VIDEOS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['title'], video.title)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['title'], video.title)
+
+    def test_videos_paginated_with_duplicate_titles(self):
+        """Test paging does not skip or repeat videos sharing a title"""
+        ids = [
+            VideoObj.objects.create(user=self.user, title=title).id
+            for title in ['b', 'a', 'b', 'b', 'c', 'a']
+        ]
+        expected = list(
+            VideoObj.objects.filter(id__in=ids).order_by(
+                '-title', 'id'
+            ).values_list('id', flat=True)
+        )
+
+        seen = []
+        url = f'{VIDEOS_URL}?page_size=2'
+        while url:
+            res = self.client.get(url)
+            seen += [video['id'] for video in res.data['results']]
+            url = res.data['next']
+
+        self.assertEqual(seen, expected)
+
+    def test_search_videos(self):
+        """Test listing only the videos whose title matches"""
+        VideoObj.objects.create(user=self.user, title='Jurassic Park')
+        VideoObj.objects.create(user=self.user, title='Back to the Future')
+
+        res = self.client.get(VIDEOS_URL, {'search': 'future'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [video['title'] for video in res.data['results']],
+            ['Back to the Future']
+        )
 
     def test_create_videoobj_successful(self):
         """Test creating a new video object"""
@@ -87,3 +128,50 @@ class PrivateVideoObjApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
         res = self.client.post(VIDEOS_URL, payload2)
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_create_videoobjs(self):
+        """Test creating many video objects in one request"""
+        payload = [{'title': f'Video {i}'} for i in range(20)]
+
+        res = self.client.post(VIDEOS_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data), 20)
+        titles = VideoObj.objects.filter(
+            user=self.user
+        ).values_list('title', flat=True)
+        self.assertCountEqual(titles, [item['title'] for item in payload])
+
+    def test_bulk_create_reports_errors_per_item(self):
+        """Test invalid items are reported and nothing is created"""
+        payload = [{'title': 'Fine'}, {'title': ''}, {'title': 'Fine too'}]
+
+        res = self.client.post(VIDEOS_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('title', res.data[1])
+        self.assertFalse(VideoObj.objects.exists())
+
+    def test_bulk_create_limited(self):
+        """Test the number of items per request is capped"""
+        with patch('pdd.views.VideoObjViewSet.bulk_max_items', 2):
+            res = self.client.post(
+                VIDEOS_BULK_URL,
+                [{'title': 'a'}, {'title': 'b'}, {'title': 'c'}],
+                format='json'
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(VideoObj.objects.exists())
+
+    def test_update_videoobj(self):
+        """Test renaming a video through its detail route"""
+        video = VideoObj.objects.create(user=self.user, title='Old')
+        url = reverse('pdd:videoobj-detail', args=[video.id])
+
+        res = self.client.patch(url, {'title': 'New'})
+
+        video.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(video.title, 'New')
@@ -7,10 +7,24 @@ from pdd import views
 router = DefaultRouter()
 router.register('videos', views.VideoObjViewSet)
 router.register('pddobjects', views.PddViewSet)
+router.register('upload-sessions', views.UploadSessionViewSet)
 
 app_name = 'pdd'
 
 urlpatterns = [
     # Include all URLs generated by default router
     path('', include(router.urls)),
+    # Async variants for ASGI deployments, uploads are handled by pdd.asgi.
+    path(
+        'async/pddobjects/',
+        views.pdd_list_async,
+        name='async-pdd-list'
+    ),
+    path(
+        'async/pddobjects/<int:pk>/',
+        views.pdd_detail_async,
+        name='async-pdd-detail'
+    ),
+    # Signed video URLs, checked without authentication, see core.media.
+    path('media/<path:name>', views.signed_media, name='signed-media'),
 ]
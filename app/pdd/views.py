@@ -1,26 +1,108 @@
+import mimetypes
+import re
+from urllib.parse import quote
+
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDay, TruncHour, TruncWeek
+from django.http import Http404, HttpResponse
+from django.utils import timezone
+from django.utils.http import http_date
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import viewsets, mixins, status
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
+
+from core import blobs, listversions, media, search, uploads
+from core.authentication import CachedTokenAuthentication
+from core.metrics import ServerTimingMixin
+from core.models import VideoObj, Pdd, UploadSession
+from core.querybudget import QueryBudgetMixin
+from core.storage import blob_digest, video_storage
+from core.threadpool import pooled_view
+
+from pdd import serializers, streaming
+from pdd.conditional import ConditionalMixin
+from pdd.pagination import PddPagination, VideoObjPagination
+
+
+class BulkCreateMixin:
+    """Create many objects from a JSON array POSTed to `bulk/`"""
+    bulk_max_items = 10000
+
+    @action(methods=['POST'], detail=False)
+    def bulk(self, request):
+        """Create all objects in one transaction or none of them"""
+        if isinstance(request.data, list) and \
+                len(request.data) > self.bulk_max_items:
+            raise ValidationError({
+                'non_field_errors': [
+                    f'Ensure this list has no more than '
+                    f'{self.bulk_max_items} items.'
+                ]
+            })
+
+        serializer = self.get_serializer(data=request.data, many=True)
+        # Errors are reported per item, in the order of the request.
+        serializer.is_valid(raise_exception=True)
+        serializer.save(user=self.request.user)
+        # Bulk inserts send no signals, see core.signals.
+        listversions.bump(self.request.user.pk, self.queryset.model)
+
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-from core.models import VideoObj, Pdd
 
-from pdd import serializers
+class SearchMixin:
+    """Filter lists by the ?search= query parameter, best match first"""
+
+    def filter_search(self, queryset):
+        serializer = serializers.SearchSerializer(
+            data=self.request.query_params
+        )
+        serializer.is_valid(raise_exception=True)
+        text = serializer.validated_data.get('search')
+        if not text:
+            return queryset
+
+        # Page by rank instead of the usual ordering.
+        self.pagination_ordering = search.ORDERING
+        return search.search(queryset, text)
 
 
-class VideoObjViewSet(viewsets.GenericViewSet,
+class VideoObjViewSet(ServerTimingMixin,
+                      QueryBudgetMixin,
+                      ConditionalMixin,
+                      BulkCreateMixin,
+                      SearchMixin,
+                      viewsets.GenericViewSet,
                       mixins.ListModelMixin,
-                      mixins.CreateModelMixin):
+                      mixins.CreateModelMixin,
+                      mixins.RetrieveModelMixin,
+                      mixins.UpdateModelMixin):
     """Manage videos in the database"""
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
     queryset = VideoObj.objects.all()
     serializer_class = serializers.VideoObjSerializer
+    pagination_class = VideoObjPagination
+    # Token lookup plus the list version and the page, or the video.
+    # Writes add the bump of the list versions; updates also load the
+    # video and touch the linked PDDs.
+    query_budget = {
+        'list': 3, 'create': 3, 'retrieve': 2, 'update': 5,
+        'partial_update': 5,
+    }
 
     def get_queryset(self):
         """Return objects for the current authenticated user only"""
-        return self.queryset.filter(user=self.request.user).order_by('-title')
+        queryset = self.queryset.filter(
+            user=self.request.user
+        ).order_by('-title', 'id')
+        if self.action == 'list':
+            queryset = self.filter_search(queryset)
+
+        return queryset
 
     def perform_create(self, serializer):
         """
@@ -30,16 +112,64 @@ class VideoObjViewSet(viewsets.GenericViewSet,
         serializer.save(user=self.request.user)
 
 
-class PddViewSet(viewsets.ModelViewSet):
+class PddViewSet(ServerTimingMixin,
+                 QueryBudgetMixin,
+                 ConditionalMixin,
+                 BulkCreateMixin,
+                 SearchMixin,
+                 viewsets.ModelViewSet):
     """Manage PDD objects in the database"""
     serializer_class = serializers.PddSerializer
     queryset = Pdd.objects.all()
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = PddPagination
+    signs_media_urls = True
+    # Token lookup, the PDD query and one prefetch (or update) query;
+    # lists add the list version. Storing a video adds up to five
+    # queries to retain the new file, two to release the replaced one and
+    # one to queue the metadata job. Must not grow with the number of PDDs
+    # or videos.
+    query_budget = {
+        'list': 4, 'retrieve': 3, 'download_video': 2, 'histogram': 2,
+        'upload_video': 13, 'link_video': 10,
+    }
+    histogram_buckets = {
+        'hour': TruncHour,
+        'day': TruncDay,
+        'week': TruncWeek,
+    }
 
     def get_queryset(self):
         """Retrieve the PDD objects for the authenticated user"""
-        return self.queryset.filter(user=self.request.user)
+        queryset = self.queryset.filter(
+            user=self.request.user
+        ).order_by('timestamp', 'id')
+        if self.action == 'list':
+            queryset = self.filter_time_range(queryset)
+            queryset = self.filter_search(queryset)
+            # Fetch the videos of a page in one query instead of one query
+            # per PDD object. A single object loads them just as cheaply
+            # once its ETag was checked.
+            queryset = queryset.prefetch_related('videos')
+
+        return queryset
+
+    def filter_time_range(self, queryset, params=None):
+        """Apply the ?start= and ?end= query parameters"""
+        if params is None:
+            serializer = serializers.TimeRangeSerializer(
+                data=self.request.query_params
+            )
+            serializer.is_valid(raise_exception=True)
+            params = serializer.validated_data
+
+        if 'start' in params:
+            queryset = queryset.filter(timestamp__gte=params['start'])
+        if 'end' in params:
+            queryset = queryset.filter(timestamp__lt=params['end'])
+
+        return queryset
 
     def get_serializer_class(self):
         """Return appropriate serializer class"""
@@ -47,14 +177,24 @@ class PddViewSet(viewsets.ModelViewSet):
             return serializers.PddDetailSerializer
         elif self.action == 'upload_video':
             return serializers.PddVideoSerializer
+        elif self.action == 'link_video':
+            return serializers.PddVideoLinkSerializer
 
         return self.serializer_class
 
+    def perform_content_negotiation(self, request, force=False):
+        """Let players asking for video/* reach the download action"""
+        if self.action == 'download_video':
+            force = True
+
+        return super().perform_content_negotiation(request, force)
+
     def perform_create(self, serializer):
         """Create a new PDD object"""
         serializer.save(user=self.request.user)
 
-    @action(methods=['POST'], detail=True, url_path='upload-video')
+    @action(methods=['POST'], detail=True, url_path='upload-video',
+            parser_classes=[uploads.VideoUploadParser])
     def upload_video(self, request, pk=None):
         """Upload a video to a PDD object."""
         pddobj = self.get_object()
@@ -64,7 +204,9 @@ class PddViewSet(viewsets.ModelViewSet):
         )
 
         if serializer.is_valid():
-            serializer.save()
+            # Commit the video together with the metadata job it queues.
+            with transaction.atomic():
+                serializer.save()
             return Response(
                 serializer.data,  # id plus video
                 status=status.HTTP_200_OK
@@ -74,3 +216,210 @@ class PddViewSet(viewsets.ModelViewSet):
             serializer.errors,
             status=status.HTTP_400_BAD_REQUEST
         )
+
+    @action(methods=['GET'], detail=False)
+    def histogram(self, request):
+        """
+        Count the user's PDD objects, and optionally their videos, per
+        hour, day or week. Buckets start at local midnight or the local
+        hour of the TIME_ZONE setting; empty buckets are left out.
+        """
+        serializer = serializers.PddHistogramSerializer(
+            data=request.query_params
+        )
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        tz = timezone.get_current_timezone()
+        trunc = self.histogram_buckets[params['bucket']]
+        counts = {'pdds': Count('id')}
+        if params['videos']:
+            # The join repeats a PDD once per video, count it once.
+            counts = {
+                'pdds': Count('id', distinct=True),
+                'videos': Count('videos'),
+            }
+        queryset = self.filter_time_range(
+            Pdd.objects.filter(user=request.user),
+            params
+        )
+        rows = queryset.annotate(
+            start=trunc('timestamp', tzinfo=tz)
+        ).values('start').annotate(**counts).order_by('start')
+
+        return Response({
+            'bucket': params['bucket'],
+            'timezone': str(tz),
+            'results': list(rows),
+        })
+
+    @action(methods=['POST'], detail=True, url_path='link-video')
+    def link_video(self, request, pk=None):
+        """
+        Attach a video the user already uploaded, identified by the
+        SHA-256 of its content, without sending the bytes again.
+        """
+        pddobj = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        name = blobs.find(
+            serializer.validated_data['sha256'].lower(),
+            request.user
+        )
+        if name is None:
+            return Response(
+                {'detail': 'Unknown video, upload it instead.'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        pddobj.videofile.name = name
+        with transaction.atomic():
+            pddobj.save(update_fields=['videofile', 'updated_at'])
+        serializer = serializers.PddVideoSerializer(
+            pddobj,
+            context=self.get_serializer_context()
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(methods=['GET'], detail=True, url_path='video')
+    def download_video(self, request, pk=None):
+        """Stream the video of a PDD object, supporting byte ranges"""
+        pddobj = self.get_object()
+        if not pddobj.videofile:
+            raise Http404
+
+        try:
+            return streaming.serve_file(request, pddobj.videofile.path)
+        except FileNotFoundError:
+            raise Http404
+
+
+class UploadSessionViewSet(ServerTimingMixin,
+                           QueryBudgetMixin,
+                           viewsets.GenericViewSet,
+                           mixins.CreateModelMixin,
+                           mixins.RetrieveModelMixin,
+                           mixins.DestroyModelMixin):
+    """
+    Resumable video uploads.
+
+    POST a session with the target PDD, file name and size, PUT the bytes
+    in chunks with a `Content-Range: bytes <start>-<end>/<size>` header,
+    GET the session to see the ranges received and POST to `finalize/`
+    once everything arrived. Chunks may be sent in any order and in
+    parallel; a failed chunk is simply sent again.
+    """
+    serializer_class = serializers.UploadSessionSerializer
+    queryset = UploadSession.objects.all()
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    query_budget = {
+        'create': 4, 'retrieve': 3, 'update': 4,
+        'finalize': 15, 'destroy': 4,
+    }
+    content_range_re = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+    def get_queryset(self):
+        """Return the upload sessions of the authenticated user"""
+        return self.queryset.filter(
+            user=self.request.user
+        ).select_related('pdd')
+
+    def perform_create(self, serializer):
+        """Open a new session and allocate its partial file"""
+        session = serializer.save(user=self.request.user)
+        uploads.create_partial_file(session)
+
+    def perform_destroy(self, instance):
+        """Abort the upload and drop the bytes received"""
+        uploads.abort(instance)
+
+    def update(self, request, *args, **kwargs):
+        """Store one byte range of the file from the raw request body"""
+        session = self.get_object()
+        match = self.content_range_re.match(
+            request.META.get('HTTP_CONTENT_RANGE', '')
+        )
+        if not match:
+            raise ValidationError(
+                {'Content-Range': 'Expected "bytes <start>-<end>/<size>".'}
+            )
+
+        start, end, size = (int(value) for value in match.groups())
+        if size != session.size or start > end or end >= size:
+            raise ValidationError(
+                {'Content-Range': 'Range does not fit the upload size.'}
+            )
+
+        # Read the body straight from the stream, bypassing the parsers
+        # so nothing gets buffered in memory or spooled to disk first.
+        try:
+            uploads.write_chunk(
+                session, start, end - start + 1, request.stream
+            )
+        except uploads.IncompleteChunk as exc:
+            raise ValidationError({'detail': str(exc)})
+
+        serializer = self.get_serializer(session)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(methods=['POST'], detail=True)
+    def finalize(self, request, pk=None):
+        """Attach the completed file to the PDD object"""
+        session = self.get_object()
+        if session.received_ranges() != [[0, session.size]]:
+            return Response(
+                {'detail': 'Upload is incomplete.'},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        pddobj = uploads.finalize(session)
+        serializer = serializers.PddVideoSerializer(
+            pddobj,
+            context=self.get_serializer_context()
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+# Async variants of the busiest PDD endpoints for ASGI deployments, see
+# core.threadpool. Video uploads are streamed by pdd.asgi instead.
+pdd_list_async = pooled_view(PddViewSet.as_view({'get': 'list'}))
+pdd_detail_async = pooled_view(PddViewSet.as_view({
+    'get': 'retrieve', 'put': 'update', 'patch': 'partial_update',
+}))
+
+
+def signed_media(request, name):
+    """
+    Serve a stored video to whoever holds a valid signed URL, see
+    core.media. Runs no database query.
+    """
+    expires = request.GET.get('expires')
+    # Only files of the video store, whatever was signed.
+    if blob_digest(name) is None or \
+            not media.verify(name, expires, request.GET.get('signature')):
+        raise Http404
+
+    offload = media.media_settings()['OFFLOAD']
+    if offload is None:
+        try:
+            response = streaming.serve_file(request, video_storage.path(name))
+        except FileNotFoundError:
+            raise Http404
+    else:
+        # The front proxy sends the file, ranges included.
+        response = HttpResponse(
+            content_type=mimetypes.guess_type(name)[0] or
+            'application/octet-stream'
+        )
+        if offload == 'x-accel-redirect':
+            prefix = media.media_settings()['ACCEL_PREFIX']
+            response['X-Accel-Redirect'] = prefix + quote(name)
+        else:
+            response['X-Sendfile'] = video_storage.path(name)
+
+    # Shared caches must not keep the video past the expiry of the URL.
+    response['Cache-Control'] = 'private'
+    response['Expires'] = http_date(int(expires))
+    return response
@@ -1,29 +1,53 @@
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, permissions, status
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
 
+from core import deletion
+from core.authentication import CachedTokenAuthentication
+from core.metrics import ServerTimingMixin, timed_class
+from core.threadpool import pooled_view
+
 from user.serializers import UserSerializer, AuthTokenSerializer
 
 
-class CreateUserView(generics.CreateAPIView):
+class CreateUserView(ServerTimingMixin, generics.CreateAPIView):
     """Create a new user in the system"""
     serializer_class = UserSerializer
 
 
-class CreateTokenView(ObtainAuthToken):
+class CreateTokenView(ServerTimingMixin, ObtainAuthToken):
     """Create a new auth token for the user"""
-    serializer_class = AuthTokenSerializer
+    # ObtainAuthToken.post() builds the serializer from the class, not
+    # through get_serializer(); time the password check there.
+    serializer_class = timed_class(AuthTokenSerializer)
     # This call enables the browser view.
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+class ManageUserView(ServerTimingMixin,
+                     generics.RetrieveUpdateDestroyAPIView):
     """Manage the authenticated user"""
     serializer_class = UserSerializer
-    authentication_classes = (authentication.TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     # There can be other permission classes.
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_object(self):
         """This returns the authenticated user"""
         return self.request.user
+
+    def destroy(self, request, *args, **kwargs):
+        """
+        Close the account at once and delete its data in the background,
+        see core.deletion
+        """
+        deletion.schedule(self.get_object())
+        return Response(
+            {'detail': 'The account is closed and will be deleted.'},
+            status=status.HTTP_202_ACCEPTED
+        )
+
+
+# Async variant for ASGI deployments, see core.threadpool.
+manage_user_async = pooled_view(ManageUserView.as_view())